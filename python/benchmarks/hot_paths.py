@@ -0,0 +1,274 @@
+"""
+Microbenchmarks of the CPU work done for every rule on every reconciliation: macro
+extraction and rendering, validation of the analytic rule payload, dumping it by
+alias, and computing rule IDs and content hashes.
+
+Rules are generated synthetically, from small queries to 50k-character ones, with
+up to 50 macros (some of which reference other macros) and a deep
+incidentConfiguration, so the suite runs offline and is reproducible.
+
+Results can be saved and compared against a previous run to catch regressions,
+e.g. before and after a change:
+
+Usage:
+    uv run python -m benchmarks.hot_paths --save baseline.json
+    uv run python -m benchmarks.hot_paths --compare baseline.json --threshold 0.2
+"""
+
+import argparse
+import json
+import sys
+import timeit
+from typing import Callable
+
+from dac_operator.crd.macro_index import MacroIndex
+from dac_operator.ext import drift_detection
+from dac_operator.microsoft_sentinel.microsoft_sentinel_macro_service import (
+    MicrosoftSentinelMacroService,
+)
+from dac_operator.microsoft_sentinel.microsoft_sentinel_models import (
+    CreateScheduledAlertRule,
+)
+from dac_operator.microsoft_sentinel.microsoft_sentinel_service import (
+    MicrosoftSentinelService,
+)
+
+QUERY_LENGTHS = [200, 5_000, 50_000]
+MACRO_COUNTS = [0, 10, 50]
+
+# Every fifth macro references the next one, so rendering also expands nested macros
+NESTING_STEP = 5
+
+QUERY_LINES = [
+    "SecurityEvent",
+    "| where TimeGenerated > ago(1h)",
+    "| where EventID in (4624, 4625, 4648)",
+    '| extend Account = tostring(split(TargetUserName, "@")[0])',
+    "| summarize Attempts = count(), Hosts = dcount(Computer) by Account, IpAddress",
+    "| where Attempts > 10",
+]
+
+
+def generate_macros(count: int) -> dict[str, str]:
+    macros = {}
+
+    for i in range(count):
+        content = f'| where Computer !startswith "excluded-{i}-"'
+        if i % NESTING_STEP == 0 and i + 1 < count:
+            content = f"{content} `${{macro-{i + 1}}}`"
+        macros[f"macro-{i}"] = content
+
+    return macros
+
+
+def generate_query(length: int, macro_count: int) -> str:
+    """
+    Generate a query of roughly the given length, referencing each macro once and
+    spreading the references evenly over the query.
+    """
+    lines: list[str] = []
+    size = 0
+
+    while size < length:
+        line = QUERY_LINES[len(lines) % len(QUERY_LINES)]
+        lines.append(line)
+        size += len(line) + 1
+
+    for i in range(macro_count):
+        position = (i * len(lines)) // macro_count
+        lines[position] = f"{lines[position]} `${{macro-{i}}}`"
+
+    return "\n".join(lines)
+
+
+def generate_rule(query: str) -> dict:
+    """
+    Generate an analytic rule spec that populates every nested model, as the
+    resources in a detection library typically do.
+    """
+    return {
+        "kind": "Scheduled",
+        "properties": {
+            "displayName": "Brute force attempts against multiple hosts",
+            "description": "Detects many failed logons from a single IP address.",
+            "enabled": True,
+            "query": query,
+            "queryFrequency": "PT1H",
+            "queryPeriod": "PT1H",
+            "severity": "High",
+            "suppressionDuration": "PT5H",
+            "suppressionEnabled": False,
+            "triggerOperator": "GreaterThan",
+            "triggerThreshold": 0,
+            "tactics": ["CredentialAccess", "InitialAccess", "LateralMovement"],
+            "techniques": ["T1110", "T1078"],
+            "customDetails": {f"Detail{i}": f"Column{i}" for i in range(20)},
+            "alertDetailsOverride": {
+                "alertDescriptionFormat": "{{Attempts}} attempts from {{IpAddress}}",
+                "alertDisplayNameFormat": "Brute force by {{Account}}",
+                "alertSeverityColumnName": "Severity",
+                "alertTacticsColumnName": "Tactics",
+                "alertDynamicProperties": [
+                    {"alertProperty": "ProductName", "value": "Product"},
+                    {"alertProperty": "RemediationSteps", "value": "Remediation"},
+                ],
+            },
+            "entityMappings": [
+                {
+                    "entityType": entity_type,
+                    "fieldMappings": [
+                        {"identifier": f"Identifier{i}", "columnName": f"Column{i}"}
+                        for i in range(3)
+                    ],
+                }
+                for entity_type in ["Account", "Host", "IP", "Process", "File"]
+            ],
+            "eventGroupingSettings": {"aggregationKind": "AlertPerResult"},
+            "incidentConfiguration": {
+                "createIncident": True,
+                "groupingConfiguration": {
+                    "enabled": True,
+                    "groupByAlertDetails": ["DisplayName", "Severity"],
+                    "groupByCustomDetails": [f"Detail{i}" for i in range(20)],
+                    "groupByEntities": ["Account", "Host", "IP"],
+                    "lookbackDuration": "PT5H",
+                    "matchingMethod": "Selected",
+                    "reopenClosedIncident": False,
+                },
+            },
+        },
+    }
+
+
+def measure(func: Callable[[], object], repeat: int) -> float:
+    """Return the best time per call of `func` in seconds, out of `repeat` runs."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def collect_benchmarks() -> dict[str, Callable[[], object]]:
+    macro_service = MicrosoftSentinelMacroService()
+    sentinel_service = MicrosoftSentinelService(
+        repository=None,  # type: ignore
+        kubernetes_client=None,  # type: ignore
+        macro_index=MacroIndex(kind="benchmark"),
+        namespace="benchmark",
+    )
+    benchmarks: dict[str, Callable[[], object]] = {}
+
+    for length in QUERY_LENGTHS:
+        for macro_count in MACRO_COUNTS:
+            case = f"{length}ch/{macro_count}m"
+            query = generate_query(length, macro_count)
+            macros = generate_macros(macro_count)
+            spec = generate_rule(macro_service.render(query=query, macros=macros))
+            payload = CreateScheduledAlertRule.model_validate(spec)
+            dumped = payload.model_dump(by_alias=True)
+
+            benchmarks[f"find_macros[{case}]"] = (
+                lambda query=query: macro_service.get_used_macros(query)
+            )
+            benchmarks[f"render[{case}]"] = lambda query=query, macros=macros: (
+                macro_service.render(query=query, macros=macros)
+            )
+
+            # The payload only depends on the length of the rendered query
+            if macro_count != MACRO_COUNTS[0]:
+                continue
+
+            case = f"{length}ch"
+            benchmarks[f"model_validate[{case}]"] = lambda spec=spec: (
+                CreateScheduledAlertRule.model_validate(spec)
+            )
+            benchmarks[f"prepare_analytics_rule[{case}]"] = lambda payload=payload: (
+                sentinel_service.prepare_analytics_rule(payload)
+            )
+            benchmarks[f"model_dump_by_alias[{case}]"] = lambda payload=payload: (
+                payload.model_dump(by_alias=True)
+            )
+            benchmarks[f"content_hash[{case}]"] = lambda dumped=dumped: (
+                drift_detection.compute_content_hash(dumped)
+            )
+
+    benchmarks["analytics_rule_id"] = lambda: (
+        sentinel_service.compute_analytics_rule_id("brute-force-multiple-hosts")
+    )
+
+    return benchmarks
+
+
+def compare(
+    results: dict[str, float], baseline: dict[str, float], threshold: float
+) -> list[str]:
+    """Return the benchmarks that got slower than the baseline by over `threshold`."""
+    return [
+        name
+        for name, seconds in results.items()
+        if name in baseline and seconds > baseline[name] * (1 + threshold)
+    ]
+
+
+def main(
+    repeat: int,
+    selection: str | None,
+    save: str | None,
+    baseline_path: str | None,
+    threshold: float,
+) -> int:
+    baseline: dict[str, float] = {}
+    if baseline_path:
+        with open(baseline_path) as file:
+            baseline = json.load(file)
+
+    results: dict[str, float] = {}
+    print(f"{'benchmark':<40} {'us/op':>12} {'ops/s':>12} {'vs baseline':>12}")
+
+    for name, func in collect_benchmarks().items():
+        if selection and selection not in name:
+            continue
+
+        seconds = measure(func, repeat=repeat)
+        results[name] = seconds
+
+        change = ""
+        if name in baseline:
+            change = f"{(seconds / baseline[name] - 1) * 100:+.1f}%"
+
+        print(f"{name:<40} {seconds * 1e6:>12.2f} {1 / seconds:>12.0f} {change:>12}")
+
+    if save:
+        with open(save, "w") as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+        print(f"\nResults written to {save}")
+
+    regressions = compare(results, baseline, threshold)
+    if regressions:
+        print(
+            f"\n{len(regressions)} benchmark(s) slower than the baseline by more "
+            f"than {threshold:.0%}: {', '.join(regressions)}"
+        )
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--select", help="Only run the benchmarks whose name contains this string"
+    )
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument(
+        "--compare", help="Compare the results against a file written by --save"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Relative slowdown against the baseline that counts as a regression",
+    )
+    args = parser.parse_args()
+
+    sys.exit(main(args.repeat, args.select, args.save, args.compare, args.threshold))
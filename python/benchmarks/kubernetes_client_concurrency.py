@@ -0,0 +1,106 @@
+"""
+Benchmark showing how handler concurrency scales when Kubernetes API calls are run
+through the AsyncKubernetesClient instead of calling the blocking client directly
+from the event loop.
+
+The API server is simulated with a fixed per-request latency, so the results only
+depend on how well the event loop overlaps requests.
+
+Usage:
+    uv run python -m benchmarks.kubernetes_client_concurrency --latency 0.02
+"""
+
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from dac_operator.ext.kubernetes_client import AsyncKubernetesClient, KubernetesClient
+
+
+class SimulatedCoreV1Api:
+    def __init__(self, latency: float):
+        self._latency = latency
+
+    def read_namespaced_config_map(self, name: str, namespace: str):
+        time.sleep(self._latency)
+        return SimpleNamespace(
+            api_version="v1", kind="ConfigMap", immutable=None, data={"key": name}
+        )
+
+    def read_namespaced_secret(self, name: str, namespace: str):
+        time.sleep(self._latency)
+        return SimpleNamespace(data={"token": "dG9rZW4="})
+
+
+async def measure_loop_lag(stop: asyncio.Event, samples: list[float]):
+    """Records how late a 10ms heartbeat fires, i.e. how long the loop is blocked."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+        samples.append(time.perf_counter() - started - 0.01)
+
+
+async def run(handler, concurrency: int) -> tuple[float, float]:
+    stop = asyncio.Event()
+    lag: list[float] = []
+    heartbeat = asyncio.create_task(measure_loop_lag(stop, lag))
+
+    started = time.perf_counter()
+    await asyncio.gather(*[handler(f"tenant-{i}") for i in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await heartbeat
+    return elapsed, max(lag, default=0.0)
+
+
+async def main(latency: float, concurrency_levels: list[int], workers: int):
+    blocking_client = KubernetesClient(
+        core_api=SimulatedCoreV1Api(latency),  # type: ignore
+        custom_objects_api=None,  # type: ignore
+    )
+    async_client = AsyncKubernetesClient(
+        kubernetes_client=blocking_client,
+        executor=ThreadPoolExecutor(max_workers=workers),
+    )
+
+    # A handler performs the same two reads as the providers do for every tenant
+    async def blocking_handler(namespace: str):
+        blocking_client.get_config_map(name="configuration", namespace=namespace)
+        blocking_client.get_secret(name="secret", namespace=namespace)
+
+    async def async_handler(namespace: str):
+        await async_client.get_config_map(name="configuration", namespace=namespace)
+        await async_client.get_secret(name="secret", namespace=namespace)
+
+    print(
+        f"Simulated API latency: {latency * 1000:.0f}ms, thread pool size: {workers}\n"
+    )
+    print(
+        f"{'client':<10} {'handlers':>8} {'seconds':>9} {'handlers/s':>11} "
+        f"{'max loop lag (ms)':>18}"
+    )
+    for concurrency in concurrency_levels:
+        handlers = [("blocking", blocking_handler), ("async", async_handler)]
+        for label, handler in handlers:
+            elapsed, lag = await run(handler, concurrency)
+            print(
+                f"{label:<10} {concurrency:>8} {elapsed:>9.3f} "
+                f"{concurrency / elapsed:>11.1f} {lag * 1000:>18.1f}"
+            )
+
+    async_client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 8, 32, 128]
+    )
+    args = parser.parse_args()
+
+    asyncio.run(main(args.latency, args.concurrency, args.workers))
@@ -0,0 +1,457 @@
+"""
+End-to-end scale simulator, running the real kopf handlers of the operator against
+stand-ins for Azure AD, Azure Resource Manager, Splunk and the Kubernetes API.
+
+N tenants with M rules each are seeded into the fake API server, and their tenant
+configurations and macros are passed through the real watch handlers. The rules are
+then taken through the phases of a deployment:
+
+- create: every rule is created, as when a detection library is first applied
+- resync: the timers fire for every rule, which is skipped while its content
+  did not change
+- drift-check: the timers fire with the drift check due, comparing every rule
+  against its upstream copy
+- macro-change: a macro used by every rule changes in each tenant
+
+Each phase reports reconciles/sec, upstream and Kubernetes calls per reconcile and
+the p50/p99 time per reconcile. The peak RSS of the operator process is reported at
+the end. The stand-in upstreams run in a separate process, so they do not count
+towards it.
+
+Settings of the operator are read from the environment as usual, e.g. to size the
+work queue or the client-side rate limits:
+
+Usage:
+    WORK_QUEUE_WORKERS=64 REQUEST_WRITE_RATE=50 \\
+        uv run python -m benchmarks.scale_simulator --tenants 10 --rules 1000
+"""
+
+import argparse
+import asyncio
+import base64
+import resource
+import statistics
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import httpx
+from loguru import logger
+
+from benchmarks.hot_paths import generate_macros, generate_query, generate_rule
+from benchmarks.scale_simulator import fake_kubernetes, fake_upstreams
+from dac_operator import operator as operator  # Registers the handlers
+from dac_operator import providers
+from dac_operator.ext.kubernetes_client import AsyncKubernetesClient, KubernetesClient
+from dac_operator.ext.reconcile_scheduler import ReconcileScheduler
+from dac_operator.ext.request_scheduler import RequestScheduler, ScheduledTransport
+from dac_operator.handlers import object_reconciler
+from dac_operator.handlers.configuration import configuration_watchers
+from dac_operator.handlers.microsoft_sentinel.analytic_rules import (
+    analytic_rule_events,
+    analytic_rule_reconciler,
+    analytic_rule_timers,
+)
+from dac_operator.handlers.microsoft_sentinel.macros import macro_watchers
+from dac_operator.handlers.splunk.detection_rules import (
+    detection_rule_event_handlers,
+    detection_rule_reconciler,
+    detection_rule_timer_handlers,
+)
+from dac_operator.handlers.splunk.macros import macro_event_handlers
+
+SENTINEL = "sentinel"
+SPLUNK = "splunk"
+
+
+@dataclass
+class Rule:
+    kind: str
+    namespace: str
+    name: str
+
+
+@dataclass
+class PhaseResult:
+    name: str
+    seconds: float
+    durations: list[float] = field(default_factory=list)
+    upstream: Counter[str] = field(default_factory=Counter)
+    kubernetes: Counter[str] = field(default_factory=Counter)
+
+    @property
+    def reconciles(self) -> int:
+        return len(self.durations)
+
+    def per_reconcile(self, requests: Counter[str]) -> float:
+        return sum(requests.values()) / max(self.reconciles, 1)
+
+    def percentile(self, percentile: int) -> float:
+        if len(self.durations) < 2:
+            return sum(self.durations)
+        return statistics.quantiles(self.durations, n=100)[percentile - 1]
+
+
+class Simulation:
+    def __init__(self, args: argparse.Namespace, upstream_url: str):
+        self._args = args
+        self._upstream_url = upstream_url
+        self._api_server = fake_kubernetes.FakeApiServer(latency=args.api_latency)
+        self._kubernetes_client = AsyncKubernetesClient(
+            kubernetes_client=KubernetesClient(
+                core_api=fake_kubernetes.FakeCoreV1Api(self._api_server),  # type: ignore
+                custom_objects_api=fake_kubernetes.FakeCustomObjectsApi(  # type: ignore
+                    self._api_server
+                ),
+            ),
+            executor=ThreadPoolExecutor(
+                max_workers=providers.settings.kubernetes_client_max_workers
+            ),
+        )
+        self._durations: list[float] = []
+        self.rules: list[Rule] = []
+
+    def get_http_client(
+        self, scheduler: RequestScheduler, verify: bool = True
+    ) -> httpx.AsyncClient:
+        """Same as `providers.get_http_client`, sending requests to the stand-ins."""
+        transport = fake_upstreams.RedirectTransport(
+            transport=httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(
+                    max_connections=providers.settings.http_max_connections,
+                    max_keepalive_connections=(
+                        providers.settings.http_max_keepalive_connections
+                    ),
+                    keepalive_expiry=providers.settings.http_keepalive_expiry,
+                ),
+            ),
+            base_url=self._upstream_url,
+        )
+
+        return httpx.AsyncClient(
+            transport=ScheduledTransport(transport=transport, scheduler=scheduler),
+            timeout=providers.settings.http_timeout,
+        )
+
+    def install(self):
+        """
+        Point the operator at the stand-ins. Everything below the providers, i.e.
+        the caches, rate limiters, services and repositories, is the real code.
+        """
+        reconcile_by_name = object_reconciler.reconcile_by_name
+
+        async def timed_reconcile_by_name(**kwargs) -> bool:
+            started_at = time.perf_counter()
+            try:
+                return await reconcile_by_name(**kwargs)
+            finally:
+                self._durations.append(time.perf_counter() - started_at)
+
+        object_reconciler.reconcile_by_name = timed_reconcile_by_name
+        providers.get_kubernetes_client = lambda: self._kubernetes_client
+        providers.get_http_client = self.get_http_client
+
+        # Reconcile every rule as soon as its timer fires, instead of spreading
+        # the first reconciliations over the warm-up period
+        providers.reconcile_scheduler = ReconcileScheduler(warm_up_period=0)
+        providers.settings.splunk_sync_interval = 0
+        providers.settings.conflict_retry_base = self._args.conflict_retry_base
+        providers.settings.conflict_retry_max = self._args.conflict_retry_base * 8
+
+    async def seed(self):
+        args = self._args
+        macros = generate_macros(args.macros)
+        query = generate_query(args.query_length, args.macros)
+
+        for tenant in range(args.tenants):
+            namespace = f"tenant-{tenant}"
+
+            if args.backend in (SENTINEL, "both"):
+                await self._seed_configuration(
+                    namespace=namespace,
+                    name=providers.MICROSOFT_SENTINEL_CONFIGURATION,
+                    data={
+                        "azure_tenant_id": f"{namespace}-directory",
+                        "azure_subscription_id": f"{namespace}-subscription",
+                        "azure_resource_group_id": "detections",
+                        "azure_workspace_id": f"{namespace}-workspace",
+                        "secret_ref": "azure-credentials",
+                    },
+                    secret_name="azure-credentials",
+                    secret={"azure_client_id": "client", "azure_client_secret": "s"},
+                )
+                for name, content in macros.items():
+                    await self._seed_macro(
+                        plural="microsoftsentinelmacros",
+                        handler=macro_watchers.watch_microsoft_sentinel_macro,
+                        namespace=namespace,
+                        name=name,
+                        content=content,
+                    )
+
+                spec = generate_rule(query)
+                for i in range(args.rules):
+                    name = f"analytic-rule-{i}"
+                    self._api_server.add_object(
+                        analytic_rule_reconciler.PLURAL, namespace, name, spec
+                    )
+                    self.rules.append(Rule(SENTINEL, namespace, name))
+
+            if args.backend in (SPLUNK, "both"):
+                await self._seed_configuration(
+                    namespace=namespace,
+                    name=providers.SPLUNK_CONFIGURATION,
+                    data={
+                        "host": f"{namespace}.splunk.example",
+                        "port": "8089",
+                        "scheme": "https",
+                        "verify": "false",
+                        "app": "detections",
+                        "owner": "nobody",
+                        "secret_ref": "splunk-credentials",
+                    },
+                    secret_name="splunk-credentials",
+                    secret={"token": "token"},
+                )
+                for name, content in macros.items():
+                    await self._seed_macro(
+                        plural="splunkmacros",
+                        handler=macro_event_handlers.watch_splunk_macro,
+                        namespace=namespace,
+                        name=name,
+                        content=content,
+                    )
+
+                for i in range(args.rules):
+                    name = f"detection-rule-{i}"
+                    self._api_server.add_object(
+                        detection_rule_reconciler.PLURAL,
+                        namespace,
+                        name,
+                        {"name": name, "description": "Simulated", "search": query},
+                    )
+                    self.rules.append(Rule(SPLUNK, namespace, name))
+
+        # The analytic rules of the example library are allow-listed by name
+        analytic_rule_reconciler.ALLOWED_NAMESPACES.extend(
+            f"tenant-{tenant}" for tenant in range(args.tenants)
+        )
+        analytic_rule_reconciler.ALLOWED_RULE_NAMES.extend(
+            f"analytic-rule-{i}" for i in range(args.rules)
+        )
+
+    async def _seed_configuration(
+        self, namespace: str, name: str, data: dict, secret_name: str, secret: dict
+    ):
+        secret = {
+            key: base64.b64encode(value.encode()).decode()
+            for key, value in secret.items()
+        }
+        self._api_server.config_maps[(namespace, name)] = data
+        self._api_server.secrets[(namespace, secret_name)] = secret
+
+        await configuration_watchers.watch_tenant_configuration(
+            event={"type": "ADDED"},
+            body={
+                "apiVersion": "v1",
+                "kind": "ConfigMap",
+                "metadata": {"resourceVersion": "1"},
+                "data": data,
+            },
+            name=name,
+            namespace=namespace,
+        )
+        await configuration_watchers.watch_tenant_secret(
+            event={"type": "ADDED"},
+            body={"metadata": {"resourceVersion": "1"}, "data": secret},
+            name=secret_name,
+            namespace=namespace,
+        )
+
+    async def _seed_macro(
+        self, plural: str, handler, namespace: str, name: str, content: str
+    ):
+        version = str(int(time.time() * 1e6))
+        self._api_server.add_object(plural, namespace, name, {"content": content})
+        await handler(
+            event={"type": "ADDED"},
+            body={"metadata": {"resourceVersion": version}},
+            spec={"content": content},
+            name=name,
+            namespace=namespace,
+        )
+
+    async def _upstream_requests(self, client: httpx.AsyncClient) -> Counter[str]:
+        response = await client.get(f"{self._upstream_url}/_stats")
+        await client.post(f"{self._upstream_url}/_reset")
+        return Counter(response.json())
+
+    async def phase(self, name: str, trigger) -> PhaseResult:
+        async with httpx.AsyncClient() as client:
+            await self._upstream_requests(client)
+            self._api_server.requests.clear()
+            self._durations = []
+
+            started_at = time.perf_counter()
+            await trigger()
+            await providers.work_queue.join()
+            seconds = time.perf_counter() - started_at
+
+            return PhaseResult(
+                name=name,
+                seconds=seconds,
+                durations=self._durations,
+                upstream=await self._upstream_requests(client),
+                kubernetes=Counter(self._api_server.requests),
+            )
+
+    async def create(self):
+        for rule in self.rules:
+            if rule.kind == SENTINEL:
+                await analytic_rule_events.enqueue_analytic_rule(
+                    name=rule.name, namespace=rule.namespace
+                )
+            else:
+                await detection_rule_event_handlers.enqueue_splunk_detection_rule(
+                    name=rule.name, namespace=rule.namespace
+                )
+
+    async def timers(self):
+        for rule in self.rules:
+            if rule.kind == SENTINEL:
+                await analytic_rule_timers.create_analytic_rule(
+                    stopped=None, name=rule.name, namespace=rule.namespace
+                )
+            else:
+                await detection_rule_timer_handlers.create_splunk_detection_rule(
+                    stopped=None, name=rule.name, namespace=rule.namespace
+                )
+
+    async def drift_check(self):
+        providers.settings.drift_check_interval = 0
+        try:
+            await self.timers()
+            await providers.work_queue.join()
+        finally:
+            providers.settings.drift_check_interval = self._args.drift_check_interval
+
+    async def change_macro(self):
+        content = f'| where Computer != "changed-{time.time()}"'
+
+        for tenant in range(self._args.tenants):
+            namespace = f"tenant-{tenant}"
+
+            if self._args.backend in (SENTINEL, "both"):
+                await self._seed_macro(
+                    plural="microsoftsentinelmacros",
+                    handler=macro_watchers.watch_microsoft_sentinel_macro,
+                    namespace=namespace,
+                    name="macro-0",
+                    content=content,
+                )
+            if self._args.backend in (SPLUNK, "both"):
+                await self._seed_macro(
+                    plural="splunkmacros",
+                    handler=macro_event_handlers.watch_splunk_macro,
+                    namespace=namespace,
+                    name="macro-0",
+                    content=content,
+                )
+
+    async def close(self):
+        await providers.work_queue.stop()
+        await providers.microsoft_sentinel_services.close()
+        await providers.splunk_services.close()
+        self._kubernetes_client.close()
+
+
+def report(results: list[PhaseResult], verbose: bool):
+    print(
+        f"\n{'phase':<14} {'reconciles':>10} {'seconds':>9} {'rec/s':>9} "
+        f"{'upstream/rec':>13} {'k8s/rec':>8} {'p50 ms':>8} {'p99 ms':>8}"
+    )
+    for result in results:
+        print(
+            f"{result.name:<14} {result.reconciles:>10} {result.seconds:>9.2f} "
+            f"{result.reconciles / result.seconds:>9.1f} "
+            f"{result.per_reconcile(result.upstream):>13.2f} "
+            f"{result.per_reconcile(result.kubernetes):>8.2f} "
+            f"{result.percentile(50) * 1000:>8.1f} "
+            f"{result.percentile(99) * 1000:>8.1f}"
+        )
+
+    if verbose:
+        for result in results:
+            print(f"\n{result.name}:")
+            for request, count in sorted((result.upstream + result.kubernetes).items()):
+                print(f"  {request:<50} {count:>8}")
+
+    # ru_maxrss is reported in kilobytes on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"\nPeak RSS of the operator process: {peak_rss:.0f} MiB")
+
+
+async def main(args: argparse.Namespace):
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    process, upstream_url = fake_upstreams.start(
+        fake_upstreams.FakeUpstreamConfig(
+            latency=args.upstream_latency,
+            conflict_rate=args.conflict_rate,
+            throttle_rate=args.throttle_rate,
+            rate_limit=args.upstream_rate_limit,
+        )
+    )
+    simulation = Simulation(args, upstream_url=upstream_url)
+    simulation.install()
+
+    try:
+        await simulation.seed()
+        print(
+            f"Seeded {args.tenants} tenant(s) with {len(simulation.rules)} rule(s) "
+            f"and {args.macros} macro(s) each, upstreams at {upstream_url}"
+        )
+
+        providers.work_queue.start()
+        results = [
+            await simulation.phase("create", simulation.create),
+            await simulation.phase("resync", simulation.timers),
+            await simulation.phase("drift-check", simulation.drift_check),
+            await simulation.phase("macro-change", simulation.change_macro),
+        ]
+    finally:
+        await simulation.close()
+        process.terminate()
+
+    report(results, verbose=args.verbose)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--tenants", type=int, default=10)
+    parser.add_argument("--rules", type=int, default=100, help="Rules per tenant")
+    parser.add_argument("--macros", type=int, default=10, help="Macros per tenant")
+    parser.add_argument("--query-length", type=int, default=2_000)
+    parser.add_argument(
+        "--backend", choices=[SENTINEL, SPLUNK, "both"], default=SENTINEL
+    )
+    parser.add_argument("--upstream-latency", type=float, default=0.05)
+    parser.add_argument("--upstream-rate-limit", type=float, default=0.0)
+    parser.add_argument("--conflict-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--conflict-retry-base", type=float, default=1.0)
+    parser.add_argument("--api-latency", type=float, default=0.005)
+    parser.add_argument(
+        "--drift-check-interval",
+        type=float,
+        default=providers.settings.drift_check_interval,
+    )
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--verbose", action="store_true")
+
+    asyncio.run(main(parser.parse_args()))
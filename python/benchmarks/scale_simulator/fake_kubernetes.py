@@ -0,0 +1,153 @@
+"""
+In-memory stand-in for the parts of the Kubernetes API used by the operator. It
+replaces the generated `CoreV1Api` and `CustomObjectsApi` below the real
+`KubernetesClient`, so that calls still go through the thread pool of the
+`AsyncKubernetesClient`, with a simulated API server latency.
+"""
+
+import copy
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+import kubernetes.client.exceptions
+
+ObjectKey = tuple[str, str, str]
+
+
+class FakeApiServer:
+    def __init__(self, latency: float):
+        self._latency = latency
+        self._lock = threading.Lock()
+        self.config_maps: dict[tuple[str, str], dict[str, str]] = {}
+        self.secrets: dict[tuple[str, str], dict[str, str]] = {}
+        # (plural, namespace, name) -> object
+        self.objects: dict[ObjectKey, dict] = {}
+        self.requests: Counter[str] = Counter()
+
+    def request(self, operation: str):
+        self.requests[operation] += 1
+        time.sleep(self._latency)
+
+    def add_object(self, plural: str, namespace: str, name: str, spec: dict):
+        self.objects[(plural, namespace, name)] = {
+            "metadata": {
+                "name": name,
+                "namespace": namespace,
+                "generation": 1,
+                "resourceVersion": "1",
+            },
+            "spec": spec,
+        }
+
+    def get_object(self, plural: str, namespace: str, name: str) -> dict:
+        with self._lock:
+            body = self.objects.get((plural, namespace, name))
+
+            if body is None:
+                raise kubernetes.client.exceptions.ApiException(status=404)
+
+            return copy.deepcopy(body)
+
+    def list_objects(self, plural: str, namespace: str) -> list[dict]:
+        with self._lock:
+            return [
+                copy.deepcopy(body)
+                for (kind, object_namespace, _), body in self.objects.items()
+                if kind == plural and object_namespace == namespace
+            ]
+
+    def patch_status(
+        self,
+        plural: str,
+        namespace: str,
+        name: str,
+        status: dict,
+        resource_version: str | None = None,
+    ):
+        with self._lock:
+            body = self.objects.get((plural, namespace, name))
+
+            if body is None:
+                raise kubernetes.client.exceptions.ApiException(status=404)
+
+            if resource_version not in (None, body["metadata"]["resourceVersion"]):
+                raise kubernetes.client.exceptions.ApiException(status=409)
+
+            body.setdefault("status", {}).update(copy.deepcopy(status))
+            metadata = body["metadata"]
+            metadata["resourceVersion"] = str(int(metadata["resourceVersion"]) + 1)
+
+
+class FakeCoreV1Api:
+    def __init__(self, server: FakeApiServer):
+        self._server = server
+
+    def read_namespaced_config_map(self, name: str, namespace: str):
+        self._server.request("read_namespaced_config_map")
+        data = self._server.config_maps.get((namespace, name))
+
+        if data is None:
+            raise kubernetes.client.exceptions.ApiException(status=404)
+
+        return SimpleNamespace(
+            api_version="v1", kind="ConfigMap", immutable=None, data=dict(data)
+        )
+
+    def read_namespaced_secret(self, name: str, namespace: str):
+        self._server.request("read_namespaced_secret")
+        data = self._server.secrets.get((namespace, name))
+
+        if data is None:
+            raise kubernetes.client.exceptions.ApiException(status=404)
+
+        return SimpleNamespace(data=dict(data))
+
+
+class FakeCustomObjectsApi:
+    def __init__(self, server: FakeApiServer):
+        self._server = server
+
+    def get_namespaced_custom_object(
+        self, group: str, version: str, namespace: str, plural: str, name: str
+    ) -> dict:
+        self._server.request("get_namespaced_custom_object")
+        return self._server.get_object(plural=plural, namespace=namespace, name=name)
+
+    def list_namespaced_custom_object(
+        self,
+        group: str,
+        version: str,
+        namespace: str,
+        plural: str,
+        limit: int,
+        _continue: str | None = None,
+    ) -> dict:
+        self._server.request("list_namespaced_custom_object")
+        items = self._server.list_objects(plural=plural, namespace=namespace)
+        offset = int(_continue or 0)
+        metadata = {}
+
+        if offset + limit < len(items):
+            metadata["continue"] = str(offset + limit)
+
+        return {"items": items[offset : offset + limit], "metadata": metadata}
+
+    def patch_namespaced_custom_object_status(
+        self,
+        group: str,
+        version: str,
+        namespace: str,
+        plural: str,
+        name: str,
+        body: dict,
+    ):
+        self._server.request("patch_namespaced_custom_object_status")
+        self._server.patch_status(
+            plural=plural,
+            namespace=namespace,
+            name=name,
+            status=body["status"],
+            resource_version=body.get("metadata", {}).get("resourceVersion"),
+        )
@@ -0,0 +1,332 @@
+"""
+Stand-in for Azure AD (login.microsoftonline.com), the Microsoft.SecurityInsights
+alertRules and automationRules endpoints of Azure Resource Manager, and the Splunk
+saved searches endpoints, served by a single aiohttp application.
+
+The operator's HTTP clients are pointed at the server by `RedirectTransport`, which
+keeps the original host in the `X-Upstream-Host` header, so that every upstream
+(subscription, Splunk host) keeps its own state and rate limit.
+"""
+
+import asyncio
+import multiprocessing.connection
+import random
+import re
+import time
+import uuid
+from collections import Counter
+from dataclasses import asdict, dataclass
+from urllib.parse import unquote, urlencode
+
+import httpx
+from aiohttp import web
+
+UPSTREAM_HOST_HEADER = "X-Upstream-Host"
+
+TOKEN_PATH = re.compile(r"^/(?P<tenant>[^/]+)/oauth2/v2\.0/token$")
+RULE_PATH = re.compile(
+    r"^(?P<workspace>/subscriptions/(?P<subscription>[^/]+)/.+"
+    r"/providers/Microsoft\.SecurityInsights)"
+    r"/(?P<collection>alertRules|automationRules)(?:/(?P<rule_id>[^/]+))?$",
+    re.IGNORECASE,
+)
+SAVED_SEARCH_PATH = re.compile(
+    r"^(?P<namespace>/services(?:NS/[^/]+/[^/]+)?)/saved/searches(?:/(?P<name>[^/]+))?$"
+)
+
+
+@dataclass
+class FakeUpstreamConfig:
+    # Mean response time in seconds, and the relative spread around it
+    latency: float = 0.05
+    jitter: float = 0.5
+    # Share of rule writes rejected with a 409 because the rule was deleted recently
+    conflict_rate: float = 0.0
+    # Share of requests rejected with a 429, regardless of the rate limit
+    throttle_rate: float = 0.0
+    # Requests per second per subscription or Splunk host before requests are
+    # throttled with a 429, or 0 for no limit
+    rate_limit: float = 0.0
+    retry_after: float = 1.0
+    page_size: int = 200
+    seed: int = 0
+
+
+class _RateLimit:
+    def __init__(self, rate: float):
+        self._rate = rate
+        self._tokens = rate
+        self._updated_at = time.monotonic()
+
+    def take(self) -> bool:
+        """Take a token, or return False if none are left."""
+        now = time.monotonic()
+        self._tokens = min(
+            self._rate, self._tokens + (now - self._updated_at) * self._rate
+        )
+        self._updated_at = now
+
+        if self._tokens < 1:
+            return False
+
+        self._tokens -= 1
+        return True
+
+
+class FakeUpstreams:
+    def __init__(self, config: FakeUpstreamConfig):
+        self._config = config
+        self._random = random.Random(config.seed)
+        self._rate_limits: dict[str, _RateLimit] = {}
+        # Workspace path -> collection -> rule ID -> rule
+        self._rules: dict[str, dict[str, dict[str, dict]]] = {}
+        # Splunk host and namespace -> saved search name -> entry
+        self._saved_searches: dict[str, dict[str, dict]] = {}
+        self.requests: Counter[str] = Counter()
+
+    def application(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/_stats", self._stats)
+        app.router.add_post("/_reset", self._reset)
+        app.router.add_route("*", "/{path:.*}", self._handle)
+        return app
+
+    async def _stats(self, request: web.Request) -> web.Response:
+        return web.json_response(dict(self.requests))
+
+    async def _reset(self, request: web.Request) -> web.Response:
+        self.requests.clear()
+        return web.json_response({})
+
+    def _count(self, route: str, request: web.Request, response: web.Response):
+        self.requests[f"{route} {request.method} {response.status}"] += 1
+        return response
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        config = self._config
+        await asyncio.sleep(
+            config.latency * self._random.uniform(1 - config.jitter, 1 + config.jitter)
+        )
+
+        path = unquote(request.path)
+        host = request.headers.get(UPSTREAM_HOST_HEADER, request.host)
+
+        if match := TOKEN_PATH.match(path):
+            return self._count("token", request, self._token(match))
+
+        if match := RULE_PATH.match(path):
+            route = match.group("collection")
+            throttled = self._throttle(key=match.group("subscription"))
+        elif match := SAVED_SEARCH_PATH.match(path):
+            route = "saved_searches"
+            throttled = self._throttle(key=host)
+        else:
+            return self._count("unknown", request, web.json_response({}, status=404))
+
+        if throttled is not None:
+            return self._count(route, request, throttled)
+
+        if route == "saved_searches":
+            response = await self._saved_search(request, match, host)
+        else:
+            response = await self._rule(request, match, host)
+
+        return self._count(route, request, response)
+
+    def _throttle(self, key: str) -> web.Response | None:
+        config = self._config
+        retry_after = {"Retry-After": f"{config.retry_after:g}"}
+
+        if self._random.random() < config.throttle_rate:
+            return web.json_response({}, status=429, headers=retry_after)
+
+        if not config.rate_limit:
+            return None
+
+        rate_limit = self._rate_limits.setdefault(key, _RateLimit(config.rate_limit))
+        if not rate_limit.take():
+            return web.json_response({}, status=429, headers=retry_after)
+
+        return None
+
+    def _token(self, match: re.Match) -> web.Response:
+        return web.json_response(
+            {
+                "access_token": f"token-{match.group('tenant')}-{uuid.uuid4()}",
+                "expires_in": 3600,
+                "token_type": "Bearer",
+            }
+        )
+
+    async def _rule(
+        self, request: web.Request, match: re.Match, host: str
+    ) -> web.Response:
+        collection = self._rules.setdefault(match.group("workspace"), {}).setdefault(
+            match.group("collection"), {}
+        )
+        rule_id = match.group("rule_id")
+
+        if rule_id is None:
+            if request.method != "GET":
+                return web.json_response({}, status=405)
+
+            rules = list(collection.values())
+            offset = int(request.query.get("$skipToken", 0))
+            page = {"value": rules[offset : offset + self._config.page_size]}
+
+            if offset + self._config.page_size < len(rules):
+                query = {**request.query, "$skipToken": offset + self._config.page_size}
+                page["nextLink"] = f"https://{host}{request.path}?{urlencode(query)}"
+
+            return web.json_response(page)
+
+        rule = collection.get(rule_id)
+
+        if request.method == "GET":
+            if rule is None:
+                return web.json_response({}, status=404)
+            if request.headers.get("If-None-Match") == rule["etag"]:
+                return web.Response(status=304)
+            return web.json_response(rule)
+
+        if request.method == "DELETE":
+            collection.pop(rule_id, None)
+            return web.json_response({}, status=200 if rule else 204)
+
+        if request.method != "PUT":
+            return web.json_response({}, status=405)
+
+        if self._random.random() < self._config.conflict_rate:
+            return web.json_response(
+                {
+                    "error": {
+                        "code": "Conflict",
+                        "message": f"The rule '{rule_id}' was recently deleted.",
+                    }
+                },
+                status=409,
+            )
+
+        if_match = request.headers.get("If-Match")
+        if if_match is not None and (rule is None or rule["etag"] != if_match):
+            return web.json_response({}, status=412)
+
+        payload = await request.json()
+        collection[rule_id] = {
+            "id": f"{request.path}/{rule_id}",
+            "name": rule_id,
+            "etag": f'"{uuid.uuid4()}"',
+            "kind": payload.get("kind", "Scheduled"),
+            "properties": payload.get("properties", {}),
+        }
+        return web.json_response(collection[rule_id], status=200 if rule else 201)
+
+    async def _saved_search(
+        self, request: web.Request, match: re.Match, host: str
+    ) -> web.Response:
+        saved_searches = self._saved_searches.setdefault(
+            f"{host}{match.group('namespace')}", {}
+        )
+        name = match.group("name")
+
+        if request.method == "GET" and name is None:
+            entries = list(saved_searches.values())
+            offset = int(request.query.get("offset", 0))
+            count = int(request.query.get("count", 0)) or len(entries)
+            return web.json_response(
+                {
+                    "entry": entries[offset : offset + count],
+                    "paging": {"total": len(entries), "offset": offset},
+                }
+            )
+
+        if request.method == "GET":
+            if name not in saved_searches:
+                return web.json_response({}, status=404)
+            return web.json_response({"entry": [saved_searches[name]]})
+
+        if request.method != "POST":
+            return web.json_response({}, status=405)
+
+        form = await request.post()
+
+        created = name is None
+        if created:
+            name = str(form["name"])
+            if name in saved_searches:
+                return web.json_response({}, status=409)
+        elif name not in saved_searches:
+            return web.json_response({}, status=404)
+
+        saved_searches[name] = {
+            "name": name,
+            "content": {
+                "search": form.get("search", ""),
+                "description": form.get("description", ""),
+            },
+        }
+        return web.json_response(
+            {"entry": [saved_searches[name]]}, status=201 if created else 200
+        )
+
+
+def serve(config: dict, connection: multiprocessing.connection.Connection):
+    """
+    Run the stand-in upstreams until the process is terminated, sending the port
+    they listen on through the connection. Runs in a separate process, so that the
+    operator's CPU and memory usage are measured without them.
+    """
+
+    async def run():
+        runner = web.AppRunner(
+            FakeUpstreams(FakeUpstreamConfig(**config)).application(),
+            access_log=None,
+        )
+        await runner.setup()
+        site = web.TCPSite(runner, host="127.0.0.1", port=0, backlog=4096)
+        await site.start()
+
+        connection.send(runner.addresses[0][1])
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+
+def start(config: FakeUpstreamConfig) -> tuple[multiprocessing.Process, str]:
+    """Start the stand-in upstreams in a new process, returning it and its URL."""
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.get_context("spawn").Process(
+        target=serve, args=(asdict(config), sender), daemon=True
+    )
+    process.start()
+
+    return process, f"http://127.0.0.1:{receiver.recv()}"
+
+
+class RedirectTransport(httpx.AsyncBaseTransport):
+    """
+    Send every request to the stand-in upstreams instead of the real host, keeping
+    the path, the query and the original host.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, base_url: str):
+        self._transport = transport
+        self._base_url = httpx.URL(base_url)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        # The request is sent again as is when it is retried, so it is not modified
+        redirected = httpx.Request(
+            method=request.method,
+            url=request.url.copy_with(
+                scheme=self._base_url.scheme,
+                host=self._base_url.host,
+                port=self._base_url.port,
+            ),
+            headers={**request.headers, UPSTREAM_HOST_HEADER: request.url.host},
+            stream=request.stream,
+            extensions=request.extensions,
+        )
+        return await self._transport.handle_async_request(redirected)
+
+    async def aclose(self):
+        await self._transport.aclose()
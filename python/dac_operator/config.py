@@ -1,5 +1,7 @@
 import os
+import socket
 
+from pydantic import Field, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 ROOT_PATH = os.path.dirname(os.path.abspath(__file__))
@@ -8,6 +10,144 @@ ROOT_PATH = os.path.dirname(os.path.abspath(__file__))
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
+    # Number of seconds before expiry at which a cached Azure AD access token is
+    # considered stale and is refreshed.
+    access_token_refresh_margin: int = 300
+
+    # Connection pooling for the per-tenant HTTP clients used by the repositories.
+    # HTTP/2 requires the optional `http2` extra to be installed.
+    http_timeout: float = 30.0
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0
+    http2: bool = False
+
+    # Client-side rate limits per upstream tenant (Azure subscription or Splunk host)
+    # in requests per second, and how throttled or failed requests are retried. The
+    # burst allowance is dropped once Azure reports that fewer than
+    # `request_rate_limit_low_watermark` requests remain.
+    request_read_rate: float = 20.0
+    request_write_rate: float = 5.0
+    request_burst: int = 50
+    request_max_retries: int = 5
+    request_backoff_base: float = 1.0
+    request_backoff_max: float = 60.0
+    request_rate_limit_low_watermark: int = 10
+
+    # Number of seconds a replaced HTTP client is kept open after a tenant's
+    # configuration changed, so that in-flight requests can complete.
+    http_client_retire_delay: float = 60.0
+
+    # Size of the thread pool used to run blocking Kubernetes API calls, i.e. the
+    # maximum number of concurrent requests to the API server.
+    kubernetes_client_max_workers: int = 16
+
+    # Number of seconds between checks of the JSON-schema files used by the admission
+    # webhooks for changes.
+    schema_reload_interval: float = 10.0
+
+    # Whether the admission webhooks reject rules that reference macros which do not
+    # exist (yet). Disable this when macros and rules are applied in arbitrary order,
+    # in which case a warning is returned instead.
+    admission_reject_missing_macros: bool = True
+
+    # Maximum number of rendered Splunk searches kept in memory, keyed by the search
+    # and the version of every macro it uses.
+    macro_render_cache_size: int = 4096
+
+    # Number of concurrent reconciliations run by the work queue. Resources are
+    # reconciled as soon as they are created or changed.
+    work_queue_workers: int = 16
+
+    # Maximum number of concurrent reconciliations of a single namespace (tenant),
+    # and the relative share of the work queue per namespace, which defaults to 1,
+    # e.g. {"tenant-a": 2}
+    work_queue_tenant_workers: int = 4
+    work_queue_tenant_weights: dict[str, float] = {}
+
+    # Number of seconds between periodic reconciliations of each resource, per kind,
+    # which catch changes made upstream and retry failed deployments
+    analytic_rule_sync_interval: float = 3600
+    automation_rule_sync_interval: float = 3600
+    detection_rule_sync_interval: float = 3600
+
+    # Number of seconds after startup during which the first reconciliation of each
+    # resource is delayed to a stable, hash-based offset within its interval, so that
+    # a restart does not reconcile every resource at once.
+    reconcile_warm_up_period: float = 600
+
+    # Number of seconds before retrying a rule that was rejected upstream with a
+    # conflict, e.g. because a rule with the same ID was deleted recently. The delay
+    # doubles with every conflict, up to the maximum.
+    conflict_retry_base: float = 300
+    conflict_retry_max: float = 3600
+
+    # Number of seconds after which a rule whose rendered payload did not change is
+    # compared against its upstream copy again, to detect changes made outside of
+    # the operator.
+    drift_check_interval: int = 3600
+
+    # Whether the IDs of Microsoft Sentinel rules upstream are derived from their
+    # namespace as well as their name, so that namespaces deploying to the same
+    # workspace do not overwrite each other's rules. Enabling it re-creates every
+    # existing rule under its new ID and removes the old copy, see the README.
+    microsoft_sentinel_namespaced_rule_ids: bool = False
+
+    # Number of seconds between bulk reconciliations of every rule in a workspace,
+    # which compare all rules against a single listing of the workspace. Set to 0 to
+    # only rely on the per-rule timers. Pruning removes upstream rules created by the
+    # operator for the namespace that no longer have a matching resource, leaving the
+    # rules of other namespaces that deploy to the same workspace alone. It requires
+    # namespaced rule IDs to tell those apart.
+    workspace_reconcile_interval: int = 300
+    workspace_reconcile_prune: bool = False
+
+    # Number of seconds between syncs of every Splunk detection rule in a namespace
+    # against a single listing of its saved searches, or 0 to disable it. While
+    # enabled, the per-resource timers no longer check for drift themselves.
+    splunk_sync_interval: float = 300
+
+    # Port of the Prometheus metrics endpoint served by the operator, or 0 to disable
+    # it.
+    metrics_port: int = 9090
+
+    # Sharding of namespaces across replicas of the operator. Namespaces are hashed
+    # onto `shard_count` shards, each of which is handled by a single replica at a
+    # time, coordinated through leases in `shard_lease_namespace` that are renewed
+    # every `shard_lease_renew_interval` and expire after `shard_lease_duration`
+    # seconds. The identity defaults to the host name, i.e. the name of the pod.
+    sharding_enabled: bool = False
+    shard_count: int = 64
+    shard_identity: str = Field(default_factory=socket.gethostname)
+    shard_lease_namespace: str = "default"
+    shard_lease_duration: int = 30
+    shard_lease_renew_interval: float = 10
+
+    # Path of the SQLite database in which the latest version of every rule seen
+    # upstream is kept across restarts, e.g. on a persistent volume, or empty to only
+    # keep it in memory. Changes are written every `state_store_flush_interval`
+    # seconds.
+    state_store_path: str = ""
+    state_store_flush_interval: float = 5
+
+    # Maximum number of workspaces a single analytic rule is written to concurrently,
+    # for rules that target several workspaces of their namespace.
+    workspace_fan_out_concurrency: int = 4
+
+    @model_validator(mode="after")
+    def check_workspace_reconcile_prune(self) -> "Settings":
+        if (
+            self.workspace_reconcile_prune
+            and not self.microsoft_sentinel_namespaced_rule_ids
+        ):
+            raise ValueError(
+                "WORKSPACE_RECONCILE_PRUNE requires "
+                "MICROSOFT_SENTINEL_NAMESPACED_RULE_IDS, since the rules of other "
+                "namespaces deploying to the same workspace can not be told apart "
+                "otherwise."
+            )
+
+        return self
 
 
 def get_settings() -> Settings:
@@ -1,6 +1,6 @@
 from typing import Any
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class MacroBaseModel(BaseModel):
@@ -9,17 +9,24 @@ class MacroBaseModel(BaseModel):
     )
 
 
-class MicrosoftSentinelMacroMetadata(MacroBaseModel):
+class MacroMetadata(MacroBaseModel):
     generation: int
-    labels: dict[str, Any]
+    labels: dict[str, Any] = {}
     name: str
     namespace: str
+    resource_version: str | None = Field(None, alias="resourceVersion")
 
 
-class MicrosoftSentinelMacroSpec(MacroBaseModel):
+class MacroSpec(MacroBaseModel):
     content: str
 
 
-class MicrosoftSentinelMacro(MacroBaseModel):
-    spec: MicrosoftSentinelMacroSpec
-    metadata: MicrosoftSentinelMacroMetadata
+class Macro(MacroBaseModel):
+    spec: MacroSpec
+    metadata: MacroMetadata
+
+
+class MicrosoftSentinelMacro(Macro): ...
+
+
+class SplunkMacro(Macro): ...
@@ -0,0 +1,13 @@
+class MacroInjectionException(Exception): ...
+
+
+class MacroNotFoundException(MacroInjectionException):
+    def __init__(self, macro_name: str):
+        super().__init__(macro_name)
+        self.macro_name = macro_name
+
+
+class MacroCycleException(MacroInjectionException):
+    def __init__(self, cycle: list[str]):
+        super().__init__(" -> ".join(cycle))
+        self.cycle = cycle
@@ -0,0 +1,89 @@
+from pydantic import BaseModel
+
+from dac_operator import metrics
+
+
+class MacroIndexEntry(BaseModel):
+    content: str
+    resource_version: str | None = None
+
+
+class MacroIndex:
+    """
+    In-memory index of macro objects per namespace, kept current by a kopf watch so
+    that rendering a rule does not require any calls to the API server.
+    """
+
+    def __init__(self, kind: str):
+        self._kind = kind
+        self._macros: dict[str, dict[str, MacroIndexEntry]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(macros) for macros in self._macros.values())
+
+    def get(self, namespace: str, name: str) -> MacroIndexEntry | None:
+        return self._macros.get(namespace, {}).get(name)
+
+    def set(
+        self,
+        namespace: str,
+        name: str,
+        content: str,
+        resource_version: str | None = None,
+    ) -> bool:
+        """
+        Add or replace a macro in the index.
+
+        Returns:
+            bool: True if the content of the macro changed
+        """
+        macros = self._macros.setdefault(namespace, {})
+        previous = macros.get(name)
+        macros[name] = MacroIndexEntry(
+            content=content, resource_version=resource_version
+        )
+        metrics.MACRO_INDEX_ENTRIES.labels(kind=self._kind).set(len(self))
+
+        return previous is None or previous.content != content
+
+    def delete(self, namespace: str, name: str) -> bool:
+        """
+        Remove a macro from the index.
+
+        Returns:
+            bool: True if the macro was present in the index
+        """
+        removed = self._macros.get(namespace, {}).pop(name, None)
+        metrics.MACRO_INDEX_ENTRIES.labels(kind=self._kind).set(len(self))
+
+        return removed is not None
+
+
+class MacroDependencyIndex:
+    """
+    Reverse index from macros to the rules that reference them, built from the macros
+    that were resolved while rendering each rule. Used to re-reconcile only the rules
+    that are affected when a macro changes.
+    """
+
+    def __init__(self):
+        self._dependencies: dict[tuple[str, str], set[str]] = {}
+        self._dependents: dict[tuple[str, str], set[str]] = {}
+
+    def set_dependencies(self, namespace: str, rule_name: str, macro_names: set[str]):
+        self.remove_dependencies(namespace=namespace, rule_name=rule_name)
+        self._dependencies[(namespace, rule_name)] = set(macro_names)
+
+        for macro_name in macro_names:
+            self._dependents.setdefault((namespace, macro_name), set()).add(rule_name)
+
+    def remove_dependencies(self, namespace: str, rule_name: str):
+        for macro_name in self._dependencies.pop((namespace, rule_name), set()):
+            dependents = self._dependents.get((namespace, macro_name), set())
+            dependents.discard(rule_name)
+
+            if not dependents:
+                self._dependents.pop((namespace, macro_name), None)
+
+    def get_dependents(self, namespace: str, macro_name: str) -> set[str]:
+        return set(self._dependents.get((namespace, macro_name), set()))
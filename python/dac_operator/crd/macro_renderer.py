@@ -0,0 +1,50 @@
+import re
+from typing import Mapping
+
+from dac_operator.crd import macro_exceptions
+
+# Macros are referenced as `${macro-name}` in Microsoft Sentinel queries and Splunk
+# searches alike
+MACRO_PATTERN = re.compile(r"`\$\{([a-zA-Z-0-9]+)\}`")
+
+
+def find_macros(query: str) -> list[str]:
+    return MACRO_PATTERN.findall(query)
+
+
+def render(query: str, macros: Mapping[str, str]) -> str:
+    """
+    Substitute all macros in a query in a single pass. Macros may reference other
+    macros, which are expanded recursively and only once per render.
+
+    Args:
+        query(str): The query to render
+
+        macros(Mapping[str, str]): The content of each macro, by name
+
+    Raises:
+        MacroNotFoundException: If a referenced macro is not in `macros`
+
+        MacroCycleException: If macros reference each other in a cycle
+    """
+    rendered: dict[str, str] = {}
+
+    def expand(macro_name: str, stack: tuple[str, ...]) -> str:
+        if macro_name in rendered:
+            return rendered[macro_name]
+
+        if macro_name in stack:
+            raise macro_exceptions.MacroCycleException(
+                cycle=[*stack[stack.index(macro_name) :], macro_name]
+            )
+
+        if macro_name not in macros:
+            raise macro_exceptions.MacroNotFoundException(macro_name=macro_name)
+
+        rendered[macro_name] = MACRO_PATTERN.sub(
+            lambda match: expand(match.group(1), (*stack, macro_name)),
+            macros[macro_name],
+        )
+        return rendered[macro_name]
+
+    return MACRO_PATTERN.sub(lambda match: expand(match.group(1), ()), query)
@@ -0,0 +1,101 @@
+import hashlib
+from typing import Callable, Mapping
+
+from dac_operator.crd import crd_models
+from dac_operator.crd.macro_index import MacroIndex
+from dac_operator.ext import kubernetes_exceptions
+from dac_operator.ext.kubernetes_client import AsyncKubernetesClient
+
+
+class MacroResolver:
+    """
+    Looks up the macros used by a query in a single namespace. Macros are read from
+    the in-memory macro index, falling back to the API server for macros that are
+    not indexed yet, e.g. while the operator is starting up.
+    """
+
+    def __init__(
+        self,
+        kubernetes_client: AsyncKubernetesClient,
+        macro_index: MacroIndex,
+        namespace: str,
+        plural: str,
+        find_macros: Callable[[str], list[str]],
+        model: type[crd_models.Macro] = crd_models.MicrosoftSentinelMacro,
+    ):
+        self._kubernetes_client = kubernetes_client
+        self._macro_index = macro_index
+        self._namespace = namespace
+        self._plural = plural
+        self._find_macros = find_macros
+        self._model = model
+
+    async def get_macro_content(self, macro_name: str) -> str | None:
+        entry = self._macro_index.get(namespace=self._namespace, name=macro_name)
+        if entry is not None:
+            return entry.content
+
+        try:
+            macro = await self._kubernetes_client.get_namespaced_custom_object(
+                group="buildrlabs.io",
+                version="v1",
+                namespace=self._namespace,
+                plural=self._plural,
+                name=macro_name,
+                return_type=self._model,
+            )
+        except kubernetes_exceptions.ResourceNotFoundException:
+            return None
+
+        self._macro_index.set(
+            namespace=self._namespace,
+            name=macro_name,
+            content=macro.spec.content,
+            resource_version=macro.metadata.resource_version,
+        )
+        return macro.spec.content
+
+    async def resolve(self, query: str) -> tuple[dict[str, str], set[str]]:
+        """
+        Collect the content of every macro used by a query, including macros that are
+        referenced from within other macros.
+
+        Returns:
+            tuple: The content of each resolved macro by name, and the names of the
+                macros that could not be found.
+        """
+        macros: dict[str, str] = {}
+        pending = self._find_macros(query)
+        missing: set[str] = set()
+
+        while pending:
+            macro_name = pending.pop()
+            if macro_name in macros or macro_name in missing:
+                continue
+
+            content = await self.get_macro_content(macro_name=macro_name)
+            if content is None:
+                missing.add(macro_name)
+                continue
+
+            macros[macro_name] = content
+            pending.extend(self._find_macros(content))
+
+        return macros, missing
+
+    def versions(self, macros: Mapping[str, str]) -> dict[str, str]:
+        """
+        The version of each resolved macro, i.e. the resource version of the macro
+        object, or a hash of its content if it is not known.
+        """
+        versions: dict[str, str] = {}
+
+        for macro_name, content in macros.items():
+            entry = self._macro_index.get(namespace=self._namespace, name=macro_name)
+
+            if entry is not None and entry.resource_version:
+                versions[macro_name] = entry.resource_version
+            else:
+                versions[macro_name] = hashlib.sha256(content.encode()).hexdigest()
+
+        return versions
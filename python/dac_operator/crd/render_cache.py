@@ -0,0 +1,47 @@
+import collections
+from typing import Mapping
+
+from dac_operator import metrics
+
+RenderKey = tuple[str, str, tuple[tuple[str, str], ...]]
+
+
+class RenderCache:
+    """
+    Least-recently-used cache of rendered queries, keyed by the query and the version
+    of every macro it uses, so that a query is only rendered again once one of its
+    macros changed.
+    """
+
+    def __init__(self, kind: str, maxsize: int):
+        self._kind = kind
+        self._maxsize = maxsize
+        self._entries: collections.OrderedDict[RenderKey, str] = (
+            collections.OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def key(self, namespace: str, query: str, versions: Mapping[str, str]) -> RenderKey:
+        return namespace, query, tuple(sorted(versions.items()))
+
+    def get(self, key: RenderKey) -> str | None:
+        rendered = self._entries.get(key)
+
+        if rendered is None:
+            metrics.MACRO_RENDER_CACHE_REQUESTS.labels(
+                kind=self._kind, result="miss"
+            ).inc()
+            return None
+
+        self._entries.move_to_end(key)
+        metrics.MACRO_RENDER_CACHE_REQUESTS.labels(kind=self._kind, result="hit").inc()
+        return rendered
+
+    def set(self, key: RenderKey, rendered: str):
+        self._entries[key] = rendered
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
@@ -0,0 +1,68 @@
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+# Values that upstream APIs commonly omit or normalise instead of echoing back
+EMPTY_VALUES: tuple[Any, ...] = (None, [], {}, "")
+
+
+def compute_content_hash(payload: Any) -> str:
+    """
+    Compute a stable hash of a rendered payload, independent of key order, used to
+    detect whether a rule changed since it was last applied upstream.
+    """
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str).encode()
+    ).hexdigest()
+
+
+def now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def is_drift_check_due(last_drift_check: str | None, interval: float) -> bool:
+    """
+    Whether the upstream copy of a rule should be compared against the desired
+    state again, given the ISO-8601 timestamp of the last check.
+    """
+    if not last_drift_check:
+        return True
+
+    try:
+        last_checked_at = datetime.fromisoformat(last_drift_check)
+    except ValueError:
+        return True
+
+    return datetime.now(timezone.utc) - last_checked_at >= timedelta(seconds=interval)
+
+
+def matches_upstream(desired: Any, actual: Any) -> bool:
+    """
+    Check that every field of the desired payload has the same value upstream.
+    Fields only present upstream, e.g. read-only or server-populated fields, are
+    ignored, and empty values are considered equal to missing ones.
+    """
+    if isinstance(desired, dict):
+        if not isinstance(actual, dict):
+            return actual in EMPTY_VALUES and all(
+                value in EMPTY_VALUES for value in desired.values()
+            )
+
+        return all(
+            matches_upstream(value, actual.get(key)) for key, value in desired.items()
+        )
+
+    if isinstance(desired, list):
+        if not isinstance(actual, list):
+            return not desired and actual in EMPTY_VALUES
+
+        return len(desired) == len(actual) and all(
+            matches_upstream(desired_item, actual_item)
+            for desired_item, actual_item in zip(desired, actual)
+        )
+
+    if desired in EMPTY_VALUES:
+        return actual in EMPTY_VALUES
+
+    return desired == actual
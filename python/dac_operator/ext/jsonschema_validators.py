@@ -0,0 +1,94 @@
+import json
+import os
+import time
+from typing import Any, Callable
+
+import jsonschema
+import jsonschema.exceptions
+import jsonschema.protocols
+import jsonschema.validators
+from loguru import logger as default_loguru_logger
+
+
+class SchemaValidatorRegistry:
+    """
+    Compiled JSON-schema validators for the schemas in a directory. A schema is read
+    and checked once, then reused for every validation. The schema file is checked for
+    changes at most every `reload_interval` seconds, and recompiled when it changed.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        reload_interval: float = 10.0,
+        clock: Callable[[], float] = time.monotonic,
+        logger=default_loguru_logger,
+    ):
+        self._directory = directory
+        self._reload_interval = reload_interval
+        self._clock = clock
+        self._logger = logger
+        # Name -> (modification time, time of the last check, validator)
+        self._validators: dict[
+            str, tuple[int, float, jsonschema.protocols.Validator]
+        ] = {}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self._directory, f"{name}.json")
+
+    def _compile(self, name: str) -> tuple[int, jsonschema.protocols.Validator]:
+        path = self._path(name)
+        modified_at = os.stat(path).st_mtime_ns
+
+        with open(path) as f:
+            schema = json.load(f)
+
+        validator_class = jsonschema.validators.validator_for(schema)
+        validator_class.check_schema(schema)
+        self._logger.info(f"Loaded JSON-schema '{name}'.")
+
+        return modified_at, validator_class(schema)
+
+    def get(self, name: str) -> jsonschema.protocols.Validator:
+        """
+        Get the compiled validator for a schema, e.g. MicrosoftSentinelAutomationRule
+
+        Raises:
+            SchemaError: If the schema itself is invalid
+        """
+        now = self._clock()
+        entry = self._validators.get(name)
+
+        if entry is not None:
+            modified_at, checked_at, validator = entry
+
+            if now - checked_at < self._reload_interval:
+                return validator
+
+            if os.stat(self._path(name)).st_mtime_ns == modified_at:
+                self._validators[name] = (modified_at, now, validator)
+                return validator
+
+        modified_at, validator = self._compile(name)
+        self._validators[name] = (modified_at, now, validator)
+
+        return validator
+
+    def load(self, *names: str):
+        """Compile schemas ahead of time, e.g. when the operator starts."""
+        for name in names:
+            self.get(name)
+
+    def validate(self, name: str, instance: Any):
+        """
+        Equivalent of `jsonschema.validate`, using the compiled validator.
+
+        Raises:
+            SchemaError: If the schema itself is invalid
+
+            ValidationError: If the instance does not match the schema
+        """
+        error = jsonschema.exceptions.best_match(self.get(name).iter_errors(instance))
+
+        if error is not None:
+            raise error
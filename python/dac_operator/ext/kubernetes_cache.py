@@ -0,0 +1,80 @@
+import time
+from typing import Any, Callable
+
+from pydantic import BaseModel
+
+from dac_operator import metrics
+
+
+class CacheEntry(BaseModel):
+    value: Any
+    resource_version: str | None = None
+    updated_at: float
+
+
+class KubernetesResourceCache:
+    """
+    In-memory store of namespaced Kubernetes resources, kept current by kopf watch
+    handlers. Lookups never reach the API server; callers are expected to read
+    through to the API on a miss and populate the cache with the result.
+    """
+
+    def __init__(self, kind: str, clock: Callable[[], float] = time.monotonic):
+        self._kind = kind
+        self._clock = clock
+        self._entries: dict[tuple[str, str], CacheEntry] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, name: str, namespace: str) -> Any | None:
+        entry = self._entries.get((namespace, name))
+
+        if entry is None:
+            metrics.KUBERNETES_CACHE_REQUESTS.labels(
+                kind=self._kind, result="miss"
+            ).inc()
+            return None
+
+        metrics.KUBERNETES_CACHE_REQUESTS.labels(kind=self._kind, result="hit").inc()
+        metrics.KUBERNETES_CACHE_ENTRY_AGE.labels(kind=self._kind).observe(
+            self._clock() - entry.updated_at
+        )
+        return entry.value
+
+    def peek(self, name: str, namespace: str) -> Any | None:
+        """Like `get`, but without recording cache metrics."""
+        entry = self._entries.get((namespace, name))
+        return entry.value if entry else None
+
+    def namespaces(self, name: str) -> list[str]:
+        """All namespaces in which a resource with the given name is cached."""
+        return [
+            namespace for namespace, entry_name in self._entries if entry_name == name
+        ]
+
+    def get_resource_version(self, name: str, namespace: str) -> str | None:
+        entry = self._entries.get((namespace, name))
+        return entry.resource_version if entry else None
+
+    def set(
+        self,
+        name: str,
+        namespace: str,
+        value: Any,
+        resource_version: str | None = None,
+    ):
+        self._entries[(namespace, name)] = CacheEntry(
+            value=value, resource_version=resource_version, updated_at=self._clock()
+        )
+        metrics.KUBERNETES_CACHE_ENTRIES.labels(kind=self._kind).set(len(self))
+
+    def delete(self, name: str, namespace: str):
+        self._entries.pop((namespace, name), None)
+        metrics.KUBERNETES_CACHE_ENTRIES.labels(kind=self._kind).set(len(self))
+
+    def record_event(self):
+        """Mark that a watch event was received, used to detect stalled watches."""
+        metrics.KUBERNETES_CACHE_LAST_EVENT.labels(
+            kind=self._kind
+        ).set_to_current_time()
@@ -1,10 +1,15 @@
-from typing import Type, TypeVar
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Type, TypeVar
 
 import kubernetes.client
 import kubernetes.client.exceptions
 from loguru import logger as default_loguru_logger
 from pydantic import TypeAdapter, ValidationError
 
+from dac_operator import metrics
 from dac_operator.ext import kubernetes_exceptions, kubernetes_models
 
 T = TypeVar("T")
@@ -22,10 +27,12 @@ class KubernetesClient:
         self,
         custom_objects_api: kubernetes.client.CustomObjectsApi,
         core_api: kubernetes.client.CoreV1Api,
+        coordination_api: kubernetes.client.CoordinationV1Api | None = None,
         logger=default_loguru_logger,
     ):
         self._custom_objects_api = custom_objects_api
         self._core_api = core_api
+        self._coordination_api = coordination_api
         self._logger = logger
 
     def get_secret(self, name: str, namespace: str) -> dict:
@@ -111,3 +118,364 @@ class KubernetesClient:
                 f"into an object of type {return_type}: {err}"
             )
             raise kubernetes_exceptions.ResourceValidationError
+
+    def _list_pages(self, list_func: Callable[..., dict], **kwargs) -> list[dict]:
+        """
+        Call a list operation of the custom objects API repeatedly, following the
+        continue token so that large collections are fetched in pages.
+        """
+        items: list[dict] = []
+        continue_token = None
+
+        while True:
+            try:
+                result = list_func(**kwargs, _continue=continue_token)
+            except kubernetes.client.exceptions.ApiException as err:
+                self._logger.exception(err)
+                raise
+
+            items.extend(result.get("items", []))
+            continue_token = result.get("metadata", {}).get("continue")
+
+            if not continue_token:
+                return items
+
+    def list_namespaced_custom_object(
+        self,
+        group: str,
+        version: str,
+        plural: str,
+        namespace: str,
+        page_size: int = 500,
+    ) -> list[dict]:
+        """
+        List all custom objects of a kind in a namespace, following the continue
+        token so that large namespaces are fetched in pages.
+        """
+        return self._list_pages(
+            self._custom_objects_api.list_namespaced_custom_object,
+            group=group,
+            version=version,
+            namespace=namespace,
+            plural=plural,
+            limit=page_size,
+        )
+
+    def list_cluster_custom_object(
+        self,
+        group: str,
+        version: str,
+        plural: str,
+        page_size: int = 500,
+    ) -> list[dict]:
+        """
+        List all custom objects of a kind in every namespace, in pages.
+        """
+        return self._list_pages(
+            self._custom_objects_api.list_cluster_custom_object,
+            group=group,
+            version=version,
+            plural=plural,
+            limit=page_size,
+        )
+
+    def patch_namespaced_custom_object_status(
+        self,
+        name: str,
+        group: str,
+        version: str,
+        plural: str,
+        namespace: str,
+        status: dict,
+        resource_version: str | None = None,
+    ):
+        """
+        Merge the given fields into the status of a namespaced custom object.
+
+        Args:
+            resource_version(str | None): Only patch the object if it is still at
+                this version, e.g. the one it was read at
+
+        Raises:
+            ResourceNotFoundException: If the object does not exist (anymore)
+            ResourceConflictException: If the object is no longer at
+                `resource_version`
+        """
+        body: dict = {"status": status}
+        if resource_version is not None:
+            body["metadata"] = {"resourceVersion": resource_version}
+
+        try:
+            self._custom_objects_api.patch_namespaced_custom_object_status(
+                group=group,
+                version=version,
+                namespace=namespace,
+                plural=plural,
+                name=name,
+                body=body,
+            )
+        except kubernetes.client.exceptions.ApiException as err:
+            if err.status == 409:
+                raise kubernetes_exceptions.ResourceConflictException
+            if err.status == 404:
+                self._logger.info(
+                    f"Unable to patch status of '{group}.{plural}.{version}.{name}' "
+                    f"in '{namespace}', it no longer exists."
+                )
+                raise kubernetes_exceptions.ResourceNotFoundException
+
+            self._logger.exception(err)
+            raise
+
+    def list_leases(
+        self, namespace: str, label_selector: str
+    ) -> list[kubernetes_models.Lease]:
+        result = self._coordination_api.list_namespaced_lease(  # type: ignore
+            namespace=namespace, label_selector=label_selector
+        )
+
+        return [
+            kubernetes_models.Lease(
+                name=lease.metadata.name,
+                labels=lease.metadata.labels or {},
+                holder_identity=lease.spec.holder_identity,
+                lease_duration_seconds=lease.spec.lease_duration_seconds,
+                renew_time=lease.spec.renew_time,
+                lease_transitions=lease.spec.lease_transitions or 0,
+                resource_version=lease.metadata.resource_version,
+            )
+            for lease in result.items
+        ]
+
+    def _to_v1_lease(self, lease: kubernetes_models.Lease) -> kubernetes.client.V1Lease:
+        return kubernetes.client.V1Lease(
+            metadata=kubernetes.client.V1ObjectMeta(
+                name=lease.name,
+                labels=lease.labels or None,
+                resource_version=lease.resource_version,
+            ),
+            spec=kubernetes.client.V1LeaseSpec(
+                holder_identity=lease.holder_identity,
+                lease_duration_seconds=lease.lease_duration_seconds,
+                renew_time=lease.renew_time,
+                lease_transitions=lease.lease_transitions,
+            ),
+        )
+
+    def create_lease(self, namespace: str, lease: kubernetes_models.Lease) -> str:
+        """
+        Create a lease, returning its resource version.
+
+        Raises:
+            ResourceConflictException: If the lease already exists
+        """
+        try:
+            result = self._coordination_api.create_namespaced_lease(  # type: ignore
+                namespace=namespace, body=self._to_v1_lease(lease)
+            )
+        except kubernetes.client.exceptions.ApiException as err:
+            if err.status == 409:
+                raise kubernetes_exceptions.ResourceConflictException
+            raise
+
+        return result.metadata.resource_version
+
+    def replace_lease(self, namespace: str, lease: kubernetes_models.Lease) -> str:
+        """
+        Replace a lease, provided it was not changed since its resource version was
+        read, returning its new resource version.
+
+        Raises:
+            ResourceConflictException: If the lease was changed in the meantime
+            ResourceNotFoundException: If the lease no longer exists
+        """
+        try:
+            result = self._coordination_api.replace_namespaced_lease(  # type: ignore
+                name=lease.name, namespace=namespace, body=self._to_v1_lease(lease)
+            )
+        except kubernetes.client.exceptions.ApiException as err:
+            if err.status == 409:
+                raise kubernetes_exceptions.ResourceConflictException
+            if err.status == 404:
+                raise kubernetes_exceptions.ResourceNotFoundException
+            raise
+
+        return result.metadata.resource_version
+
+    def delete_lease(self, name: str, namespace: str):
+        try:
+            self._coordination_api.delete_namespaced_lease(  # type: ignore
+                name=name, namespace=namespace
+            )
+        except kubernetes.client.exceptions.ApiException as err:
+            if err.status != 404:
+                raise
+
+
+class AsyncKubernetesClient:
+    """
+    Async variant of the KubernetesClient. The Kubernetes python-bindings are
+    blocking, so every call is dispatched to a bounded thread pool to keep the kopf
+    event loop (timers, watches and admission webhooks) responsive while waiting for
+    the API server.
+    """
+
+    def __init__(
+        self,
+        kubernetes_client: KubernetesClient,
+        executor: ThreadPoolExecutor,
+    ):
+        self._kubernetes_client = kubernetes_client
+        self._executor = executor
+
+    async def _run(self, func: Callable[..., T], **kwargs) -> T:
+        started_at = time.monotonic()
+        status = "error"
+
+        metrics.KUBERNETES_REQUESTS_IN_FLIGHT.inc()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._executor, functools.partial(func, **kwargs)
+            )
+            status = "ok"
+            return result
+        except kubernetes_exceptions.ResourceNotFoundException:
+            status = "not_found"
+            raise
+        except kubernetes_exceptions.ResourceConflictException:
+            status = "conflict"
+            raise
+        finally:
+            metrics.KUBERNETES_REQUESTS_IN_FLIGHT.dec()
+            metrics.KUBERNETES_REQUEST_DURATION.labels(
+                operation=func.__name__, status=status
+            ).observe(time.monotonic() - started_at)
+
+    async def get_secret(self, name: str, namespace: str) -> dict:
+        return await self._run(
+            self._kubernetes_client.get_secret, name=name, namespace=namespace
+        )
+
+    async def get_config_map(
+        self, name: str, namespace: str
+    ) -> kubernetes_models.ConfigMap:
+        return await self._run(
+            self._kubernetes_client.get_config_map, name=name, namespace=namespace
+        )
+
+    async def get_namespaced_custom_object(
+        self,
+        name: str,
+        group: str,
+        version: str,
+        plural: str,
+        namespace: str,
+        return_type: Type[T],
+    ) -> T:
+        """
+        See `KubernetesClient.get_namespaced_custom_object`.
+        """
+        return await self._run(
+            self._kubernetes_client.get_namespaced_custom_object,
+            name=name,
+            group=group,
+            version=version,
+            plural=plural,
+            namespace=namespace,
+            return_type=return_type,
+        )
+
+    async def list_namespaced_custom_object(
+        self,
+        group: str,
+        version: str,
+        plural: str,
+        namespace: str,
+    ) -> list[dict]:
+        """
+        See `KubernetesClient.list_namespaced_custom_object`.
+        """
+        return await self._run(
+            self._kubernetes_client.list_namespaced_custom_object,
+            group=group,
+            version=version,
+            plural=plural,
+            namespace=namespace,
+        )
+
+    async def list_cluster_custom_object(
+        self,
+        group: str,
+        version: str,
+        plural: str,
+    ) -> list[dict]:
+        """
+        See `KubernetesClient.list_cluster_custom_object`.
+        """
+        return await self._run(
+            self._kubernetes_client.list_cluster_custom_object,
+            group=group,
+            version=version,
+            plural=plural,
+        )
+
+    async def patch_namespaced_custom_object_status(
+        self,
+        name: str,
+        group: str,
+        version: str,
+        plural: str,
+        namespace: str,
+        status: dict,
+        resource_version: str | None = None,
+    ):
+        """
+        See `KubernetesClient.patch_namespaced_custom_object_status`.
+        """
+        await self._run(
+            self._kubernetes_client.patch_namespaced_custom_object_status,
+            name=name,
+            group=group,
+            version=version,
+            plural=plural,
+            namespace=namespace,
+            status=status,
+            resource_version=resource_version,
+        )
+
+    async def list_leases(
+        self, namespace: str, label_selector: str
+    ) -> list[kubernetes_models.Lease]:
+        return await self._run(
+            self._kubernetes_client.list_leases,
+            namespace=namespace,
+            label_selector=label_selector,
+        )
+
+    async def create_lease(
+        self, namespace: str, lease: kubernetes_models.Lease
+    ) -> str:
+        """
+        See `KubernetesClient.create_lease`.
+        """
+        return await self._run(
+            self._kubernetes_client.create_lease, namespace=namespace, lease=lease
+        )
+
+    async def replace_lease(
+        self, namespace: str, lease: kubernetes_models.Lease
+    ) -> str:
+        """
+        See `KubernetesClient.replace_lease`.
+        """
+        return await self._run(
+            self._kubernetes_client.replace_lease, namespace=namespace, lease=lease
+        )
+
+    async def delete_lease(self, name: str, namespace: str):
+        await self._run(
+            self._kubernetes_client.delete_lease, name=name, namespace=namespace
+        )
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
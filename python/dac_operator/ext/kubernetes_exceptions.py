@@ -14,3 +14,12 @@ class ResourceValidationError(Exception):
     """
 
     ...
+
+
+class ResourceConflictException(Exception):
+    """
+    An exception that indicates that we attempted to create a resource that already
+    exists, or to replace one that was changed since we last read it.
+    """
+
+    ...
@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from pydantic import BaseModel
 
 
@@ -6,3 +8,13 @@ class ConfigMap(BaseModel):
     data: dict[str, str]
     immutable: bool | None
     kind: str
+
+
+class Lease(BaseModel):
+    name: str
+    labels: dict[str, str] = {}
+    holder_identity: str | None = None
+    lease_duration_seconds: int | None = None
+    renew_time: datetime | None = None
+    lease_transitions: int = 0
+    resource_version: str | None = None
@@ -0,0 +1,81 @@
+import hashlib
+import time
+from typing import Callable
+
+from dac_operator import metrics
+
+
+class ReconcileScheduler:
+    """
+    Spreads the first reconciliation of every object evenly over its interval, at a
+    stable offset derived from a hash of the object, so that an operator restart does
+    not reconcile all objects at once. Since kopf schedules the next tick of a
+    (non-sharp) timer relative to the end of the previous one, the offsets persist
+    and the load stays flat afterwards.
+
+    Only objects seen during the warm-up period after startup are delayed, objects
+    created later are reconciled right away. The warm-up period starts once `start`
+    is called.
+    """
+
+    def __init__(
+        self, warm_up_period: float, clock: Callable[[], float] = time.monotonic
+    ):
+        self._warm_up_period = warm_up_period
+        self._clock = clock
+        self._started_at = clock()
+        # Objects seen during the warm-up period, forgotten once it has passed
+        self._seen: set[str] = set()
+
+    def start(self):
+        """Start the warm-up period, i.e. when the operator starts."""
+        self._started_at = self._clock()
+        self._seen.clear()
+
+    def phase(self, key: str) -> float:
+        """A stable, uniformly distributed position in [0, 1) for the given key."""
+        digest = hashlib.sha256(key.encode()).digest()
+        return int.from_bytes(digest[:8], "big") / 2**64
+
+    def first_run_delay(self, key: str, interval: float) -> float:
+        """
+        Number of seconds to wait before the first reconciliation of an object, or 0
+        if it was reconciled before or the warm-up period has passed.
+        """
+        elapsed = self._clock() - self._started_at
+
+        if elapsed >= self._warm_up_period:
+            self._seen.clear()
+            return 0.0
+
+        if key in self._seen:
+            return 0.0
+
+        self._seen.add(key)
+
+        return max(0.0, self.phase(key) * interval - elapsed)
+
+    async def wait_for_turn(
+        self, kind: str, key: str, interval: float, stopped
+    ) -> bool:
+        """
+        Wait for the first reconciliation of an object in a kopf timer.
+
+        Args:
+            stopped(kopf.DaemonStopped): The `stopped` kwarg of the timer
+
+        Returns:
+            bool: False if the timer was stopped while waiting
+        """
+        delay = self.first_run_delay(key=f"{kind}/{key}", interval=interval)
+
+        if delay <= 0:
+            return True
+
+        metrics.RECONCILE_WARM_UP_WAITING.labels(kind=kind).inc()
+        try:
+            await stopped.wait(delay)
+        finally:
+            metrics.RECONCILE_WARM_UP_WAITING.labels(kind=kind).dec()
+
+        return not stopped
@@ -0,0 +1,307 @@
+import asyncio
+import email.utils
+import functools
+import random
+import re
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Literal, ParamSpec, TypeVar
+
+import httpx
+from loguru import logger as default_loguru_logger
+
+from dac_operator import metrics
+
+Operation = Literal["read", "write"]
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+
+# Azure Resource Manager reports the remaining requests of the current window, e.g.
+# x-ms-ratelimit-remaining-subscription-reads or x-ms-ratelimit-remaining-tenant-writes
+RATE_LIMIT_REMAINING_HEADER = re.compile(
+    r"^x-ms-ratelimit-remaining-(?:subscription|tenant)-(?:global-)?"
+    r"(reads|writes|deletes)$"
+)
+SUBSCRIPTION_PATH = re.compile(r"^/subscriptions/([^/]+)", re.IGNORECASE)
+
+# Name of the repository method the current upstream request is sent from
+_endpoint: ContextVar[str] = ContextVar("endpoint", default="unknown")
+
+
+def endpoint(func: Callable[P, Awaitable[T]]) -> Callable[P, Awaitable[T]]:
+    """
+    Label the upstream requests sent by a repository method with the name of the
+    method, so that their duration can be told apart in the metrics.
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+        token = _endpoint.set(func.__name__.lstrip("_"))
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            _endpoint.reset(token)
+
+    return wrapper
+
+
+class TokenBucket:
+    """
+    Classic token bucket: allows bursts of up to `capacity` requests, then `rate`
+    requests per second. Waiters are served in order.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._rate = rate
+        self._capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._updated_at = clock()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(
+            self._capacity, self._tokens + (now - self._updated_at) * self._rate
+        )
+        self._updated_at = now
+
+    def drain(self):
+        """Drop any burst capacity, so that requests continue at the steady rate."""
+        self._refill()
+        self._tokens = min(self._tokens, 0.0)
+
+    def pause(self, seconds: float):
+        """Hold all requests for the given number of seconds."""
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+        self.drain()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                self._refill()
+                now = self._clock()
+
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    await asyncio.sleep((1 - self._tokens) / self._rate)
+
+
+class RequestScheduler:
+    """
+    Shared scheduler for all requests to one kind of upstream. Requests are limited
+    by a token bucket per tenant (Azure subscription or Splunk host) and operation,
+    throttled and transient failures are retried with jittered exponential backoff,
+    honoring Retry-After, and the bucket is drained as soon as Azure reports that
+    few requests remain in the current window.
+    """
+
+    def __init__(
+        self,
+        backend: str,
+        read_rate: float,
+        write_rate: float,
+        burst: int,
+        max_retries: int,
+        backoff_base: float,
+        backoff_max: float,
+        low_watermark: int,
+        clock: Callable[[], float] = time.monotonic,
+        logger=default_loguru_logger,
+    ):
+        self._backend = backend
+        self._rates: dict[Operation, float] = {"read": read_rate, "write": write_rate}
+        self._burst = burst
+        self._max_retries = max_retries
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+        self._low_watermark = low_watermark
+        self._clock = clock
+        self._logger = logger
+        self._buckets: dict[tuple[str, Operation], TokenBucket] = {}
+
+    def _bucket(self, key: str, operation: Operation) -> TokenBucket:
+        if (key, operation) not in self._buckets:
+            self._buckets[(key, operation)] = TokenBucket(
+                rate=self._rates[operation], capacity=self._burst, clock=self._clock
+            )
+
+        return self._buckets[(key, operation)]
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(
+            0, min(self._backoff_max, self._backoff_base * 2**attempt)
+        )
+
+    def _retry_after(self, response: httpx.Response) -> float | None:
+        value = response.headers.get("Retry-After")
+
+        if value is None:
+            return None
+
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+
+        try:
+            retry_at = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+    def _observe_rate_limits(self, key: str, response: httpx.Response):
+        for header, value in response.headers.items():
+            match = RATE_LIMIT_REMAINING_HEADER.match(header.lower())
+            if match is None or not value.isdigit():
+                continue
+
+            operation: Operation = "read" if match.group(1) == "reads" else "write"
+            metrics.UPSTREAM_RATE_LIMIT_REMAINING.labels(
+                backend=self._backend, operation=operation
+            ).set(int(value))
+
+            if int(value) <= self._low_watermark:
+                self._bucket(key, operation).drain()
+
+    async def _timed(
+        self, key: str, send: Callable[[], Awaitable[httpx.Response]]
+    ) -> httpx.Response:
+        started_at = self._clock()
+        status = "error"
+        in_flight = metrics.UPSTREAM_REQUESTS_IN_FLIGHT.labels(backend=self._backend)
+
+        in_flight.inc()
+        try:
+            response = await send()
+            status = str(response.status_code)
+            return response
+        except httpx.TransportError as err:
+            status = type(err).__name__
+            raise
+        finally:
+            in_flight.dec()
+            metrics.UPSTREAM_REQUEST_DURATION.labels(
+                backend=self._backend,
+                endpoint=_endpoint.get(),
+                tenant=key,
+                status=status,
+            ).observe(self._clock() - started_at)
+
+    async def send(
+        self,
+        key: str,
+        method: str,
+        send: Callable[[], Awaitable[httpx.Response]],
+    ) -> httpx.Response:
+        """
+        Send a request through the rate limiter, retrying it when it is throttled or
+        fails transiently. Gives up, returning the last response, once the retries are
+        exhausted or the upstream asks to wait longer than the maximum backoff.
+        """
+        operation: Operation = "read" if method in READ_METHODS else "write"
+        bucket = self._bucket(key, operation)
+        queue_depth = metrics.UPSTREAM_REQUEST_QUEUE_DEPTH.labels(
+            backend=self._backend, operation=operation
+        )
+        attempt = 0
+
+        while True:
+            queued_at = self._clock()
+            queue_depth.inc()
+            try:
+                await bucket.acquire()
+            finally:
+                queue_depth.dec()
+            metrics.UPSTREAM_REQUEST_QUEUE_WAIT.labels(backend=self._backend).observe(
+                self._clock() - queued_at
+            )
+
+            try:
+                response = await self._timed(key=key, send=send)
+            except httpx.TransportError as err:
+                if method not in IDEMPOTENT_METHODS or attempt >= self._max_retries:
+                    raise
+
+                delay = self._backoff(attempt)
+                reason = type(err).__name__
+            else:
+                self._observe_rate_limits(key=key, response=response)
+
+                if (
+                    response.status_code not in RETRYABLE_STATUS_CODES
+                    or attempt >= self._max_retries
+                ):
+                    return response
+
+                retry_after = self._retry_after(response)
+                if retry_after is not None and retry_after > self._backoff_max:
+                    return response
+
+                delay = (
+                    retry_after if retry_after is not None else self._backoff(attempt)
+                )
+                reason = str(response.status_code)
+
+                if response.status_code == 429:
+                    bucket.pause(delay)
+
+                await response.aclose()
+
+            metrics.UPSTREAM_REQUEST_RETRIES.labels(
+                backend=self._backend, reason=reason
+            ).inc()
+            self._logger.info(
+                f"{method} request to '{key}' failed ({reason}), retrying in "
+                f"{delay:.1f}s."
+            )
+            attempt += 1
+            await asyncio.sleep(delay)
+
+
+class ScheduledTransport(httpx.AsyncBaseTransport):
+    """
+    HTTP transport that sends every request through a RequestScheduler, so that the
+    repositories are rate limited and retried without any changes to their calls.
+    """
+
+    def __init__(
+        self, transport: httpx.AsyncBaseTransport, scheduler: RequestScheduler
+    ):
+        self._transport = transport
+        self._scheduler = scheduler
+
+    def _key(self, request: httpx.Request) -> str:
+        match = SUBSCRIPTION_PATH.match(request.url.path)
+
+        if match is not None:
+            return f"{request.url.host}/subscriptions/{match.group(1).lower()}"
+
+        return f"{request.url.host}:{request.url.port or request.url.scheme}"
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._scheduler.send(
+            key=self._key(request),
+            method=request.method,
+            send=lambda: self._transport.handle_async_request(request),
+        )
+
+    async def aclose(self):
+        await self._transport.aclose()
@@ -0,0 +1,89 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, Generic, TypeVar
+
+import httpx
+from loguru import logger as default_loguru_logger
+
+T = TypeVar("T")
+
+
+def compute_fingerprint(*parts: Any) -> str:
+    """
+    Compute a stable fingerprint for the configuration a service was built from, so
+    that the registry can detect when it needs to be rebuilt.
+    """
+    return hashlib.sha256(
+        json.dumps(parts, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+class ServiceRegistry(Generic[T]):
+    """
+    Keeps one long-lived service, and the pooled HTTP client it uses, per tenant
+    namespace, or per name within a namespace, e.g. one per workspace. A service is
+    rebuilt when the fingerprint of its configuration changes, in which case the
+    previous HTTP client is closed after `retire_delay` seconds to let in-flight
+    requests complete.
+    """
+
+    def __init__(self, retire_delay: float = 60.0, logger=default_loguru_logger):
+        self._retire_delay = retire_delay
+        self._logger = logger
+        # (namespace, name) -> (fingerprint, service, HTTP client)
+        self._entries: dict[tuple[str, str], tuple[str, T, httpx.AsyncClient]] = {}
+        self._retiring: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, namespace: str, fingerprint: str, name: str = "") -> T | None:
+        entry = self._entries.get((namespace, name))
+
+        if entry is None or entry[0] != fingerprint:
+            return None
+
+        return entry[1]
+
+    def register(
+        self,
+        namespace: str,
+        fingerprint: str,
+        service: T,
+        http_client: httpx.AsyncClient,
+        name: str = "",
+    ):
+        key = (namespace, name)
+
+        if key in self._entries:
+            self._logger.info(
+                f"Configuration for '{namespace}' changed, rebuilding service."
+            )
+            self._retire(self._entries.pop(key)[2])
+
+        self._entries[key] = (fingerprint, service, http_client)
+
+    def evict(self, namespace: str):
+        """Remove every service of a namespace."""
+        for key in [key for key in self._entries if key[0] == namespace]:
+            self._retire(self._entries.pop(key)[2])
+
+    def _retire(self, http_client: httpx.AsyncClient):
+        async def close_later():
+            await asyncio.sleep(self._retire_delay)
+            await http_client.aclose()
+
+        task = asyncio.get_running_loop().create_task(close_later())
+        self._retiring.add(task)
+        task.add_done_callback(self._retiring.discard)
+
+    async def close(self):
+        """Close all HTTP clients, used when the operator shuts down."""
+        for task in self._retiring:
+            task.cancel()
+
+        for _, _, http_client in self._entries.values():
+            await http_client.aclose()
+
+        self._entries.clear()
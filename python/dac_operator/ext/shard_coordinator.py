@@ -0,0 +1,410 @@
+import asyncio
+import collections
+import contextlib
+import hashlib
+import time
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Awaitable, Callable
+
+from loguru import logger as default_loguru_logger
+
+from dac_operator import metrics
+from dac_operator.ext import kubernetes_exceptions, kubernetes_models
+from dac_operator.ext.kubernetes_client import AsyncKubernetesClient
+
+MEMBER_LABEL = "buildrlabs.io/dac-operator-member"
+SHARD_LABEL = "buildrlabs.io/dac-operator-shard"
+
+OnAcquired = Callable[[set[int]], Awaitable[None]]
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.sha256(value.encode()).digest()[:8], "big")
+
+
+def _is_expired(lease: kubernetes_models.Lease) -> bool:
+    if lease.renew_time is None or lease.lease_duration_seconds is None:
+        return True
+
+    expires_at = lease.renew_time + timedelta(seconds=lease.lease_duration_seconds)
+    return expires_at < datetime.now(timezone.utc)
+
+
+class ShardCoordinator:
+    """
+    Spreads namespaces (tenants) across the replicas of the operator, so that every
+    namespace is reconciled by exactly one replica at a time.
+
+    Namespaces are hashed onto a fixed number of shards, so that the number of leases
+    does not grow with the number of tenants. Each shard is assigned to one of the
+    live replicas by rendezvous hashing, so that only the shards of a replica that
+    joins or leaves move. Replicas announce themselves with a member lease, and a
+    replica only handles a shard while it holds the shard's lease.
+
+    A shard that moves is handed off: the previous owner stops starting work for it,
+    waits for the work in progress to finish and releases the lease, which the next
+    owner then takes over. The leases of a replica that stops renewing them expire,
+    and a replica stops handling a shard as soon as it was unable to renew its lease
+    in time, before any other replica can take it over.
+
+    When sharding is disabled, every namespace is handled and no lease is used.
+    """
+
+    def __init__(
+        self,
+        identity: str,
+        namespace: str,
+        shard_count: int,
+        lease_duration: int,
+        renew_interval: float,
+        enabled: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+        logger=default_loguru_logger,
+    ):
+        self._identity = identity
+        self._namespace = namespace
+        self._shard_count = shard_count
+        self._lease_duration = lease_duration
+        self._renew_interval = renew_interval
+        self._enabled = enabled
+        self._clock = clock
+        self._logger = logger
+        self._members: list[str] = [identity]
+        # Leases of the shards held by this replica, and when they expire locally
+        self._leases: dict[int, kubernetes_models.Lease] = {}
+        self._expires_at: dict[int, float] = {}
+        # Shards that no new work is started for, until they are released
+        self._releasing: set[int] = set()
+        self._in_flight: collections.Counter[int] = collections.Counter()
+        self._background_tasks: set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    def shard_of(self, namespace: str) -> int:
+        return _hash(namespace) % self._shard_count
+
+    def owner_of(self, shard: int) -> str:
+        """The replica a shard is assigned to, out of the live replicas."""
+        return max(self._members, key=lambda member: _hash(f"{shard}/{member}"))
+
+    def owns(self, namespace: str) -> bool:
+        """Whether new work for a namespace may be started by this replica."""
+        if not self._enabled:
+            return True
+
+        shard = self.shard_of(namespace)
+        return (
+            shard in self._leases
+            and shard not in self._releasing
+            and self._clock() < self._expires_at[shard]
+        )
+
+    @contextlib.asynccontextmanager
+    async def hold(self, namespace: str) -> AsyncIterator[bool]:
+        """
+        Keep the shard of a namespace from being handed off while working on it.
+
+        Yields:
+            bool: False if the namespace is handled by another replica, in which
+                case nothing should be done
+        """
+        if not self.owns(namespace):
+            yield False
+            return
+
+        shard = self.shard_of(namespace)
+        self._in_flight[shard] += 1
+        try:
+            yield True
+        finally:
+            self._in_flight[shard] -= 1
+            if not self._in_flight[shard]:
+                del self._in_flight[shard]
+
+    def _member_lease_name(self) -> str:
+        return f"dac-operator-member-{self._identity}"
+
+    def _shard_lease_name(self, shard: int) -> str:
+        return f"dac-operator-shard-{shard}"
+
+    def _update_metrics(self):
+        metrics.SHARDS_OWNED.set(len(self._leases))
+        metrics.SHARD_MEMBERS.set(len(self._members))
+
+    def _drop(self, shard: int, direction: str):
+        self._leases.pop(shard, None)
+        self._expires_at.pop(shard, None)
+        self._releasing.discard(shard)
+        metrics.SHARD_HANDOFFS.labels(direction=direction).inc()
+
+    async def _renew_member(
+        self, kubernetes_client: AsyncKubernetesClient
+    ) -> list[kubernetes_models.Lease]:
+        """Renew the member lease of this replica, and return those of the others."""
+        leases = await kubernetes_client.list_leases(
+            namespace=self._namespace, label_selector=MEMBER_LABEL
+        )
+        name = self._member_lease_name()
+        own = next((lease for lease in leases if lease.name == name), None)
+        renewed = kubernetes_models.Lease(
+            name=name,
+            labels={MEMBER_LABEL: "true"},
+            holder_identity=self._identity,
+            lease_duration_seconds=self._lease_duration,
+            renew_time=datetime.now(timezone.utc),
+            resource_version=own.resource_version if own else None,
+        )
+
+        if own is None:
+            await kubernetes_client.create_lease(
+                namespace=self._namespace, lease=renewed
+            )
+        else:
+            await kubernetes_client.replace_lease(
+                namespace=self._namespace, lease=renewed
+            )
+
+        return [lease for lease in leases if lease.name != name]
+
+    async def _write_shard_lease(
+        self,
+        kubernetes_client: AsyncKubernetesClient,
+        shard: int,
+        lease: kubernetes_models.Lease,
+        create: bool = False,
+    ):
+        renewed_at = self._clock()
+
+        if create:
+            resource_version = await kubernetes_client.create_lease(
+                namespace=self._namespace, lease=lease
+            )
+        else:
+            resource_version = await kubernetes_client.replace_lease(
+                namespace=self._namespace, lease=lease
+            )
+
+        self._leases[shard] = lease.model_copy(
+            update={"resource_version": resource_version}
+        )
+        # Other replicas only consider the lease expired a full lease duration after
+        # the renewal they read, so counting from before the request is on the safe
+        # side
+        self._expires_at[shard] = renewed_at + self._lease_duration
+
+    async def _acquire(
+        self,
+        kubernetes_client: AsyncKubernetesClient,
+        shard: int,
+        current: kubernetes_models.Lease | None,
+    ) -> bool:
+        """Take over a shard that is free, or whose lease expired."""
+        lease = kubernetes_models.Lease(
+            name=self._shard_lease_name(shard),
+            labels={SHARD_LABEL: str(shard)},
+            holder_identity=self._identity,
+            lease_duration_seconds=self._lease_duration,
+            renew_time=datetime.now(timezone.utc),
+        )
+
+        if current is None:
+            await self._write_shard_lease(kubernetes_client, shard, lease, create=True)
+            return True
+
+        holder = current.holder_identity
+        if holder not in (None, self._identity) and not _is_expired(current):
+            # The previous owner is still handing it off
+            return False
+
+        lease.lease_transitions = current.lease_transitions
+        if holder != self._identity:
+            lease.lease_transitions += 1
+
+        lease.resource_version = current.resource_version
+        await self._write_shard_lease(kubernetes_client, shard, lease)
+        return True
+
+    async def _release(self, kubernetes_client: AsyncKubernetesClient, shard: int):
+        """Give up a shard, so that the next owner can take it over right away."""
+        lease = self._leases[shard].model_copy(
+            update={"holder_identity": None, "renew_time": None}
+        )
+
+        try:
+            await kubernetes_client.replace_lease(
+                namespace=self._namespace, lease=lease
+            )
+        except (
+            kubernetes_exceptions.ResourceConflictException,
+            kubernetes_exceptions.ResourceNotFoundException,
+        ):
+            self._drop(shard, direction="lost")
+            return
+
+        self._drop(shard, direction="released")
+        self._logger.info(f"Released shard {shard}.")
+
+    async def _sync_shard(
+        self,
+        kubernetes_client: AsyncKubernetesClient,
+        shard: int,
+        current: kubernetes_models.Lease | None,
+    ) -> bool:
+        """
+        Renew, acquire or hand off the lease of a shard.
+
+        Returns:
+            bool: True if the shard was taken over from another replica
+        """
+        assigned = self.owner_of(shard) == self._identity
+
+        if shard not in self._leases:
+            return assigned and await self._acquire(kubernetes_client, shard, current)
+
+        if not assigned:
+            # Stop starting work for the shard, and keep the lease until the work in
+            # progress is done
+            self._releasing.add(shard)
+
+            if not self._in_flight[shard]:
+                await self._release(kubernetes_client, shard)
+                return False
+        else:
+            self._releasing.discard(shard)
+
+        lease = self._leases[shard].model_copy(
+            update={"renew_time": datetime.now(timezone.utc)}
+        )
+
+        try:
+            await self._write_shard_lease(kubernetes_client, shard, lease)
+        except (
+            kubernetes_exceptions.ResourceConflictException,
+            kubernetes_exceptions.ResourceNotFoundException,
+        ):
+            self._logger.warning(f"Lost shard {shard} to another replica.")
+            self._drop(shard, direction="lost")
+
+        return False
+
+    async def sync(
+        self, kubernetes_client: AsyncKubernetesClient, on_acquired: OnAcquired
+    ):
+        """
+        Renew the leases of this replica, hand off the shards that are assigned to
+        other replicas and take over the ones that are assigned to this one.
+        """
+        members = await self._renew_member(kubernetes_client)
+        self._members = sorted(
+            {self._identity}
+            | {
+                lease.holder_identity
+                for lease in members
+                if lease.holder_identity and not _is_expired(lease)
+            }
+        )
+
+        current = {
+            lease.name: lease
+            for lease in await kubernetes_client.list_leases(
+                namespace=self._namespace, label_selector=SHARD_LABEL
+            )
+        }
+        acquired: set[int] = set()
+
+        for shard in range(self._shard_count):
+            try:
+                if await self._sync_shard(
+                    kubernetes_client,
+                    shard=shard,
+                    current=current.get(self._shard_lease_name(shard)),
+                ):
+                    acquired.add(shard)
+            except kubernetes_exceptions.ResourceConflictException:
+                # Another replica wrote the lease first
+                continue
+            except Exception:
+                self._logger.exception(f"Unable to sync the lease of shard {shard}.")
+
+        self._update_metrics()
+
+        if not acquired:
+            return
+
+        metrics.SHARD_HANDOFFS.labels(direction="acquired").inc(len(acquired))
+        self._logger.info(
+            f"Took over {len(acquired)} shard(s), handling {len(self._leases)} of "
+            f"{self._shard_count} across {len(self._members)} replica(s)."
+        )
+
+        task = asyncio.create_task(on_acquired(acquired))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    def _expire(self):
+        """Stop handling the shards whose leases could not be renewed in time."""
+        now = self._clock()
+
+        for shard, expires_at in list(self._expires_at.items()):
+            if now >= expires_at:
+                self._logger.error(
+                    f"Unable to renew the lease of shard {shard} in time, dropping it."
+                )
+                self._drop(shard, direction="lost")
+
+        self._update_metrics()
+
+    async def run(
+        self, kubernetes_client: AsyncKubernetesClient, on_acquired: OnAcquired
+    ):
+        """
+        Keep the leases of this replica up to date, calling `on_acquired` with the
+        shards that were taken over, e.g. to reconcile their namespaces.
+        """
+        while True:
+            started_at = self._clock()
+
+            try:
+                await self.sync(kubernetes_client, on_acquired=on_acquired)
+            except Exception:
+                self._logger.exception("Unable to sync the shard leases.")
+
+            self._expire()
+            await asyncio.sleep(
+                max(0.0, self._renew_interval - (self._clock() - started_at))
+            )
+
+    async def stop(self, kubernetes_client: AsyncKubernetesClient):
+        """
+        Hand off every shard and leave, e.g. on shutdown, so that the other replicas
+        take the shards over right away instead of once their leases expired.
+        """
+        for task in self._background_tasks:
+            task.cancel()
+
+        self._releasing.update(self._leases)
+
+        # The leases are no longer renewed, so wait no longer than they are valid
+        deadline = min(self._expires_at.values(), default=self._clock())
+        while self._in_flight and self._clock() < deadline:
+            await asyncio.sleep(0.1)
+
+        for shard in list(self._leases):
+            if self._in_flight[shard]:
+                continue
+
+            try:
+                await self._release(kubernetes_client, shard)
+            except Exception:
+                self._logger.exception(f"Unable to release shard {shard}.")
+
+        try:
+            await kubernetes_client.delete_lease(
+                name=self._member_lease_name(), namespace=self._namespace
+            )
+        except Exception:
+            self._logger.exception("Unable to remove the member lease.")
+
+        self._update_metrics()
@@ -0,0 +1,184 @@
+import asyncio
+import json
+import sqlite3
+import time
+import zlib
+from collections import defaultdict
+
+from loguru import logger as default_loguru_logger
+
+from dac_operator import metrics
+
+# (scope, collection, rule ID)
+StateKey = tuple[str, str, str]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS upstream_rules (
+    scope TEXT NOT NULL,
+    collection TEXT NOT NULL,
+    rule_id TEXT NOT NULL,
+    etag TEXT NOT NULL,
+    body BLOB NOT NULL,
+    PRIMARY KEY (scope, collection, rule_id)
+) WITHOUT ROWID
+"""
+
+
+class StateStore:
+    """
+    Embedded SQLite store for the latest version of every rule seen upstream, per
+    scope (e.g. a workspace), so that the repositories keep sending conditional
+    requests by e-tag after a restart instead of downloading and overwriting every
+    rule once more.
+
+    The store only backs an in-memory cache: every row is read in bulk when the
+    store is opened, and writes are buffered and flushed in a single transaction
+    every few seconds. Rows lost in a crash only cost an unconditional request.
+    Reads and writes after the store was opened run in a worker thread, one at a
+    time, so that they do not block the event loop.
+    """
+
+    def __init__(self, path: str, logger=default_loguru_logger):
+        self._path = path
+        self._logger = logger
+        self._connection: sqlite3.Connection | None = None
+        # Scope -> collection -> rule ID -> rule, read when the store is opened and
+        # handed over to the repositories
+        self._loaded: dict[str, dict[str, dict[str, dict]]] = {}
+        # Rows to write on the next flush, or None to delete them
+        self._pending: dict[StateKey, dict | None] = {}
+        # Serializes the use of the connection by the worker threads, so that the
+        # buffered changes are written in order
+        self._lock = asyncio.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._path)
+
+    def open(self):
+        """Open (or create) the database, and read every row into memory."""
+        if not self.enabled:
+            return
+
+        started_at = time.monotonic()
+        self._connection = sqlite3.connect(
+            self._path, isolation_level=None, check_same_thread=False
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(SCHEMA)
+
+        rows = self._connection.execute(
+            "SELECT scope, collection, rule_id, body FROM upstream_rules"
+        )
+        count = 0
+        loaded: dict[str, dict[str, dict[str, dict]]] = defaultdict(
+            lambda: defaultdict(dict)
+        )
+
+        for scope, collection, rule_id, body in rows:
+            loaded[scope][collection][rule_id] = json.loads(zlib.decompress(body))
+            count += 1
+
+        self._loaded = {scope: dict(rules) for scope, rules in loaded.items()}
+        self._logger.info(
+            f"Loaded {count} upstream rule(s) of {len(self._loaded)} scope(s) from "
+            f"'{self._path}' in {time.monotonic() - started_at:.2f}s."
+        )
+
+    async def load(self, scope: str) -> dict[str, dict[str, dict]]:
+        """
+        The rules of a scope by collection and rule ID. The rows read when the store
+        was opened are handed over once, and read from the database afterwards, e.g.
+        when a repository is replaced after its configuration changed.
+        """
+        if scope in self._loaded:
+            return self._loaded.pop(scope)
+
+        if self._connection is None:
+            return {}
+
+        await self.flush()
+
+        async with self._lock:
+            return await asyncio.to_thread(self._read, scope)
+
+    def _read(self, scope: str) -> dict[str, dict[str, dict]]:
+        assert self._connection is not None
+        rules: dict[str, dict[str, dict]] = defaultdict(dict)
+
+        for collection, rule_id, body in self._connection.execute(
+            "SELECT collection, rule_id, body FROM upstream_rules WHERE scope = ?",
+            (scope,),
+        ):
+            rules[collection][rule_id] = json.loads(zlib.decompress(body))
+
+        return dict(rules)
+
+    def put(self, scope: str, collection: str, rule_id: str, rule: dict):
+        if self._connection is not None:
+            self._pending[(scope, collection, rule_id)] = rule
+
+    def delete(self, scope: str, collection: str, rule_id: str):
+        if self._connection is not None:
+            self._pending[(scope, collection, rule_id)] = None
+
+    async def flush(self):
+        """Write the buffered changes in a single transaction."""
+        async with self._lock:
+            if self._connection is None or not self._pending:
+                return
+
+            pending, self._pending = self._pending, {}
+
+            try:
+                await asyncio.to_thread(self._write, pending)
+            except sqlite3.Error:
+                # Retried on the next flush, unless the rows were changed since
+                self._pending = {**pending, **self._pending}
+                raise
+
+    def _write(self, pending: dict[StateKey, dict | None]):
+        assert self._connection is not None
+        started_at = time.monotonic()
+        upserts = [
+            (*key, rule["etag"], zlib.compress(json.dumps(rule).encode()))
+            for key, rule in pending.items()
+            if rule is not None
+        ]
+        deletes = [key for key, rule in pending.items() if rule is None]
+
+        with self._connection:
+            self._connection.execute("BEGIN")
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO upstream_rules VALUES (?, ?, ?, ?, ?)",
+                upserts,
+            )
+            self._connection.executemany(
+                "DELETE FROM upstream_rules "
+                "WHERE scope = ? AND collection = ? AND rule_id = ?",
+                deletes,
+            )
+
+        metrics.STATE_STORE_FLUSH_DURATION.observe(time.monotonic() - started_at)
+
+    async def run(self, interval: float):
+        """Periodically flush the buffered changes."""
+        while True:
+            await asyncio.sleep(interval)
+
+            try:
+                await self.flush()
+            except sqlite3.Error:
+                self._logger.exception(f"Unable to write to '{self._path}'.")
+
+    async def close(self):
+        if self._connection is None:
+            return
+
+        try:
+            await self.flush()
+        finally:
+            async with self._lock:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,288 @@
+import asyncio
+import collections
+import enum
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Mapping
+
+from loguru import logger as default_loguru_logger
+
+from dac_operator import metrics
+
+# (namespace, kind, name)
+WorkKey = tuple[str, str, str]
+Job = Callable[[], Awaitable[None]]
+
+
+class Priority(enum.IntEnum):
+    # Changes made by users, e.g. a rule or a macro that was created or updated
+    USER = 0
+    # Periodic checks for changes made upstream
+    DRIFT = 1
+
+
+@dataclass
+class _Item:
+    job: Job
+    priority: Priority
+    enqueued_at: float
+
+
+@dataclass
+class _Tenant:
+    weight: float
+    virtual_time: float = 0.0
+    pending: int = 0
+    running: int = 0
+    queues: dict[Priority, collections.deque[WorkKey]] = field(
+        default_factory=lambda: {priority: collections.deque() for priority in Priority}
+    )
+
+
+class WorkQueue:
+    """
+    Deduplicating queue of reconciliations, shared by every tenant (namespace).
+
+    A key is queued at most once, however often it is enqueued, and only its latest
+    job of the highest priority it was enqueued with is run, at that priority. Jobs
+    queued at a lower priority, e.g. from a listing that may predate the change a
+    user made, never replace it. A key that is enqueued while it is being processed
+    is processed again afterwards, so that concurrent reconciliations of the same
+    object never happen.
+
+    User changes always go before drift checks. Within a priority, tenants take turns
+    in proportion to their weight (start-time fair queueing), so that a tenant with
+    thousands of rules does not delay the rules of others. Each tenant runs at most
+    `tenant_workers` jobs at once, out of `workers` in total.
+
+    Keys of namespaces that are not admitted, e.g. because they are handled by
+    another replica of the operator, are dropped when they are enqueued.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        tenant_workers: int | None = None,
+        tenant_weights: Mapping[str, float] | None = None,
+        admit: Callable[[str], bool] | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        logger=default_loguru_logger,
+    ):
+        self._workers = workers
+        self._tenant_workers = tenant_workers or workers
+        self._tenant_weights = dict(tenant_weights or {})
+        self._admit = admit
+        self._clock = clock
+        self._logger = logger
+        self._tenants: dict[str, _Tenant] = {}
+        self._pending: dict[WorkKey, _Item] = {}
+        self._running: set[WorkKey] = set()
+        self._virtual_time = 0.0
+        self._deferred: dict[WorkKey, asyncio.TimerHandle] = {}
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks: list[asyncio.Task] = []
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _tenant(self, namespace: str) -> _Tenant:
+        tenant = self._tenants.get(namespace)
+
+        if tenant is None:
+            tenant = _Tenant(weight=self._tenant_weights.get(namespace, 1.0))
+            self._tenants[namespace] = tenant
+
+        if tenant.pending == 0 and tenant.running == 0:
+            # An idle tenant does not save up turns to burst with later on
+            tenant.virtual_time = max(tenant.virtual_time, self._virtual_time)
+
+        return tenant
+
+    def _update_idle(self):
+        if self._pending or self._running or self._deferred:
+            self._idle.clear()
+        else:
+            self._idle.set()
+
+    def _push(self, key: WorkKey, priority: Priority):
+        self._tenants[key[0]].queues[priority].append(key)
+        self._wakeup.set()
+
+    def enqueue(
+        self, key: WorkKey, job: Job, priority: Priority = Priority.USER
+    ) -> bool:
+        """
+        Queue a job for a key.
+
+        Returns:
+            bool: False if the job was merged with one that was already queued, or
+                dropped because its namespace is not admitted
+        """
+        if self._admit is not None and not self._admit(key[0]):
+            return False
+
+        item = self._pending.get(key)
+
+        if item is not None:
+            if priority <= item.priority:
+                item.job = job
+
+            if priority < item.priority:
+                metrics.WORK_QUEUE_DEPTH.labels(priority=item.priority.name).dec()
+                metrics.WORK_QUEUE_DEPTH.labels(priority=priority.name).inc()
+                item.priority = priority
+
+                if key not in self._running:
+                    # The entry at the previous priority is skipped when it comes up
+                    self._push(key, priority)
+
+            return False
+
+        tenant = self._tenant(key[0])
+        tenant.pending += 1
+        self._pending[key] = _Item(
+            job=job, priority=priority, enqueued_at=self._clock()
+        )
+        metrics.WORK_QUEUE_DEPTH.labels(priority=priority.name).inc()
+        self._idle.clear()
+
+        if key not in self._running:
+            self._push(key, priority)
+
+        return True
+
+    def enqueue_after(
+        self,
+        delay: float,
+        key: WorkKey,
+        job: Job,
+        priority: Priority = Priority.USER,
+    ):
+        """
+        Queue a job for a key once a delay has passed, e.g. to retry a write that is
+        known to fail until then. Deferring a key again replaces its previous delay.
+        """
+        handle = self._deferred.pop(key, None)
+        if handle is not None:
+            handle.cancel()
+
+        self._deferred[key] = asyncio.get_running_loop().call_later(
+            delay, self._enqueue_deferred, key, job, priority
+        )
+        metrics.WORK_QUEUE_DEFERRED.set(len(self._deferred))
+        self._idle.clear()
+
+    def _enqueue_deferred(self, key: WorkKey, job: Job, priority: Priority):
+        del self._deferred[key]
+        metrics.WORK_QUEUE_DEFERRED.set(len(self._deferred))
+        self.enqueue(key=key, job=job, priority=priority)
+        # The job is dropped when its namespace is no longer admitted
+        self._update_idle()
+
+    def _peek(self, tenant: _Tenant, priority: Priority) -> bool:
+        """Drop stale entries, and return whether a key is ready at the priority."""
+        queue = tenant.queues[priority]
+
+        while queue:
+            key = queue[0]
+            item = self._pending.get(key)
+
+            if item is not None and item.priority == priority:
+                if key not in self._running:
+                    return True
+
+            # Superseded by a higher priority, or queued again once it is done
+            queue.popleft()
+
+        return False
+
+    def _next(self) -> tuple[WorkKey, _Item] | None:
+        for priority in Priority:
+            candidates = [
+                tenant
+                for tenant in self._tenants.values()
+                if tenant.running < self._tenant_workers
+                and self._peek(tenant, priority)
+            ]
+            if not candidates:
+                continue
+
+            tenant = min(candidates, key=lambda candidate: candidate.virtual_time)
+            self._virtual_time = tenant.virtual_time
+            tenant.virtual_time += 1 / tenant.weight
+
+            key = tenant.queues[priority].popleft()
+            item = self._pending.pop(key)
+            tenant.pending -= 1
+            tenant.running += 1
+            self._running.add(key)
+
+            return key, item
+
+        return None
+
+    def _done(self, key: WorkKey):
+        self._running.discard(key)
+        tenant = self._tenants[key[0]]
+        tenant.running -= 1
+
+        item = self._pending.get(key)
+        if item is not None:
+            self._push(key, item.priority)
+        elif tenant.pending == 0 and tenant.running == 0:
+            del self._tenants[key[0]]
+
+        # A slot of the tenant is free again
+        self._wakeup.set()
+        self._update_idle()
+
+    async def _work(self):
+        while True:
+            entry = self._next()
+
+            if entry is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            key, item = entry
+            started_at = self._clock()
+            metrics.WORK_QUEUE_DEPTH.labels(priority=item.priority.name).dec()
+            metrics.WORK_QUEUE_LATENCY.labels(
+                kind=key[1], priority=item.priority.name
+            ).observe(started_at - item.enqueued_at)
+
+            try:
+                await item.job()
+            except Exception:
+                self._logger.exception(f"Unable to process '{'/'.join(key)}'.")
+            finally:
+                metrics.WORK_QUEUE_DURATION.labels(kind=key[1]).observe(
+                    self._clock() - started_at
+                )
+                self._done(key)
+
+    async def join(self):
+        """
+        Wait until no job is queued, running or deferred, e.g. to drain the queue
+        before measuring or shutting down.
+        """
+        await self._idle.wait()
+
+    def start(self):
+        for _ in range(self._workers):
+            self._tasks.append(asyncio.create_task(self._work()))
+
+    async def stop(self):
+        for handle in self._deferred.values():
+            handle.cancel()
+        self._deferred.clear()
+
+        for task in self._tasks:
+            task.cancel()
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._update_idle()
@@ -0,0 +1,56 @@
+import kopf
+from loguru import logger
+
+from dac_operator import providers
+from dac_operator.ext import kubernetes_models
+
+
+def is_tenant_configuration(name, **_) -> bool:
+    return name in providers.CONFIGURATION_NAMES
+
+
+def is_tenant_secret(name, namespace, **_) -> bool:
+    return providers.is_referenced_secret(name=name, namespace=namespace)
+
+
+@kopf.on.event("configmaps", when=is_tenant_configuration)  # type: ignore
+async def watch_tenant_configuration(event, body, name, namespace, **_):
+    providers.config_map_cache.record_event()
+
+    if event["type"] == "DELETED":
+        logger.info(f"Configuration '{name}' was removed from '{namespace}'.")
+        providers.config_map_cache.delete(name=name, namespace=namespace)
+
+        if name == providers.MICROSOFT_SENTINEL_CONFIGURATION:
+            providers.microsoft_sentinel_services.evict(namespace=namespace)
+        elif name == providers.SPLUNK_CONFIGURATION:
+            providers.splunk_services.evict(namespace=namespace)
+        return
+
+    providers.config_map_cache.set(
+        name=name,
+        namespace=namespace,
+        value=kubernetes_models.ConfigMap(
+            api_version=body["apiVersion"],
+            kind=body["kind"],
+            data=dict(body.get("data") or {}),
+            immutable=body.get("immutable"),
+        ),
+        resource_version=body["metadata"].get("resourceVersion"),
+    )
+
+
+@kopf.on.event("secrets", when=is_tenant_secret)  # type: ignore
+async def watch_tenant_secret(event, body, name, namespace, **_):
+    providers.secret_cache.record_event()
+
+    if event["type"] == "DELETED":
+        providers.secret_cache.delete(name=name, namespace=namespace)
+        return
+
+    providers.secret_cache.set(
+        name=name,
+        namespace=namespace,
+        value=dict(body.get("data") or {}),
+        resource_version=body["metadata"].get("resourceVersion"),
+    )
@@ -0,0 +1,19 @@
+import kopf
+
+from dac_operator.handlers import object_reconciler
+from dac_operator.handlers.microsoft_sentinel.analytic_rules import (
+    analytic_rule_reconciler,
+)
+
+needs_reconcile = object_reconciler.needs_reconcile(analytic_rule_reconciler.STATUS_KEY)
+
+
+@kopf.on.create(analytic_rule_reconciler.PLURAL, id="enqueue-on-create")  # type: ignore
+@kopf.on.update(  # type: ignore
+    analytic_rule_reconciler.PLURAL, id="enqueue-on-update", when=needs_reconcile
+)
+@kopf.on.resume(  # type: ignore
+    analytic_rule_reconciler.PLURAL, id="enqueue-on-resume", when=needs_reconcile
+)
+async def enqueue_analytic_rule(name, namespace, **_):
+    analytic_rule_reconciler.enqueue_analytic_rule(namespace=namespace, rule_name=name)
@@ -0,0 +1,634 @@
+import asyncio
+import functools
+from enum import StrEnum
+from typing import Any, Iterable, Literal, Mapping
+
+from loguru import logger
+from pydantic import BaseModel, ValidationError
+
+from dac_operator import metrics, providers
+from dac_operator.ext import drift_detection
+from dac_operator.ext.work_queue import Priority
+from dac_operator.handlers import object_reconciler
+from dac_operator.microsoft_sentinel import (
+    microsoft_sentinel_exceptions,
+    microsoft_sentinel_models,
+)
+from dac_operator.microsoft_sentinel.microsoft_sentinel_service import (
+    MicrosoftSentinelService,
+)
+
+GROUP = object_reconciler.GROUP
+VERSION = object_reconciler.VERSION
+PLURAL = "microsoftsentinelanalyticrules"
+
+# The status of analytic rules is stored under the ID of the timer handler
+STATUS_KEY = "create_analytic_rule"
+
+ALLOWED_NAMESPACES = [
+    "a1b2c3d4",
+    "ce06ce71",
+]
+
+ALLOWED_RULE_NAMES = [
+    "example-analytic-rule-1",
+    "example-analytic-rule-2",
+    "example-analytic-rule-3",
+]
+
+QUERY_FIELDS = ["query", "queryPrefix", "querySuffix"]
+
+# Fields of the spec that select the workspaces the rule is deployed to
+TARGET_FIELDS = ["workspaces", "workspaceSelector"]
+
+
+class ErrorMessages(StrEnum):
+    initialization_error = "Unable to configure provider, see controller logs."
+    automation_rule_create_error = "Unable to create Automation Rule upstream."
+    analytics_rule_create_error = "Unable to create Analytics Rule upstream."
+    analytics_rule_delete_error = "Unable to delete Analytics Rule upstream."
+
+
+class TargetStatus(BaseModel):
+    deployed: Literal["Deployed", "Not deployed", "PendingRecreate", "Unknown"] = (
+        "Unknown"
+    )
+    enabled: Literal["Enabled", "Disabled", "Unknown"] = "Unknown"
+    rule_type: str = "Unknown"
+    message: str = ""
+    # Hash of the payload last applied upstream, and when the upstream copy was last
+    # compared against it
+    content_hash: str | None = None
+    last_drift_check: str | None = None
+    # Number of conflicts in a row while writing the rule upstream, and when it is
+    # written again
+    conflict_attempts: int = 0
+    next_attempt: str | None = None
+
+
+class AnalyticsRuleStatus(TargetStatus):
+    # Generation of the object that was last deployed successfully
+    observed_generation: int | None = None
+    # Status per workspace, when the rule targets workspaces explicitly. The status
+    # of the rule itself then summarizes them.
+    targets: dict[str, TargetStatus] | None = None
+
+
+def _parse_status(status: dict | None) -> AnalyticsRuleStatus:
+    try:
+        return AnalyticsRuleStatus.model_validate(status or {})
+    except ValidationError:
+        return AnalyticsRuleStatus()
+
+
+def _target_status(status: TargetStatus) -> TargetStatus:
+    return TargetStatus.model_validate(
+        status.model_dump(include=set(TargetStatus.model_fields))
+    )
+
+
+def _describe(namespace: str, rule_name: str, workspace: str) -> str:
+    if workspace == providers.DEFAULT_WORKSPACE:
+        return f"'{rule_name}' in '{namespace}'"
+
+    return f"'{rule_name}' in '{namespace}' (workspace '{workspace}')"
+
+
+def _defer_after_conflict(
+    namespace: str,
+    rule_name: str,
+    workspace: str,
+    previous: TargetStatus,
+    err: microsoft_sentinel_exceptions.RuleConflictException,
+) -> TargetStatus:
+    """
+    Retry a write that was rejected with a conflict once it is expected to succeed,
+    with a delay that doubles on every conflict in a row.
+    """
+    delay = object_reconciler.conflict_retry_delay(previous.conflict_attempts)
+    next_attempt = object_reconciler.from_now(delay)
+
+    logger.info(
+        f"{_describe(namespace, rule_name, workspace)} conflicts upstream "
+        f"({err.reason}), retrying after {next_attempt}."
+    )
+    metrics.RULE_RECONCILE_OUTCOMES.labels(kind=PLURAL, outcome="deferred").inc()
+    metrics.RULE_CONFLICTS.labels(kind=PLURAL, reason=type(err).__name__).inc()
+    enqueue_analytic_rule(namespace=namespace, rule_name=rule_name, delay=delay)
+
+    recently_deleted = isinstance(
+        err, microsoft_sentinel_exceptions.RuleRecentlyDeletedException
+    )
+    return previous.model_copy(
+        update={
+            "deployed": "PendingRecreate" if recently_deleted else previous.deployed,
+            "message": f"Conflict upstream ({err.reason}), retrying later.",
+            "conflict_attempts": previous.conflict_attempts + 1,
+            "next_attempt": next_attempt,
+        }
+    )
+
+
+def _to_status(
+    analytics_rule_status: microsoft_sentinel_models.AnalyticsRuleStatus,
+    content_hash: str,
+) -> TargetStatus:
+    return TargetStatus(
+        rule_type=analytics_rule_status.rule_type,
+        deployed="Deployed" if analytics_rule_status.deployed else "Not deployed",
+        enabled="Enabled" if analytics_rule_status.enabled else "Disabled",
+        content_hash=content_hash,
+        last_drift_check=drift_detection.now(),
+    )
+
+
+def _summarize(targets: dict[str, TargetStatus]) -> TargetStatus:
+    """
+    The status of a rule that targets several workspaces: deployed once it is
+    deployed to all of them, with the most pressing drift check and retry.
+    """
+    statuses = list(targets.values())
+    if not statuses:
+        return TargetStatus(
+            deployed="Not deployed",
+            message="No configured workspace matches the workspaces of the rule.",
+        )
+
+    deployed = sum(status.deployed == "Deployed" for status in statuses)
+    failures = [
+        f"{name}: {status.message}"
+        for name, status in targets.items()
+        if status.deployed != "Deployed" and status.message
+    ]
+
+    if deployed == len(statuses):
+        state = "Deployed"
+    elif any(status.deployed == "PendingRecreate" for status in statuses):
+        state = "PendingRecreate"
+    elif any(status.deployed == "Not deployed" for status in statuses):
+        state = "Not deployed"
+    else:
+        state = "Unknown"
+
+    def common(values: list) -> Any:
+        return values[0] if len(set(values)) == 1 else None
+
+    drift_checks = [status.last_drift_check for status in statuses]
+    next_attempts = [status.next_attempt for status in statuses if status.next_attempt]
+
+    return TargetStatus(
+        deployed=state,
+        enabled=common([status.enabled for status in statuses]) or "Unknown",
+        rule_type=common([status.rule_type for status in statuses]) or "Unknown",
+        message="; ".join(
+            [f"Deployed to {deployed} of {len(statuses)} workspace(s)", *failures]
+        ),
+        content_hash=common([status.content_hash for status in statuses]),
+        last_drift_check=(
+            None if None in drift_checks else min(drift_checks)  # type: ignore
+        ),
+        conflict_attempts=max(status.conflict_attempts for status in statuses),
+        next_attempt=min(next_attempts, default=None),
+    )
+
+
+async def _reconcile_target(
+    microsoft_sentinel_service: MicrosoftSentinelService,
+    namespace: str,
+    rule_name: str,
+    workspace: str,
+    payload: microsoft_sentinel_models.CreateScheduledAlertRule,
+    rendered: dict,
+    content_hash: str,
+    previous: TargetStatus,
+    listing: Mapping[str, dict] | None = None,
+    replaces_legacy: bool = False,
+) -> TargetStatus:
+    """
+    Create or update a rendered analytic rule in a single workspace, unless it is
+    unchanged since it was last applied there.
+
+    Args:
+        replaces_legacy(bool): Whether the rule may have been deployed to the
+            workspace under its legacy ID
+
+    Returns:
+        TargetStatus: The status of the rule in the workspace, which is `previous`
+            when nothing was done
+    """
+    unchanged = (
+        content_hash == previous.content_hash and previous.deployed == "Deployed"
+    )
+
+    if listing is not None:
+        upstream = listing.get(
+            microsoft_sentinel_service.compute_analytics_rule_id(rule_name=rule_name)
+        )
+    elif unchanged and not drift_detection.is_drift_check_due(
+        previous.last_drift_check, providers.settings.drift_check_interval
+    ):
+        metrics.RULE_RECONCILE_OUTCOMES.labels(kind=PLURAL, outcome="unchanged").inc()
+        return previous
+    elif unchanged:
+        upstream = await microsoft_sentinel_service.get_analytics_rule(
+            rule_name=rule_name
+        )
+    else:
+        upstream = None
+
+    if upstream is not None and drift_detection.matches_upstream(rendered, upstream):
+        metrics.RULE_RECONCILE_OUTCOMES.labels(kind=PLURAL, outcome="in_sync").inc()
+        return _to_status(
+            microsoft_sentinel_service.to_analytics_rule_status(upstream),
+            content_hash=content_hash,
+        )
+
+    if unchanged:
+        logger.info(
+            f"{_describe(namespace, rule_name, workspace)} drifted upstream, "
+            "re-applying."
+        )
+
+    retry_in = object_reconciler.seconds_until(previous.next_attempt)
+    if retry_in > 0:
+        # The write is bound to conflict again until then
+        enqueue_analytic_rule(namespace=namespace, rule_name=rule_name, delay=retry_in)
+        return previous
+
+    try:
+        rule = await microsoft_sentinel_service.create_or_update_analytics_rule(
+            rule_name=rule_name,
+            payload=payload,
+            replaces_legacy=replaces_legacy,
+        )
+    except microsoft_sentinel_exceptions.RuleConflictException as err:
+        return _defer_after_conflict(
+            namespace=namespace,
+            rule_name=rule_name,
+            workspace=workspace,
+            previous=previous,
+            err=err,
+        )
+    except Exception as err:
+        logger.error(str(err))
+        return TargetStatus(message=ErrorMessages.analytics_rule_create_error)
+
+    metrics.RULE_RECONCILE_OUTCOMES.labels(kind=PLURAL, outcome="applied").inc()
+
+    # The response to the PUT already holds the state of the rule upstream
+    return _to_status(
+        microsoft_sentinel_service.to_analytics_rule_status(rule.model_dump()),
+        content_hash=content_hash,
+    )
+
+
+async def _get_services(
+    namespace: str, workspaces: Iterable[str]
+) -> dict[str, MicrosoftSentinelService | None]:
+    """
+    The services of workspaces of a namespace, concurrently, with None for those that
+    cannot be configured.
+    """
+    kubernetes_client = providers.get_kubernetes_client()
+    semaphore = asyncio.Semaphore(providers.settings.workspace_fan_out_concurrency)
+
+    async def get(workspace: str) -> MicrosoftSentinelService | None:
+        async with semaphore:
+            try:
+                return await providers.get_microsoft_sentinel_service(
+                    kubernetes_client=kubernetes_client,
+                    namespace=namespace,
+                    workspace=workspace,
+                )
+            except microsoft_sentinel_exceptions.ServiceConfigurationException:
+                return None
+
+    workspaces = list(workspaces)
+    services = await asyncio.gather(*map(get, workspaces))
+
+    return dict(zip(workspaces, services))
+
+
+async def remove_from_workspaces(
+    namespace: str, rule_name: str, workspaces: Iterable[str]
+) -> dict[str, str]:
+    """
+    Remove an analytic rule from workspaces of its namespace, concurrently.
+
+    Returns:
+        dict[str, str]: Why the rule could not be removed, by workspace
+    """
+    kubernetes_client = providers.get_kubernetes_client()
+    semaphore = asyncio.Semaphore(providers.settings.workspace_fan_out_concurrency)
+
+    async def remove(workspace: str) -> str | None:
+        async with semaphore:
+            try:
+                microsoft_sentinel_service = (
+                    await providers.get_microsoft_sentinel_service(
+                        kubernetes_client=kubernetes_client,
+                        namespace=namespace,
+                        workspace=workspace,
+                    )
+                )
+            except microsoft_sentinel_exceptions.ServiceConfigurationException:
+                return ErrorMessages.initialization_error.value
+
+            try:
+                await microsoft_sentinel_service.remove_analytics_rule(
+                    rule_name=rule_name
+                )
+            except Exception as err:
+                logger.error(str(err))
+                return ErrorMessages.analytics_rule_delete_error.value
+
+            return None
+
+    workspaces = sorted(set(workspaces))
+    messages = await asyncio.gather(*(remove(workspace) for workspace in workspaces))
+
+    return {
+        workspace: message
+        for workspace, message in zip(workspaces, messages)
+        if message is not None
+    }
+
+
+async def reconcile_analytic_rule(
+    spec: dict,
+    namespace: str,
+    rule_name: str,
+    previous_status: dict | None = None,
+    listing: Mapping[str, dict] | None = None,
+    generation: int | None = None,
+) -> dict | None:
+    """
+    Render an analytic rule and create or update it upstream. The rule is only
+    written when its rendered payload differs from the one last applied, or when
+    the periodic drift check finds that the upstream copy was changed.
+
+    Rules are deployed to the default workspace of their namespace, unless their spec
+    selects workspaces by name or by label. The rule is then rendered once and
+    written to every selected workspace concurrently, and removed from the ones it
+    no longer selects. Only the workspaces that are selected need to be configured
+    properly.
+
+    Args:
+        listing(Mapping[str, dict] | None): All rules in the default workspace by ID,
+            when reconciling a whole workspace. The upstream rule is then compared on
+            every call, without any additional requests.
+
+        generation(int | None): The generation of the object, recorded in the status
+            once it is deployed
+
+    Returns:
+        dict | None: The status of the rule, or None if the rule is skipped or its
+            status is unchanged
+    """
+    status = AnalyticsRuleStatus()
+    previous = _parse_status(previous_status)
+
+    if rule_name not in ALLOWED_RULE_NAMES or namespace not in ALLOWED_NAMESPACES:
+        print(f"Skipping {rule_name} for {namespace}")
+        return None
+
+    kubernetes_client = providers.get_kubernetes_client()
+
+    try:
+        workspaces = await providers.get_microsoft_sentinel_workspaces(
+            kubernetes_client=kubernetes_client,
+            namespace=namespace,
+        )
+    except microsoft_sentinel_exceptions.ServiceConfigurationException:
+        status.message = ErrorMessages.initialization_error.value
+        return status.model_dump()
+
+    try:
+        targets = microsoft_sentinel_models.WorkspaceTargets.model_validate(spec)
+        # The targets are not part of the rule upstream
+        payload = microsoft_sentinel_models.CreateScheduledAlertRule.model_validate(
+            {key: value for key, value in spec.items() if key not in TARGET_FIELDS}
+        )
+    except ValidationError as err:
+        status.message = str(err)
+        return status.model_dump()
+
+    selected = (
+        targets.select(workspaces)
+        if targets.targeted
+        else [providers.DEFAULT_WORKSPACE]
+    )
+    services = await _get_services(namespace=namespace, workspaces=selected)
+
+    # Macros belong to the namespace, so the service of any workspace renders the
+    # rule. The default workspace is only looked up when none of them is available.
+    microsoft_sentinel_service = next(
+        (service for service in services.values() if service is not None), None
+    )
+    if microsoft_sentinel_service is None and not services:
+        microsoft_sentinel_service = (
+            await _get_services(
+                namespace=namespace, workspaces=[providers.DEFAULT_WORKSPACE]
+            )
+        )[providers.DEFAULT_WORKSPACE]
+
+    if microsoft_sentinel_service is None:
+        status.message = ErrorMessages.initialization_error.value
+        return status.model_dump()
+
+    properties = spec.get("properties", {})
+
+    # TODO: Make it possible for the service to return a result so that we can
+    # move this logic further down the stack
+    # Inject macros into the main query, query prefix and query suffix
+    results = {
+        field: await microsoft_sentinel_service.inject_macros(
+            query=properties.get(field, ""), rule_name=rule_name
+        )
+        for field in QUERY_FIELDS
+    }
+
+    # Track the macros used by the rule, including missing ones, so that the rule
+    # is reconciled as soon as one of them changes
+    providers.microsoft_sentinel_macro_dependencies.set_dependencies(
+        namespace=namespace,
+        rule_name=rule_name,
+        macro_names=set().union(*(result.macros for result in results.values())),
+    )
+
+    for result in results.values():
+        if not result.success:
+            status.message = result.message
+            return status.model_dump()
+
+    payload.properties.query = results["query"].query
+    payload.properties.query_prefix = results["queryPrefix"].query
+    payload.properties.query_suffix = results["querySuffix"].query
+
+    payload = microsoft_sentinel_service.prepare_analytics_rule(payload)
+    rendered = payload.model_dump(by_alias=True)
+    content_hash = drift_detection.compute_content_hash(rendered)
+
+    # The status of the rule in each workspace it may have been deployed to
+    previous_targets = previous.targets
+    if previous_targets is None:
+        previous_targets = (
+            {providers.DEFAULT_WORKSPACE: previous} if previous_status else {}
+        )
+
+    if not targets.targeted:
+        status = AnalyticsRuleStatus(
+            **_target_status(
+                await _reconcile_target(
+                    microsoft_sentinel_service,
+                    namespace=namespace,
+                    rule_name=rule_name,
+                    workspace=providers.DEFAULT_WORKSPACE,
+                    payload=payload,
+                    rendered=rendered,
+                    content_hash=content_hash,
+                    previous=previous_targets.get(
+                        providers.DEFAULT_WORKSPACE, TargetStatus()
+                    ),
+                    listing=listing,
+                    # Only rules that existed before may have been deployed under
+                    # their legacy ID, which was always to the default workspace
+                    replaces_legacy=bool(previous_status),
+                )
+            ).model_dump()
+        )
+    else:
+        semaphore = asyncio.Semaphore(providers.settings.workspace_fan_out_concurrency)
+
+        async def deploy_to(workspace: str) -> TargetStatus:
+            service = services[workspace]
+            if service is None:
+                return TargetStatus(message=ErrorMessages.initialization_error.value)
+
+            async with semaphore:
+                return await _reconcile_target(
+                    service,
+                    namespace=namespace,
+                    rule_name=rule_name,
+                    workspace=workspace,
+                    payload=payload,
+                    rendered=rendered,
+                    content_hash=content_hash,
+                    previous=previous_targets.get(workspace, TargetStatus()),
+                    listing=(
+                        listing if workspace == providers.DEFAULT_WORKSPACE else None
+                    ),
+                    replaces_legacy=(
+                        bool(previous_status)
+                        and workspace == providers.DEFAULT_WORKSPACE
+                    ),
+                )
+
+        results = await asyncio.gather(*map(deploy_to, selected))
+        status = AnalyticsRuleStatus(
+            **_summarize(dict(zip(selected, results))).model_dump(),
+            targets={
+                workspace: _target_status(result)
+                for workspace, result in zip(selected, results)
+            },
+        )
+
+    # Remove the rule from the workspaces it no longer targets, unless they are no
+    # longer configured at all
+    dropped = {
+        workspace
+        for workspace in previous_targets.keys() - set(selected)
+        if workspace in workspaces
+    }
+    failed = await remove_from_workspaces(
+        namespace=namespace, rule_name=rule_name, workspaces=dropped
+    )
+
+    if failed:
+        # Kept in the status, so that the removal is retried
+        status.targets = {
+            **(status.targets or {providers.DEFAULT_WORKSPACE: _target_status(status)}),
+            **{
+                workspace: _target_status(previous_targets[workspace]).model_copy(
+                    update={"message": message}
+                )
+                for workspace, message in failed.items()
+            },
+        }
+    elif dropped:
+        logger.info(
+            f"Removed '{rule_name}' in '{namespace}' from {len(dropped)} "
+            "workspace(s) it no longer targets."
+        )
+
+    status.observed_generation = (
+        generation
+        if status.deployed == "Deployed" and status.content_hash == content_hash
+        else previous.observed_generation
+    )
+
+    if status == previous:
+        return None
+
+    result = status.model_dump()
+    if result["targets"] is not None and previous.targets is not None:
+        # Merge-patching the status keeps the workspaces that are not listed
+        result["targets"].update(
+            {workspace: None for workspace in previous.targets.keys() - status.targets}
+        )
+
+    return result
+
+
+async def reconcile_analytic_rule_by_name(
+    namespace: str,
+    rule_name: str,
+    listing: Mapping[str, dict] | None = None,
+    body: dict | None = None,
+):
+    """
+    Reconcile an analytic rule outside of its kopf handlers, e.g. when a macro it
+    depends on changed, and write the resulting status to the object.
+    """
+    exists = await object_reconciler.reconcile_by_name(
+        plural=PLURAL,
+        status_key=STATUS_KEY,
+        namespace=namespace,
+        name=rule_name,
+        reconcile=functools.partial(reconcile_analytic_rule, listing=listing),
+        body=body,
+    )
+
+    if not exists:
+        providers.microsoft_sentinel_macro_dependencies.remove_dependencies(
+            namespace=namespace, rule_name=rule_name
+        )
+
+
+def enqueue_analytic_rule(
+    namespace: str,
+    rule_name: str,
+    priority: Priority = Priority.USER,
+    delay: float = 0,
+    listing: Mapping[str, dict] | None = None,
+    body: dict | None = None,
+):
+    """
+    Queue a reconciliation, merged with any that is already queued, optionally once
+    a delay has passed, or against a listing of the workspace and of the objects.
+    """
+    key = (namespace, PLURAL, rule_name)
+    job = functools.partial(
+        reconcile_analytic_rule_by_name,
+        namespace=namespace,
+        rule_name=rule_name,
+        listing=listing,
+        body=body,
+    )
+
+    if delay > 0:
+        providers.work_queue.enqueue_after(
+            delay=delay, key=key, job=job, priority=priority
+        )
+    else:
+        providers.work_queue.enqueue(key=key, job=job, priority=priority)
@@ -0,0 +1,109 @@
+import kopf
+from loguru import logger
+from pydantic import ValidationError
+
+from dac_operator import metrics, providers
+from dac_operator.crd.macro_resolver import MacroResolver
+from dac_operator.handlers.microsoft_sentinel.analytic_rules import (
+    analytic_rule_reconciler,
+)
+from dac_operator.microsoft_sentinel import (
+    microsoft_sentinel_exceptions,
+    microsoft_sentinel_models,
+)
+from dac_operator.microsoft_sentinel.microsoft_sentinel_macro_service import (
+    MicrosoftSentinelMacroService,
+)
+
+macro_service = MicrosoftSentinelMacroService()
+
+
+@kopf.on.validate(
+    "microsoftsentinelanalyticrules",
+    operations=["CREATE", "UPDATE"],
+    id="validate-analytic-rule",
+)  # type: ignore
+async def validate_analytic_rule(spec, name, namespace, warnings, **_):
+    with metrics.ADMISSION_REVIEW_DURATION.labels(
+        webhook="validate-analytic-rule"
+    ).time():
+        try:
+            microsoft_sentinel_models.CreateScheduledAlertRule.model_validate(spec)
+            targets = microsoft_sentinel_models.WorkspaceTargets.model_validate(spec)
+        except ValidationError as err:
+            logger.error(str(err))
+            raise kopf.AdmissionError(
+                f"Analytic Rule specification did not pass validation:\n\n {err}"
+            )
+
+        if targets.targeted:
+            await _check_workspaces(
+                targets=targets, name=name, namespace=namespace, warnings=warnings
+            )
+
+        macro_resolver = MacroResolver(
+            kubernetes_client=providers.get_kubernetes_client(),
+            macro_index=providers.microsoft_sentinel_macro_index,
+            namespace=namespace,
+            plural="microsoftsentinelmacros",
+            find_macros=macro_service.get_used_macros,
+        )
+        properties = spec.get("properties", {})
+
+        # Render every query against the macro index, so that rules that can never be
+        # deployed are rejected before they reach the reconcile path
+        for field in analytic_rule_reconciler.QUERY_FIELDS:
+            macros, missing = await macro_resolver.resolve(
+                query=properties.get(field) or ""
+            )
+
+            if missing:
+                message = (
+                    f"The macro(s) {', '.join(sorted(missing))} referenced in "
+                    f"'{field}' of '{name}' are not deployed in '{namespace}'."
+                )
+                if providers.settings.admission_reject_missing_macros:
+                    raise kopf.AdmissionError(message)
+
+                warnings.append(message)
+                continue
+
+            try:
+                macro_service.render(query=properties.get(field) or "", macros=macros)
+            except microsoft_sentinel_exceptions.MacroCycleException as err:
+                raise kopf.AdmissionError(
+                    f"The macros referenced in '{field}' of '{name}' contain a "
+                    f"cycle: {err}"
+                )
+
+
+async def _check_workspaces(
+    targets: microsoft_sentinel_models.WorkspaceTargets,
+    name: str,
+    namespace: str,
+    warnings: list[str],
+):
+    """
+    Warn about workspaces that are not configured (yet), since the configuration of
+    a namespace may be applied after its rules.
+    """
+    try:
+        workspaces = await providers.get_microsoft_sentinel_workspaces(
+            kubernetes_client=providers.get_kubernetes_client(),
+            namespace=namespace,
+        )
+    except microsoft_sentinel_exceptions.ServiceConfigurationException:
+        warnings.append(f"'{namespace}' has no valid Microsoft Sentinel configuration.")
+        return
+
+    unknown = sorted(set(targets.workspaces) - workspaces.keys())
+    if unknown:
+        warnings.append(
+            f"The workspace(s) {', '.join(unknown)} targeted by '{name}' are not "
+            f"configured in '{namespace}'."
+        )
+
+    if not targets.select(workspaces):
+        warnings.append(
+            f"'{name}' does not target any workspace configured in '{namespace}'."
+        )
@@ -0,0 +1,23 @@
+import kopf
+
+from dac_operator.handlers import object_reconciler
+from dac_operator.handlers.microsoft_sentinel.automation_rules import (
+    automation_rule_reconciler,
+)
+
+needs_reconcile = object_reconciler.needs_reconcile(
+    automation_rule_reconciler.STATUS_KEY
+)
+
+
+@kopf.on.create(automation_rule_reconciler.PLURAL, id="enqueue-on-create")  # type: ignore
+@kopf.on.update(  # type: ignore
+    automation_rule_reconciler.PLURAL, id="enqueue-on-update", when=needs_reconcile
+)
+@kopf.on.resume(  # type: ignore
+    automation_rule_reconciler.PLURAL, id="enqueue-on-resume", when=needs_reconcile
+)
+async def enqueue_automation_rule(name, namespace, **_):
+    automation_rule_reconciler.enqueue_automation_rule(
+        namespace=namespace, rule_name=name
+    )
@@ -0,0 +1,240 @@
+import functools
+from enum import StrEnum
+from typing import Literal, Mapping
+
+from loguru import logger
+from pydantic import BaseModel, ValidationError
+
+from dac_operator import metrics, providers
+from dac_operator.ext import drift_detection
+from dac_operator.ext.work_queue import Priority
+from dac_operator.handlers import object_reconciler
+from dac_operator.microsoft_sentinel import (
+    microsoft_sentinel_exceptions,
+)
+
+GROUP = object_reconciler.GROUP
+VERSION = object_reconciler.VERSION
+PLURAL = "microsoftsentinelautomationrules"
+
+# The status of automation rules is stored under the ID of the timer handler
+STATUS_KEY = "create_automation_rule"
+
+
+class ErrorMessages(StrEnum):
+    initialization_error = "Unable to configure provider, see controller logs."
+    automation_rule_create_error = "Unable to create Automation Rule upstream."
+
+
+class AutomationRuleStatus(BaseModel):
+    deployed: Literal["Deployed", "Not deployed", "PendingRecreate", "Unknown"] = (
+        "Unknown"
+    )
+    enabled: Literal["Enabled", "Disabled", "Unknown"] = "Unknown"
+    message: str = ""
+    # Hash of the payload last applied upstream, and when the upstream copy was last
+    # compared against it
+    content_hash: str | None = None
+    last_drift_check: str | None = None
+    # Generation of the object that was last deployed successfully
+    observed_generation: int | None = None
+    # Number of conflicts in a row while writing the rule upstream, and when it is
+    # written again
+    conflict_attempts: int = 0
+    next_attempt: str | None = None
+
+
+def _parse_status(status: dict | None) -> AutomationRuleStatus:
+    try:
+        return AutomationRuleStatus.model_validate(status or {})
+    except ValidationError:
+        return AutomationRuleStatus()
+
+
+def _defer_after_conflict(
+    namespace: str,
+    rule_name: str,
+    previous: AutomationRuleStatus,
+    err: microsoft_sentinel_exceptions.RuleConflictException,
+) -> AutomationRuleStatus:
+    """
+    Retry a write that was rejected with a conflict once it is expected to succeed,
+    with a delay that doubles on every conflict in a row.
+    """
+    delay = object_reconciler.conflict_retry_delay(previous.conflict_attempts)
+    next_attempt = object_reconciler.from_now(delay)
+
+    logger.info(
+        f"'{rule_name}' in '{namespace}' conflicts upstream ({err.reason}), "
+        f"retrying after {next_attempt}."
+    )
+    metrics.RULE_RECONCILE_OUTCOMES.labels(kind=PLURAL, outcome="deferred").inc()
+    metrics.RULE_CONFLICTS.labels(kind=PLURAL, reason=type(err).__name__).inc()
+    enqueue_automation_rule(namespace=namespace, rule_name=rule_name, delay=delay)
+
+    recently_deleted = isinstance(
+        err, microsoft_sentinel_exceptions.RuleRecentlyDeletedException
+    )
+    return previous.model_copy(
+        update={
+            "deployed": "PendingRecreate" if recently_deleted else previous.deployed,
+            "message": f"Conflict upstream ({err.reason}), retrying later.",
+            "conflict_attempts": previous.conflict_attempts + 1,
+            "next_attempt": next_attempt,
+        }
+    )
+
+
+async def reconcile_automation_rule(
+    spec: dict,
+    namespace: str,
+    rule_name: str,
+    previous_status: dict | None = None,
+    listing: Mapping[str, dict] | None = None,
+    generation: int | None = None,
+) -> dict | None:
+    """
+    Create or update an automation rule upstream, unless it is unchanged since it
+    was last applied and the periodic drift check finds no difference upstream.
+
+    Args:
+        listing(Mapping[str, dict] | None): All automation rules in the workspace by
+            ID, when reconciling a whole workspace
+
+        generation(int | None): The generation of the object, recorded in the status
+            once it is deployed
+
+    Returns:
+        dict | None: The status of the rule, or None if its status is unchanged
+    """
+    status = AutomationRuleStatus()
+    previous = _parse_status(previous_status)
+
+    try:
+        microsoft_sentinel_service = await providers.get_microsoft_sentinel_service(
+            kubernetes_client=providers.get_kubernetes_client(),
+            namespace=namespace,
+        )
+    except microsoft_sentinel_exceptions.ServiceConfigurationException:
+        status.message = ErrorMessages.initialization_error.value
+        return status.model_dump()
+
+    payload = {"properties": spec["properties"]}
+    content_hash = drift_detection.compute_content_hash(payload)
+    unchanged = (
+        content_hash == previous.content_hash and previous.deployed == "Deployed"
+    )
+
+    if listing is not None:
+        upstream = listing.get(
+            microsoft_sentinel_service.compute_automation_rule_id(rule_name=rule_name)
+        )
+    elif unchanged and not drift_detection.is_drift_check_due(
+        previous.last_drift_check, providers.settings.drift_check_interval
+    ):
+        metrics.RULE_RECONCILE_OUTCOMES.labels(kind=PLURAL, outcome="unchanged").inc()
+
+        if generation is not None and generation != previous.observed_generation:
+            return previous.model_copy(
+                update={"observed_generation": generation}
+            ).model_dump()
+        return None
+    elif unchanged:
+        upstream = await microsoft_sentinel_service.get_automation_rule(
+            rule_name=rule_name
+        )
+    else:
+        upstream = None
+
+    if upstream is not None and drift_detection.matches_upstream(payload, upstream):
+        metrics.RULE_RECONCILE_OUTCOMES.labels(kind=PLURAL, outcome="in_sync").inc()
+        status.deployed = "Deployed"
+        status.content_hash = content_hash
+        status.last_drift_check = drift_detection.now()
+        status.observed_generation = generation
+        return status.model_dump()
+
+    if unchanged:
+        logger.info(f"'{rule_name}' in '{namespace}' drifted upstream, re-applying.")
+
+    retry_in = object_reconciler.seconds_until(previous.next_attempt)
+    if retry_in > 0:
+        # The write is bound to conflict again until then
+        enqueue_automation_rule(
+            namespace=namespace, rule_name=rule_name, delay=retry_in
+        )
+        return None
+
+    try:
+        await microsoft_sentinel_service.create_or_update_automation_rule(
+            rule_name=rule_name,
+            payload=payload,
+            # Only rules that existed before may have been deployed under their
+            # legacy ID
+            replaces_legacy=bool(previous_status),
+        )
+    except microsoft_sentinel_exceptions.RuleConflictException as err:
+        return _defer_after_conflict(
+            namespace=namespace, rule_name=rule_name, previous=previous, err=err
+        ).model_dump()
+    except Exception as err:
+        logger.error(str(err))
+        status.message = ErrorMessages.automation_rule_create_error
+        return status.model_dump()
+
+    metrics.RULE_RECONCILE_OUTCOMES.labels(kind=PLURAL, outcome="applied").inc()
+
+    status.deployed = "Deployed"
+    status.content_hash = content_hash
+    status.last_drift_check = drift_detection.now()
+    status.observed_generation = generation
+    return status.model_dump()
+
+
+async def reconcile_automation_rule_by_name(
+    namespace: str,
+    rule_name: str,
+    listing: Mapping[str, dict] | None = None,
+    body: dict | None = None,
+):
+    """
+    Reconcile an automation rule outside of its kopf handlers and write the
+    resulting status to the object.
+    """
+    await object_reconciler.reconcile_by_name(
+        plural=PLURAL,
+        status_key=STATUS_KEY,
+        namespace=namespace,
+        name=rule_name,
+        reconcile=functools.partial(reconcile_automation_rule, listing=listing),
+        body=body,
+    )
+
+
+def enqueue_automation_rule(
+    namespace: str,
+    rule_name: str,
+    priority: Priority = Priority.USER,
+    delay: float = 0,
+    listing: Mapping[str, dict] | None = None,
+    body: dict | None = None,
+):
+    """
+    Queue a reconciliation, merged with any that is already queued, optionally once
+    a delay has passed, or against a listing of the workspace and of the objects.
+    """
+    key = (namespace, PLURAL, rule_name)
+    job = functools.partial(
+        reconcile_automation_rule_by_name,
+        namespace=namespace,
+        rule_name=rule_name,
+        listing=listing,
+        body=body,
+    )
+
+    if delay > 0:
+        providers.work_queue.enqueue_after(
+            delay=delay, key=key, job=job, priority=priority
+        )
+    else:
+        providers.work_queue.enqueue(key=key, job=job, priority=priority)
@@ -1,10 +1,15 @@
-import json
-
 import jsonschema
 import kopf
 from loguru import logger
 
-from dac_operator.config import ROOT_PATH
+from dac_operator import metrics, providers
+
+AUTOMATION_RULE_SCHEMA = "MicrosoftSentinelAutomationRule"
+
+
+@kopf.on.startup()  # type: ignore
+def load_automation_rule_schema(**_):
+    providers.schema_validators.load(AUTOMATION_RULE_SCHEMA)
 
 
 @kopf.on.validate(
@@ -13,18 +18,18 @@ from dac_operator.config import ROOT_PATH
     id="validate-automation-rule",
 )  # type: ignore
 async def validate_automation_rule(spec, warnings, **_):
-    with open(
-        f"{ROOT_PATH}/assets/jsonschema/MicrosoftSentinelAutomationRule.json"
-    ) as f:
-        schema = json.load(f)
-
-    try:
-        jsonschema.validate({"properties": spec["properties"]}, schema=schema)
-    except jsonschema.SchemaError as err:
-        logger.error(str(err))
-        raise kopf.AdmissionError("The JSON-schema for Automation Rules is invalid")
-    except jsonschema.ValidationError as err:
-        logger.error(str(err))
-        raise kopf.AdmissionError(
-            f"Automation Rule specification did not pass validation:\n\n {err}"
-        )
+    with metrics.ADMISSION_REVIEW_DURATION.labels(
+        webhook="validate-automation-rule"
+    ).time():
+        try:
+            providers.schema_validators.validate(
+                AUTOMATION_RULE_SCHEMA, {"properties": spec["properties"]}
+            )
+        except jsonschema.SchemaError as err:
+            logger.error(str(err))
+            raise kopf.AdmissionError("The JSON-schema for Automation Rules is invalid")
+        except jsonschema.ValidationError as err:
+            logger.error(str(err))
+            raise kopf.AdmissionError(
+                f"Automation Rule specification did not pass validation:\n\n {err}"
+            )
@@ -0,0 +1,46 @@
+import kopf
+from loguru import logger
+
+from dac_operator import providers
+from dac_operator.handlers.microsoft_sentinel.analytic_rules import (
+    analytic_rule_reconciler,
+)
+
+
+def reconcile_dependents(namespace: str, macro_name: str):
+    """
+    Immediately reconcile the analytic rules that reference a macro, instead of
+    waiting for their next timer tick.
+    """
+    dependents = providers.microsoft_sentinel_macro_dependencies.get_dependents(
+        namespace=namespace, macro_name=macro_name
+    )
+
+    if dependents:
+        logger.info(
+            f"Macro '{macro_name}' in '{namespace}' changed, reconciling "
+            f"{len(dependents)} dependent Analytics Rule(s)."
+        )
+
+    for rule_name in dependents:
+        analytic_rule_reconciler.enqueue_analytic_rule(
+            namespace=namespace, rule_name=rule_name
+        )
+
+
+@kopf.on.event("microsoftsentinelmacros")  # type: ignore
+async def watch_microsoft_sentinel_macro(event, body, spec, name, namespace, **_):
+    if event["type"] == "DELETED":
+        changed = providers.microsoft_sentinel_macro_index.delete(
+            namespace=namespace, name=name
+        )
+    else:
+        changed = providers.microsoft_sentinel_macro_index.set(
+            namespace=namespace,
+            name=name,
+            content=spec.get("content", ""),
+            resource_version=body["metadata"].get("resourceVersion"),
+        )
+
+    if changed:
+        reconcile_dependents(namespace=namespace, macro_name=name)
@@ -0,0 +1,28 @@
+import asyncio
+
+import kopf
+
+from dac_operator import providers
+from dac_operator.handlers.microsoft_sentinel.workspaces import workspace_reconciler
+
+_background_tasks: set[asyncio.Task] = set()
+
+
+@kopf.on.startup()  # type: ignore
+async def start_workspace_reconciler(**_):
+    if providers.settings.workspace_reconcile_interval <= 0:
+        return
+
+    task = asyncio.create_task(
+        workspace_reconciler.run_workspace_reconciler(
+            interval=providers.settings.workspace_reconcile_interval
+        )
+    )
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+@kopf.on.cleanup()  # type: ignore
+async def stop_workspace_reconciler(**_):
+    for task in _background_tasks:
+        task.cancel()
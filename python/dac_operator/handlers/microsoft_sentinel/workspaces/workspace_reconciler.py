@@ -0,0 +1,117 @@
+import asyncio
+import time
+
+from loguru import logger
+
+from dac_operator import metrics, providers
+from dac_operator.ext.work_queue import Priority
+from dac_operator.handlers.microsoft_sentinel.analytic_rules import (
+    analytic_rule_reconciler,
+)
+from dac_operator.handlers.microsoft_sentinel.automation_rules import (
+    automation_rule_reconciler,
+)
+from dac_operator.microsoft_sentinel import microsoft_sentinel_exceptions
+
+
+async def reconcile_workspace(namespace: str):
+    """
+    Reconcile every analytic and automation rule in a namespace against a single
+    (paginated) listing of its workspace, instead of fetching each rule upstream.
+    Only rules that differ from their upstream copy are written.
+
+    The rules are reconciled through the work queue, so that they are never
+    reconciled concurrently with a change made by a user. They are reconciled from
+    the listing of the resources, and only read again when they changed since.
+    """
+    try:
+        microsoft_sentinel_service = await providers.get_microsoft_sentinel_service(
+            kubernetes_client=providers.get_kubernetes_client(),
+            namespace=namespace,
+        )
+    except microsoft_sentinel_exceptions.ServiceConfigurationException:
+        logger.warning(f"Skipping workspace reconciliation for '{namespace}'.")
+        return
+
+    # The workspace is listed first, so that every rule in it that has a matching
+    # resource is known to exist when the resources are listed, and is not pruned
+    analytic_listing, automation_listing = await asyncio.gather(
+        microsoft_sentinel_service.list_analytics_rules(),
+        microsoft_sentinel_service.list_automation_rules(),
+    )
+    kubernetes_client = providers.get_kubernetes_client()
+    analytic_rules, automation_rules = await asyncio.gather(
+        kubernetes_client.list_namespaced_custom_object(
+            group=analytic_rule_reconciler.GROUP,
+            version=analytic_rule_reconciler.VERSION,
+            plural=analytic_rule_reconciler.PLURAL,
+            namespace=namespace,
+        ),
+        kubernetes_client.list_namespaced_custom_object(
+            group=automation_rule_reconciler.GROUP,
+            version=automation_rule_reconciler.VERSION,
+            plural=automation_rule_reconciler.PLURAL,
+            namespace=namespace,
+        ),
+    )
+
+    for rule in analytic_rules:
+        if not rule["metadata"].get("deletionTimestamp"):
+            analytic_rule_reconciler.enqueue_analytic_rule(
+                namespace=namespace,
+                rule_name=rule["metadata"]["name"],
+                priority=Priority.DRIFT,
+                listing=analytic_listing,
+                body=rule,
+            )
+
+    for rule in automation_rules:
+        if not rule["metadata"].get("deletionTimestamp"):
+            automation_rule_reconciler.enqueue_automation_rule(
+                namespace=namespace,
+                rule_name=rule["metadata"]["name"],
+                priority=Priority.DRIFT,
+                listing=automation_listing,
+                body=rule,
+            )
+
+    if not providers.settings.workspace_reconcile_prune:
+        return
+
+    pruned = await microsoft_sentinel_service.prune_analytics_rules(
+        listing=analytic_listing,
+        rule_names=[rule["metadata"]["name"] for rule in analytic_rules],
+    )
+    pruned += await microsoft_sentinel_service.prune_automation_rules(
+        listing=automation_listing,
+        rule_names=[rule["metadata"]["name"] for rule in automation_rules],
+    )
+
+    if pruned:
+        logger.info(f"Removed {len(pruned)} orphaned rule(s) from '{namespace}'.")
+
+
+async def run_workspace_reconciler(interval: float):
+    """
+    Periodically reconcile every namespace with a Microsoft Sentinel configuration.
+    """
+    while True:
+        for namespace in providers.config_map_cache.namespaces(
+            name=providers.MICROSOFT_SENTINEL_CONFIGURATION
+        ):
+            started_at = time.monotonic()
+
+            try:
+                async with providers.shard_coordinator.hold(namespace) as owned:
+                    if not owned:
+                        # Handled by another replica of the operator
+                        continue
+
+                    await reconcile_workspace(namespace=namespace)
+            except Exception:
+                logger.exception(f"Unable to reconcile workspace of '{namespace}'.")
+                continue
+
+            metrics.WORKSPACE_RECONCILE_DURATION.observe(time.monotonic() - started_at)
+
+        await asyncio.sleep(interval)
@@ -0,0 +1,191 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable
+
+from dac_operator import providers
+from dac_operator.ext import drift_detection, kubernetes_exceptions
+
+GROUP = "buildrlabs.io"
+VERSION = "v1"
+
+Reconciler = Callable[..., Awaitable[dict | None]]
+
+
+def needs_reconcile(status_key: str) -> Callable[..., bool]:
+    """
+    Build a kopf `when` filter that only passes objects whose current generation was
+    not deployed yet, e.g. to skip unchanged objects when the operator resumes.
+    """
+
+    def when(meta, status, **_) -> bool:
+        observed_generation = (status.get(status_key) or {}).get("observed_generation")
+        return meta.get("generation") != observed_generation
+
+    return when
+
+
+def _without_drift_check(status: Any) -> Any:
+    """
+    A status without the time of its last drift check, nor those of its targets,
+    e.g. the status per workspace of an analytic rule.
+    """
+    if not isinstance(status, dict):
+        return status
+
+    status = {key: value for key, value in status.items() if key != "last_drift_check"}
+    if isinstance(status.get("targets"), dict):
+        status["targets"] = {
+            name: _without_drift_check(target)
+            for name, target in status["targets"].items()
+        }
+
+    return status
+
+
+def needs_status_update(previous: dict | None, status: dict | None) -> bool:
+    """
+    Only write the status when it changed, or when the last drift check recorded in
+    it is getting old, so that the per-rule timers do not check the rule themselves.
+    """
+    if status is None:
+        return False
+
+    previous = previous or {}
+    compared = _without_drift_check(previous)
+    changed = any(
+        value != compared.get(key)
+        for key, value in _without_drift_check(status).items()
+    )
+
+    return changed or drift_detection.is_drift_check_due(
+        previous.get("last_drift_check"),
+        providers.settings.drift_check_interval / 2,
+    )
+
+
+def conflict_retry_delay(attempts: int) -> float:
+    """
+    Number of seconds before writing an object upstream again, after it was rejected
+    with a conflict `attempts` times in a row.
+    """
+    return min(
+        providers.settings.conflict_retry_base * 2**attempts,
+        providers.settings.conflict_retry_max,
+    )
+
+
+def from_now(seconds: float) -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).isoformat()
+
+
+def seconds_until(timestamp: str | None) -> float:
+    """Number of seconds until an ISO-8601 timestamp, or 0 if it is in the past."""
+    if not timestamp:
+        return 0.0
+
+    try:
+        due_at = datetime.fromisoformat(timestamp)
+    except ValueError:
+        return 0.0
+
+    return max(0.0, (due_at - datetime.now(timezone.utc)).total_seconds())
+
+
+async def reconcile_by_name(
+    plural: str,
+    status_key: str,
+    namespace: str,
+    name: str,
+    reconcile: Reconciler,
+    body: dict | None = None,
+) -> bool:
+    """
+    Reconcile an object outside of its kopf handlers, e.g. from the work queue, and
+    write the resulting status to the object. The object is read right before it is
+    reconciled, so that the latest spec is always used.
+
+    Objects that were just listed, e.g. by a bulk reconciliation, are reconciled from
+    their listed `body` instead. Their status is then only written if the object is
+    still at the listed version, otherwise it is read and reconciled again.
+
+    Objects in namespaces that are handled by another replica of the operator are
+    skipped, since the shards of their namespaces were handed off after they were
+    queued, and that replica reconciles them once it took the shards over.
+
+    Returns:
+        bool: False if the object no longer exists
+    """
+    async with providers.shard_coordinator.hold(namespace) as owned:
+        if not owned:
+            return True
+
+        return await _reconcile_by_name(
+            plural=plural,
+            status_key=status_key,
+            namespace=namespace,
+            name=name,
+            reconcile=reconcile,
+            body=body,
+        )
+
+
+async def _reconcile_by_name(
+    plural: str,
+    status_key: str,
+    namespace: str,
+    name: str,
+    reconcile: Reconciler,
+    body: dict | None = None,
+) -> bool:
+    kubernetes_client = providers.get_kubernetes_client()
+    listed = body is not None
+
+    if body is None:
+        try:
+            body = await kubernetes_client.get_namespaced_custom_object(
+                group=GROUP,
+                version=VERSION,
+                plural=plural,
+                namespace=namespace,
+                name=name,
+                return_type=dict,
+            )
+        except kubernetes_exceptions.ResourceNotFoundException:
+            return False
+
+    if body["metadata"].get("deletionTimestamp"):
+        return True
+
+    previous_status = (body.get("status") or {}).get(status_key)
+    status = await reconcile(
+        spec=body["spec"],
+        namespace=namespace,
+        rule_name=name,
+        previous_status=previous_status,
+        generation=body["metadata"].get("generation"),
+    )
+    if not needs_status_update(previous_status, status):
+        return True
+
+    try:
+        await kubernetes_client.patch_namespaced_custom_object_status(
+            group=GROUP,
+            version=VERSION,
+            plural=plural,
+            namespace=namespace,
+            name=name,
+            status={status_key: status},
+            resource_version=body["metadata"]["resourceVersion"] if listed else None,
+        )
+    except kubernetes_exceptions.ResourceNotFoundException:
+        return False
+    except kubernetes_exceptions.ResourceConflictException:
+        # Changed since it was listed
+        return await _reconcile_by_name(
+            plural=plural,
+            status_key=status_key,
+            namespace=namespace,
+            name=name,
+            reconcile=reconcile,
+        )
+
+    return True
@@ -0,0 +1,36 @@
+import asyncio
+
+import kopf
+
+from dac_operator import providers
+from dac_operator.handlers.sharding import shard_handoff
+
+_background_tasks: set[asyncio.Task] = set()
+
+
+@kopf.on.startup()  # type: ignore
+async def start_shard_coordinator(**_):
+    if not providers.shard_coordinator.enabled:
+        return
+
+    task = asyncio.create_task(
+        providers.shard_coordinator.run(
+            kubernetes_client=providers.get_kubernetes_client(),
+            on_acquired=shard_handoff.enqueue_shards,
+        )
+    )
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+@kopf.on.cleanup()  # type: ignore
+async def stop_shard_coordinator(**_):
+    if not providers.shard_coordinator.enabled:
+        return
+
+    for task in _background_tasks:
+        task.cancel()
+
+    await providers.shard_coordinator.stop(
+        kubernetes_client=providers.get_kubernetes_client()
+    )
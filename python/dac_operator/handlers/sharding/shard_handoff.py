@@ -0,0 +1,76 @@
+from typing import Callable
+
+from loguru import logger
+
+from dac_operator import providers
+from dac_operator.ext.work_queue import Priority
+from dac_operator.handlers import object_reconciler
+from dac_operator.handlers.microsoft_sentinel.analytic_rules import (
+    analytic_rule_reconciler,
+)
+from dac_operator.handlers.microsoft_sentinel.automation_rules import (
+    automation_rule_reconciler,
+)
+from dac_operator.handlers.splunk.detection_rules import detection_rule_reconciler
+
+# (plural, status key, enqueue) of every kind that is reconciled per namespace
+KINDS: list[tuple[str, str, Callable[..., None]]] = [
+    (
+        analytic_rule_reconciler.PLURAL,
+        analytic_rule_reconciler.STATUS_KEY,
+        analytic_rule_reconciler.enqueue_analytic_rule,
+    ),
+    (
+        automation_rule_reconciler.PLURAL,
+        automation_rule_reconciler.STATUS_KEY,
+        automation_rule_reconciler.enqueue_automation_rule,
+    ),
+    (
+        detection_rule_reconciler.PLURAL,
+        detection_rule_reconciler.STATUS_KEY,
+        detection_rule_reconciler.enqueue_detection_rule,
+    ),
+]
+
+
+async def enqueue_shards(shards: set[int]):
+    """
+    Queue every rule in the namespaces of shards that were taken over from another
+    replica. Until then, this replica ignored their events and timers, and the
+    previous owner dropped whatever was still queued, so nothing is lost as long as
+    everything is reconciled once. Rules whose latest generation was not deployed
+    yet go first, the others only cost a hash comparison if they are unchanged.
+    """
+    kubernetes_client = providers.get_kubernetes_client()
+    coordinator = providers.shard_coordinator
+    queued = 0
+
+    for plural, status_key, enqueue in KINDS:
+        try:
+            objects = await kubernetes_client.list_cluster_custom_object(
+                group=object_reconciler.GROUP,
+                version=object_reconciler.VERSION,
+                plural=plural,
+            )
+        except Exception:
+            logger.exception(f"Unable to list {plural} of the shards taken over.")
+            continue
+
+        for body in objects:
+            metadata = body["metadata"]
+            if coordinator.shard_of(metadata["namespace"]) not in shards:
+                continue
+            if metadata.get("deletionTimestamp"):
+                continue
+
+            status = (body.get("status") or {}).get(status_key) or {}
+            pending = metadata.get("generation") != status.get("observed_generation")
+
+            enqueue(
+                namespace=metadata["namespace"],
+                rule_name=metadata["name"],
+                priority=Priority.USER if pending else Priority.DRIFT,
+            )
+            queued += 1
+
+    logger.info(f"Queued {queued} rule(s) of {len(shards)} shard(s) taken over.")
@@ -0,0 +1,28 @@
+import asyncio
+
+import kopf
+
+from dac_operator import providers
+from dac_operator.handlers.splunk.detection_rules import detection_rule_sync
+
+_background_tasks: set[asyncio.Task] = set()
+
+
+@kopf.on.startup()  # type: ignore
+async def start_detection_rule_sync(**_):
+    if providers.settings.splunk_sync_interval <= 0:
+        return
+
+    task = asyncio.create_task(
+        detection_rule_sync.run_detection_rule_sync(
+            interval=providers.settings.splunk_sync_interval
+        )
+    )
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+@kopf.on.cleanup()  # type: ignore
+async def stop_detection_rule_sync(**_):
+    for task in _background_tasks:
+        task.cancel()
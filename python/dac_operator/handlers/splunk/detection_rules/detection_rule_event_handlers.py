@@ -0,0 +1,21 @@
+import kopf
+
+from dac_operator.handlers import object_reconciler
+from dac_operator.handlers.splunk.detection_rules import detection_rule_reconciler
+
+needs_reconcile = object_reconciler.needs_reconcile(
+    detection_rule_reconciler.STATUS_KEY
+)
+
+
+@kopf.on.create(detection_rule_reconciler.PLURAL, id="enqueue-on-create")  # type: ignore
+@kopf.on.update(  # type: ignore
+    detection_rule_reconciler.PLURAL, id="enqueue-on-update", when=needs_reconcile
+)
+@kopf.on.resume(  # type: ignore
+    detection_rule_reconciler.PLURAL, id="enqueue-on-resume", when=needs_reconcile
+)
+async def enqueue_splunk_detection_rule(name, namespace, **_):
+    detection_rule_reconciler.enqueue_detection_rule(
+        namespace=namespace, rule_name=name
+    )
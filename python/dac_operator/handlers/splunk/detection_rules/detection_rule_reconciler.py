@@ -0,0 +1,187 @@
+import functools
+from enum import StrEnum
+from typing import Literal, Mapping
+
+from loguru import logger
+from pydantic import BaseModel, ValidationError
+
+from dac_operator import metrics, providers
+from dac_operator.ext import drift_detection
+from dac_operator.ext.work_queue import Priority
+from dac_operator.handlers import object_reconciler
+from dac_operator.splunk import splunk_exceptions
+from dac_operator.splunk.splunk_models import SplunkDetectionRule
+
+PLURAL = "splunkdetectionrules"
+
+# The status of detection rules is stored under the ID of the timer handler
+STATUS_KEY = "create_splunk_detection_rule"
+
+
+class ErrorMessages(StrEnum):
+    initialization_error = "Unable to configure provider, see controller logs."
+    detection_rule_create_error = "Unable to create Detection Rule upstream."
+
+
+class DetectionRuleStatus(BaseModel):
+    deployed: Literal["Deployed", "Not deployed", "Unknown"] = "Unknown"
+    message: str = ""
+    # Hash of the rendered rule last applied upstream, and when the saved search
+    # was last compared against it
+    content_hash: str | None = None
+    last_drift_check: str | None = None
+    # Generation of the object that was last deployed successfully
+    observed_generation: int | None = None
+
+
+def _parse_status(status: dict | None) -> DetectionRuleStatus:
+    try:
+        return DetectionRuleStatus.model_validate(status or {})
+    except ValidationError:
+        return DetectionRuleStatus()
+
+
+async def reconcile_detection_rule(
+    spec: dict,
+    namespace: str,
+    rule_name: str,
+    previous_status: dict | None = None,
+    listing: Mapping[str, dict] | None = None,
+    generation: int | None = None,
+) -> dict | None:
+    """
+    Render the macros of a Splunk detection rule, and create or update it upstream
+    if it differs from the saved search with the same name. A rule whose rendered
+    search did not change since it was last applied is only compared upstream by
+    the periodic drift check.
+
+    Args:
+        listing(Mapping[str, dict] | None): All saved searches by name, when syncing
+            every rule in a namespace at once. The saved search is then compared on
+            every call, without any additional requests.
+
+    Returns:
+        dict | None: The status of the rule, or None if the namespace has no Splunk
+            configuration or the status is unchanged
+    """
+    status = DetectionRuleStatus()
+    previous = _parse_status(previous_status)
+
+    try:
+        splunk_service = await providers.get_splunk_service(
+            namespace=namespace,
+            kubernetes_client=providers.get_kubernetes_client(),
+        )
+    except splunk_exceptions.ServiceConfigurationException:
+        status.message = ErrorMessages.initialization_error.value
+        return status.model_dump()
+
+    if splunk_service is None:
+        return None
+
+    try:
+        detection_rule = SplunkDetectionRule.model_validate(spec)
+    except ValidationError as err:
+        status.message = str(err)
+        return status.model_dump()
+
+    result = await splunk_service.inject_macros(
+        search=detection_rule.search, rule_name=rule_name
+    )
+
+    # Track the macros used by the rule, including missing ones, so that the rule
+    # is reconciled as soon as one of them changes
+    providers.splunk_macro_dependencies.set_dependencies(
+        namespace=namespace, rule_name=rule_name, macro_names=result.macros
+    )
+
+    if not result.success:
+        status.message = result.message
+        return status.model_dump()
+
+    detection_rule = detection_rule.model_copy(update={"search": result.search})
+    content_hash = drift_detection.compute_content_hash(detection_rule.model_dump())
+
+    unchanged = (
+        content_hash == previous.content_hash and previous.deployed == "Deployed"
+    )
+    if (
+        listing is None
+        and unchanged
+        and not drift_detection.is_drift_check_due(
+            previous.last_drift_check, providers.settings.drift_check_interval
+        )
+    ):
+        metrics.RULE_RECONCILE_OUTCOMES.labels(kind=PLURAL, outcome="unchanged").inc()
+
+        if generation is not None and generation != previous.observed_generation:
+            return previous.model_copy(
+                update={"observed_generation": generation}
+            ).model_dump()
+        return None
+
+    try:
+        applied = await splunk_service.create_or_update_detection_rule(
+            detection_rule, listing=listing
+        )
+    except Exception as err:
+        logger.error(str(err))
+        status.message = ErrorMessages.detection_rule_create_error
+        return status.model_dump()
+
+    metrics.RULE_RECONCILE_OUTCOMES.labels(
+        kind=PLURAL, outcome="applied" if applied else "in_sync"
+    ).inc()
+
+    status.deployed = "Deployed"
+    status.content_hash = content_hash
+    status.last_drift_check = drift_detection.now()
+    status.observed_generation = generation
+
+    if not object_reconciler.needs_status_update(previous_status, status.model_dump()):
+        return None
+
+    return status.model_dump()
+
+
+async def reconcile_detection_rule_by_name(
+    namespace: str, rule_name: str, listing: Mapping[str, dict] | None = None
+):
+    """
+    Reconcile a Splunk detection rule outside of its kopf handlers, e.g. when a macro
+    it depends on changed, and write the resulting status to the object.
+    """
+    exists = await object_reconciler.reconcile_by_name(
+        plural=PLURAL,
+        status_key=STATUS_KEY,
+        namespace=namespace,
+        name=rule_name,
+        reconcile=functools.partial(reconcile_detection_rule, listing=listing),
+    )
+
+    if not exists:
+        providers.splunk_macro_dependencies.remove_dependencies(
+            namespace=namespace, rule_name=rule_name
+        )
+
+
+def enqueue_detection_rule(
+    namespace: str,
+    rule_name: str,
+    priority: Priority = Priority.USER,
+    listing: Mapping[str, dict] | None = None,
+):
+    """
+    Queue a reconciliation, merged with any that is already queued, optionally
+    against a listing of the saved searches.
+    """
+    providers.work_queue.enqueue(
+        key=(namespace, PLURAL, rule_name),
+        priority=priority,
+        job=functools.partial(
+            reconcile_detection_rule_by_name,
+            namespace=namespace,
+            rule_name=rule_name,
+            listing=listing,
+        ),
+    )
@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+from loguru import logger
+
+from dac_operator import metrics, providers
+from dac_operator.ext.work_queue import Priority
+from dac_operator.handlers import object_reconciler
+from dac_operator.handlers.splunk.detection_rules import detection_rule_reconciler
+from dac_operator.splunk import splunk_exceptions
+
+
+async def sync_detection_rules(namespace: str):
+    """
+    Sync every Splunk detection rule in a namespace against a single listing of the
+    saved searches, so that only the rules that are missing or differ upstream are
+    written, and the load on Splunk scales with the number of changes.
+
+    The rules are synced through the work queue, so that they are never reconciled
+    concurrently with a change made by a user, and always from their latest spec.
+    """
+    kubernetes_client = providers.get_kubernetes_client()
+
+    try:
+        splunk_service = await providers.get_splunk_service(
+            namespace=namespace, kubernetes_client=kubernetes_client
+        )
+    except splunk_exceptions.ServiceConfigurationException:
+        logger.warning(f"Skipping Splunk sync for '{namespace}'.")
+        return
+
+    if splunk_service is None:
+        return
+
+    rules, listing = await asyncio.gather(
+        kubernetes_client.list_namespaced_custom_object(
+            group=object_reconciler.GROUP,
+            version=object_reconciler.VERSION,
+            plural=detection_rule_reconciler.PLURAL,
+            namespace=namespace,
+        ),
+        splunk_service.list_detection_rules(),
+    )
+
+    for rule in rules:
+        if not rule["metadata"].get("deletionTimestamp"):
+            detection_rule_reconciler.enqueue_detection_rule(
+                namespace=namespace,
+                rule_name=rule["metadata"]["name"],
+                priority=Priority.DRIFT,
+                listing=listing,
+            )
+
+
+async def run_detection_rule_sync(interval: float):
+    """
+    Periodically sync every namespace with a Splunk configuration.
+    """
+    while True:
+        for namespace in providers.config_map_cache.namespaces(
+            name=providers.SPLUNK_CONFIGURATION
+        ):
+            started_at = time.monotonic()
+
+            try:
+                async with providers.shard_coordinator.hold(namespace) as owned:
+                    if not owned:
+                        # Handled by another replica of the operator
+                        continue
+
+                    await sync_detection_rules(namespace=namespace)
+            except Exception:
+                logger.exception(f"Unable to sync Splunk rules of '{namespace}'.")
+                continue
+
+            metrics.SPLUNK_SYNC_DURATION.observe(time.monotonic() - started_at)
+
+        await asyncio.sleep(interval)
@@ -1,27 +1,29 @@
 import kopf
-from kubernetes import client as kubernetes_client
 
 from dac_operator import providers
-from dac_operator.splunk.splunk_models import SplunkDetectionRule
+from dac_operator.ext.work_queue import Priority
+from dac_operator.handlers.splunk.detection_rules import detection_rule_reconciler
 
-DETECTION_RULE_SYNC_INTERVAL = 500
+DETECTION_RULE_SYNC_INTERVAL = providers.settings.detection_rule_sync_interval
 
 
 @kopf.on.timer("splunkdetectionrules", interval=DETECTION_RULE_SYNC_INTERVAL)  # type: ignore
-async def create_splunk_detection_rule(spec, **kwargs):
+async def create_splunk_detection_rule(stopped, **kwargs):
     namespace = kwargs["namespace"]
 
-    splunk_service = providers.get_splunk_service(
-        namespace=namespace,
-        kubernetes_client=providers.get_kubernetes_client(
-            core_api=kubernetes_client.CoreV1Api(),
-            custom_objects_api=kubernetes_client.CustomObjectsApi(),
-        ),
-    )
+    # Drift is caught by the bulk sync instead, see detection_rule_sync
+    if providers.settings.splunk_sync_interval > 0:
+        return
 
-    if splunk_service is None:
+    if not await providers.reconcile_scheduler.wait_for_turn(
+        kind=detection_rule_reconciler.PLURAL,
+        key=f"{namespace}/{kwargs['name']}",
+        interval=DETECTION_RULE_SYNC_INTERVAL,
+        stopped=stopped,
+    ):
         return
 
-    await splunk_service.create_or_update_detection_rule(
-        SplunkDetectionRule.model_validate(spec)
+    # Changes are reconciled as they happen, the timer only catches drift upstream
+    detection_rule_reconciler.enqueue_detection_rule(
+        namespace=namespace, rule_name=kwargs["name"], priority=Priority.DRIFT
     )
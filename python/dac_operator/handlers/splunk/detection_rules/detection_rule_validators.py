@@ -0,0 +1,62 @@
+import kopf
+from loguru import logger
+from pydantic import ValidationError
+
+from dac_operator import metrics, providers
+from dac_operator.crd import crd_models, macro_exceptions, macro_renderer
+from dac_operator.crd.macro_resolver import MacroResolver
+from dac_operator.splunk.splunk_models import SplunkDetectionRule
+
+
+@kopf.on.validate(
+    "splunkdetectionrules",
+    operations=["CREATE", "UPDATE"],
+    id="validate-splunk-detection-rule",
+)  # type: ignore
+async def validate_splunk_detection_rule(spec, name, namespace, warnings, **_):
+    with metrics.ADMISSION_REVIEW_DURATION.labels(
+        webhook="validate-splunk-detection-rule"
+    ).time():
+        try:
+            detection_rule = SplunkDetectionRule.model_validate(spec)
+        except ValidationError as err:
+            logger.error(str(err))
+            raise kopf.AdmissionError(
+                "Splunk Detection Rule specification did not pass validation:"
+                f"\n\n {err}"
+            )
+
+        if not detection_rule.search.strip():
+            raise kopf.AdmissionError("The search of a Splunk Detection Rule is empty.")
+
+        macro_resolver = MacroResolver(
+            kubernetes_client=providers.get_kubernetes_client(),
+            macro_index=providers.splunk_macro_index,
+            namespace=namespace,
+            plural="splunkmacros",
+            find_macros=macro_renderer.find_macros,
+            model=crd_models.SplunkMacro,
+        )
+
+        # Render the search against the macro index, so that rules that can never be
+        # deployed are rejected before they reach the reconcile path
+        macros, missing = await macro_resolver.resolve(query=detection_rule.search)
+
+        if missing:
+            message = (
+                f"The macro(s) {', '.join(sorted(missing))} referenced in the search "
+                f"of '{name}' are not deployed in '{namespace}'."
+            )
+            if providers.settings.admission_reject_missing_macros:
+                raise kopf.AdmissionError(message)
+
+            warnings.append(message)
+            return
+
+        try:
+            macro_renderer.render(query=detection_rule.search, macros=macros)
+        except macro_exceptions.MacroCycleException as err:
+            raise kopf.AdmissionError(
+                f"The macros referenced in the search of '{name}' contain a cycle: "
+                f"{err}"
+            )
@@ -0,0 +1,42 @@
+import kopf
+from loguru import logger
+
+from dac_operator import providers
+from dac_operator.handlers.splunk.detection_rules import detection_rule_reconciler
+
+
+def reconcile_dependents(namespace: str, macro_name: str):
+    """
+    Immediately reconcile the Splunk detection rules that reference a macro, instead
+    of waiting for their next timer tick.
+    """
+    dependents = providers.splunk_macro_dependencies.get_dependents(
+        namespace=namespace, macro_name=macro_name
+    )
+
+    if dependents:
+        logger.info(
+            f"Macro '{macro_name}' in '{namespace}' changed, reconciling "
+            f"{len(dependents)} dependent Splunk Detection Rule(s)."
+        )
+
+    for rule_name in dependents:
+        detection_rule_reconciler.enqueue_detection_rule(
+            namespace=namespace, rule_name=rule_name
+        )
+
+
+@kopf.on.event("splunkmacros")  # type: ignore
+async def watch_splunk_macro(event, body, spec, name, namespace, **_):
+    if event["type"] == "DELETED":
+        changed = providers.splunk_macro_index.delete(namespace=namespace, name=name)
+    else:
+        changed = providers.splunk_macro_index.set(
+            namespace=namespace,
+            name=name,
+            content=spec.get("content", ""),
+            resource_version=body["metadata"].get("resourceVersion"),
+        )
+
+    if changed:
+        reconcile_dependents(namespace=namespace, macro_name=name)
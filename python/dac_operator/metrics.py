@@ -0,0 +1,191 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+ACCESS_TOKEN_CACHE_REQUESTS = Counter(
+    "dac_operator_access_token_cache_requests_total",
+    "Number of access token lookups against the process-wide token cache.",
+    ["result"],
+)
+
+KUBERNETES_CACHE_REQUESTS = Counter(
+    "dac_operator_kubernetes_cache_requests_total",
+    "Number of lookups against the watch-backed Kubernetes resource caches.",
+    ["kind", "result"],
+)
+
+KUBERNETES_REQUEST_DURATION = Histogram(
+    "dac_operator_kubernetes_request_duration_seconds",
+    "Time taken by requests to the Kubernetes API, including the thread pool wait.",
+    ["operation", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+KUBERNETES_REQUESTS_IN_FLIGHT = Gauge(
+    "dac_operator_kubernetes_requests_in_flight",
+    "Number of requests to the Kubernetes API currently running or waiting.",
+)
+
+KUBERNETES_CACHE_ENTRIES = Gauge(
+    "dac_operator_kubernetes_cache_entries",
+    "Number of resources currently held in the watch-backed caches.",
+    ["kind"],
+)
+
+KUBERNETES_CACHE_ENTRY_AGE = Histogram(
+    "dac_operator_kubernetes_cache_entry_age_seconds",
+    "Time since a cached resource was last refreshed, observed on every hit.",
+    ["kind"],
+    buckets=(1, 10, 60, 300, 900, 1800, 3600, 7200, 21600, 86400),
+)
+
+KUBERNETES_CACHE_LAST_EVENT = Gauge(
+    "dac_operator_kubernetes_cache_last_event_timestamp_seconds",
+    "Unix timestamp of the last watch event received for a cached kind.",
+    ["kind"],
+)
+
+MACRO_INDEX_ENTRIES = Gauge(
+    "dac_operator_macro_index_entries",
+    "Number of macros currently held in the in-memory macro index.",
+    ["kind"],
+)
+
+MACRO_RENDER_CACHE_REQUESTS = Counter(
+    "dac_operator_macro_render_cache_requests_total",
+    "Number of lookups against the cache of rendered queries.",
+    ["kind", "result"],
+)
+
+MACRO_INJECTION_DURATION = Histogram(
+    "dac_operator_macro_injection_duration_seconds",
+    "Time taken to resolve and render the macros of a rule.",
+    ["kind"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+
+RULE_CONFLICTS = Counter(
+    "dac_operator_rule_conflicts_total",
+    "Number of rule writes rejected upstream with a conflict, by reason.",
+    ["kind", "reason"],
+)
+
+RULE_RECONCILE_OUTCOMES = Counter(
+    "dac_operator_rule_reconcile_outcomes_total",
+    "Number of rule reconciliations, by whether the rule was written upstream.",
+    ["kind", "outcome"],
+)
+
+WORKSPACE_RECONCILE_DURATION = Histogram(
+    "dac_operator_workspace_reconcile_duration_seconds",
+    "Time taken to reconcile every rule in a workspace against a single listing.",
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+
+SPLUNK_SYNC_DURATION = Histogram(
+    "dac_operator_splunk_sync_duration_seconds",
+    "Time taken to sync every Splunk detection rule in a namespace at once.",
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+
+UPSTREAM_REQUEST_DURATION = Histogram(
+    "dac_operator_upstream_request_duration_seconds",
+    "Time taken by each upstream request, by repository method, tenant and status.",
+    ["backend", "endpoint", "tenant", "status"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+UPSTREAM_REQUESTS_IN_FLIGHT = Gauge(
+    "dac_operator_upstream_requests_in_flight",
+    "Number of upstream requests currently awaiting a response.",
+    ["backend"],
+)
+
+UPSTREAM_REQUEST_QUEUE_DEPTH = Gauge(
+    "dac_operator_upstream_request_queue_depth",
+    "Number of upstream requests waiting for the rate limiter.",
+    ["backend", "operation"],
+)
+
+UPSTREAM_REQUEST_QUEUE_WAIT = Histogram(
+    "dac_operator_upstream_request_queue_wait_seconds",
+    "Time upstream requests spent waiting for the rate limiter.",
+    ["backend"],
+    buckets=(0.005, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+UPSTREAM_REQUEST_RETRIES = Counter(
+    "dac_operator_upstream_request_retries_total",
+    "Number of upstream requests retried after being throttled or failing.",
+    ["backend", "reason"],
+)
+
+UPSTREAM_RATE_LIMIT_REMAINING = Gauge(
+    "dac_operator_upstream_rate_limit_remaining",
+    "Last number of remaining requests reported by the upstream rate limit headers.",
+    ["backend", "operation"],
+)
+
+UPSTREAM_CONDITIONAL_REQUESTS = Counter(
+    "dac_operator_upstream_conditional_requests_total",
+    "Number of conditional upstream requests, by whether the e-tag still matched.",
+    ["method", "result"],
+)
+
+RECONCILE_WARM_UP_WAITING = Gauge(
+    "dac_operator_reconcile_warm_up_waiting",
+    "Number of resources waiting for their first reconciliation after startup.",
+    ["kind"],
+)
+
+ADMISSION_REVIEW_DURATION = Histogram(
+    "dac_operator_admission_review_duration_seconds",
+    "Time taken by the validating webhooks to review an admission request.",
+    ["webhook"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+
+WORK_QUEUE_DEPTH = Gauge(
+    "dac_operator_work_queue_depth",
+    "Number of reconciliations waiting in the work queue.",
+    ["priority"],
+)
+
+WORK_QUEUE_DEFERRED = Gauge(
+    "dac_operator_work_queue_deferred",
+    "Number of reconciliations deferred until a backoff delay has passed.",
+)
+
+WORK_QUEUE_LATENCY = Histogram(
+    "dac_operator_work_queue_latency_seconds",
+    "Time reconciliations spent in the work queue before being started.",
+    ["kind", "priority"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900),
+)
+
+WORK_QUEUE_DURATION = Histogram(
+    "dac_operator_work_queue_duration_seconds",
+    "Time taken to process a reconciliation from the work queue.",
+    ["kind"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+SHARDS_OWNED = Gauge(
+    "dac_operator_shards_owned",
+    "Number of namespace shards currently handled by this replica.",
+)
+
+SHARD_MEMBERS = Gauge(
+    "dac_operator_shard_members",
+    "Number of live operator replicas that namespace shards are spread across.",
+)
+
+SHARD_HANDOFFS = Counter(
+    "dac_operator_shard_handoffs_total",
+    "Number of namespace shards taken over, released or lost by this replica.",
+    ["direction"],
+)
+
+STATE_STORE_FLUSH_DURATION = Histogram(
+    "dac_operator_state_store_flush_duration_seconds",
+    "Time taken to write buffered upstream rule versions to the state store.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
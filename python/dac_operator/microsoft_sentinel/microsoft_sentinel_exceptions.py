@@ -1,4 +1,27 @@
-class MacroInjectionException(Exception): ...
+from dac_operator.crd.macro_exceptions import (
+    MacroCycleException as MacroCycleException,
+)
+from dac_operator.crd.macro_exceptions import (
+    MacroInjectionException as MacroInjectionException,
+)
+from dac_operator.crd.macro_exceptions import (
+    MacroNotFoundException as MacroNotFoundException,
+)
 
 
 class ServiceConfigurationException(Exception): ...
+
+
+class RuleConflictException(Exception):
+    """A rule was rejected upstream with a 409, and can only be written later on."""
+
+    def __init__(self, rule_id: str, reason: str):
+        super().__init__(f"Conflict while writing rule '{rule_id}': {reason}")
+        self.rule_id = rule_id
+        self.reason = reason
+
+
+class RuleRecentlyDeletedException(RuleConflictException): ...
+
+
+class RuleEtagMismatchException(RuleConflictException): ...
@@ -1,12 +1,14 @@
-import re
+from typing import Mapping
 
+from dac_operator.crd import macro_renderer
 
-class MicrosoftSentinelMacroService:
-    def __init__(self):
-        self.macro_pattern = r"`\$\{([a-zA-Z-0-9]+)\}`"
 
+class MicrosoftSentinelMacroService:
     def get_used_macros(self, query: str) -> list[str]:
-        return re.findall(self.macro_pattern, query)
+        return macro_renderer.find_macros(query)
 
-    def replace_macro(self, text: str, macro_name: str, replacement: str):
-        return re.sub(rf"`\$\{{{macro_name}\}}`", replacement, text)
+    def render(self, query: str, macros: Mapping[str, str]) -> str:
+        """
+        Substitute all macros in a query in a single pass, see `macro_renderer.render`
+        """
+        return macro_renderer.render(query=query, macros=macros)
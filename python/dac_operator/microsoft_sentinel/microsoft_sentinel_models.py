@@ -1,4 +1,4 @@
-from typing import Literal
+from typing import Any, Literal
 
 from pydantic import BaseModel, ConfigDict, Field
 
@@ -68,6 +68,8 @@ class MacroInjectionResult(BaseModel):
     success: bool
     query: str
     message: str = ""
+    # Every macro referenced by the query, including nested and missing macros
+    macros: set[str] = set()
 
 
 class AnalyticsRuleStatus(BaseModel):
@@ -164,6 +166,68 @@ class CreateScheduledAlertRule(BaseModelWithConfig):
     properties: ScheduledAlertRuleProperties
 
 
+class RuleResource(BaseModelWithConfig):
+    """A rule as stored upstream, e.g. in the response to a GET or a PUT"""
+
+    name: str
+    etag: str | None = None
+    kind: str = "Unknown"
+    properties: dict[str, Any] = {}
+
+
+class WorkspaceConfiguration(BaseModel):
+    """
+    A workspace that rules of a namespace can be deployed to, as configured in the
+    `microsoft-sentinel-configuration` config map
+    """
+
+    azure_tenant_id: str
+    azure_subscription_id: str
+    azure_resource_group_id: str
+    azure_workspace_id: str
+    secret_ref: str
+    labels: dict[str, str] = {}
+
+
+class WorkspaceSelector(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    match_labels: dict[str, str] = Field(..., alias="matchLabels")
+
+
+class WorkspaceTargets(BaseModel):
+    """
+    The workspaces a rule is deployed to, as selected in its spec. Other fields of
+    the spec are ignored.
+    """
+
+    model_config = ConfigDict(populate_by_name=True)
+
+    workspaces: list[str] = []
+    workspace_selector: WorkspaceSelector | None = Field(
+        None, alias="workspaceSelector"
+    )
+
+    @property
+    def targeted(self) -> bool:
+        """Whether workspaces were selected, instead of the default workspace"""
+        return bool(self.workspaces) or self.workspace_selector is not None
+
+    def select(self, configurations: dict[str, WorkspaceConfiguration]) -> list[str]:
+        """The names of the configured workspaces that are targeted, sorted"""
+        selected = {name for name in self.workspaces if name in configurations}
+
+        if self.workspace_selector is not None:
+            match_labels = self.workspace_selector.match_labels.items()
+            selected.update(
+                name
+                for name, configuration in configurations.items()
+                if match_labels <= configuration.labels.items()
+            )
+
+        return sorted(selected)
+
+
 class CreateScheduledAlertRuleCRDInput(BaseModelWithConfig):
     displayName: str
     enabled: bool
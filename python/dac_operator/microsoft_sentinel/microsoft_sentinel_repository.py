@@ -2,7 +2,21 @@ import httpx
 from loguru import logger as default_loguru_logger
 from pydantic import SecretStr
 
-from dac_operator.microsoft_sentinel import microsoft_sentinel_models
+from dac_operator import metrics
+from dac_operator.ext import request_scheduler
+from dac_operator.ext.state_store import StateStore
+from dac_operator.microsoft_sentinel import (
+    microsoft_sentinel_exceptions,
+    microsoft_sentinel_models,
+)
+from dac_operator.microsoft_sentinel.microsoft_sentinel_token_cache import (
+    AccessTokenCache,
+)
+
+MANAGEMENT_SCOPE = "https://management.azure.com/.default"
+
+ALERT_RULES = "alertRules"
+AUTOMATION_RULES = "automationRules"
 
 
 class MicrosoftSentinelRepository:
@@ -14,7 +28,9 @@ class MicrosoftSentinelRepository:
         resource_group_id: str,
         workspace_id: str,
         client_secret: str,
+        token_cache: AccessTokenCache,
         http_client=httpx.AsyncClient(timeout=30),
+        state_store: StateStore | None = None,
         logger=default_loguru_logger,
     ):
         self._client_id = client_id
@@ -25,8 +41,77 @@ class MicrosoftSentinelRepository:
         self._logger = logger
         self._workspace_id = workspace_id
         self._http_client = http_client
+        self._token_cache = token_cache
+        self._state_store = state_store
+        self._scope = f"{subscription_id}/{resource_group_id}/{workspace_id}"
+        # Collection (alertRules, automationRules) -> rule ID -> latest version of
+        # the rule seen upstream, used to send conditional requests by e-tag. Kept
+        # in the state store, if any, so that it survives restarts.
+        self._rules: dict[str, dict[str, dict]] = {
+            ALERT_RULES: {},
+            AUTOMATION_RULES: {},
+        }
+        # Collections listed in full since the repository was created, whose rules
+        # that were not seen are known not to exist
+        self._listed: set[str] = set()
+
+    async def restore(self):
+        """Read the rules seen upstream before a restart from the state store."""
+        if self._state_store is None:
+            return
+
+        stored = await self._state_store.load(self._scope)
+        for collection, rules in self._rules.items():
+            for rule_id, rule in stored.get(collection, {}).items():
+                rules.setdefault(rule_id, rule)
+
+    def _url(self, collection: str, rule_id: str | None = None) -> str:
+        url = f"https://management.azure.com/subscriptions/{self._subscription_id}/resourceGroups/{self._resource_group_id}/providers/Microsoft.OperationalInsights/workspaces/{self._workspace_id}/providers/Microsoft.SecurityInsights/{collection}"  # noqa: E501
+
+        if rule_id is not None:
+            url = f"{url}/{rule_id}"
+
+        return f"{url}?api-version=2024-09-01"
+
+    def _remember(self, collection: str, rule: dict):
+        if not rule.get("name") or not rule.get("etag"):
+            return
+
+        previous = self._rules[collection].get(rule["name"])
+        self._rules[collection][rule["name"]] = rule
+
+        # Listings return every rule, most of which did not change since
+        if self._state_store is not None and (
+            previous is None or previous["etag"] != rule["etag"]
+        ):
+            self._state_store.put(self._scope, collection, rule["name"], rule)
+
+    def _forget(self, collection: str, rule_id: str):
+        if self._rules[collection].pop(rule_id, None) is None:
+            return
+
+        if self._state_store is not None:
+            self._state_store.delete(self._scope, collection, rule_id)
+
+    def get_etag(self, collection: str, rule_id: str) -> str | None:
+        """The e-tag of the latest version of a rule seen upstream, if any"""
+        rule = self._rules[collection].get(rule_id)
+        return rule["etag"] if rule is not None else None
 
-    async def authenticate(self):
+    def may_exist(self, collection: str, rule_id: str) -> bool:
+        """Whether a rule may exist upstream, as far as it was seen"""
+        return collection not in self._listed or rule_id in self._rules[collection]
+
+    async def authenticate(self) -> str:
+        return await self._token_cache.get_token(
+            tenant_id=self._tenant_id,
+            client_id=self._client_id,
+            scope=MANAGEMENT_SCOPE,
+            fetch_token=self._request_token,
+        )
+
+    @request_scheduler.endpoint
+    async def _request_token(self) -> dict:
         try:
             response = await self._http_client.post(
                 f"https://login.microsoftonline.com/{self._tenant_id}/oauth2/v2.0/token",
@@ -34,7 +119,7 @@ class MicrosoftSentinelRepository:
                     "client_id": self._client_id,
                     "client_secret": self._client_secret,
                     "grant_type": "client_credentials",
-                    "scope": "https://management.azure.com/.default",
+                    "scope": MANAGEMENT_SCOPE,
                 },
             )
             response.raise_for_status()
@@ -44,114 +129,265 @@ class MicrosoftSentinelRepository:
             )
             raise
 
-        return response.json()["access_token"]
+        return response.json()
 
-    async def get_analytics_rules(self) -> list[dict]:
+    async def _list(self, collection: str, resource: str) -> list[dict]:
+        """
+        Fetch every item of a collection, following `nextLink` until the last page.
+        Rules seen before that are not listed no longer exist upstream, and are
+        forgotten.
+        """
         token = await self.authenticate()
+        items: list[dict] = []
+        next_link: str | None = self._url(collection)
+        known = dict(self._rules[collection])
 
-        try:
-            response = await self._http_client.get(
-                f"https://management.azure.com/subscriptions/{self._subscription_id}/resourceGroups/{self._resource_group_id}/providers/Microsoft.OperationalInsights/workspaces/{self._workspace_id}/providers/Microsoft.SecurityInsights/alertRules?api-version=2024-09-01",
-                headers={"Authorization": f"Bearer {token}"},
-            )
-            response.raise_for_status()
-        except httpx.HTTPStatusError as err:
-            self._logger.exception(
-                f"An error occured when fetching all Analytics Rules. Response: {err.response}"  # noqa: E501
-            )
-            raise
+        while next_link:
+            try:
+                response = await self._http_client.get(
+                    next_link,
+                    headers={"Authorization": f"Bearer {token}"},
+                )
+                response.raise_for_status()
+            except httpx.HTTPStatusError as err:
+                self._logger.exception(
+                    f"An error occured when fetching all {resource}. Response: {err.response}"  # noqa: E501
+                )
+                raise
 
-        return response.json()["value"]
+            page = response.json()
+            for item in page.get("value", []):
+                self._remember(collection, item)
+                items.append(item)
+            next_link = page.get("nextLink")
 
-    async def get_analytics_rule(self, analytic_rule_id: str) -> dict | None:
+        listed = {item.get("name") for item in items}
+        for rule_id, rule in known.items():
+            # Unless the rule was written or fetched while the pages were listed
+            if rule_id not in listed and self._rules[collection].get(rule_id) is rule:
+                self._forget(collection, rule_id)
+
+        self._listed.add(collection)
+        return items
+
+    @request_scheduler.endpoint
+    async def get_analytics_rules(self) -> list[dict]:
+        return await self._list(ALERT_RULES, resource="Analytics Rules")
+
+    @request_scheduler.endpoint
+    async def get_automation_rules(self) -> list[dict]:
+        return await self._list(AUTOMATION_RULES, resource="Automation Rules")
+
+    async def _get_rule(self, collection: str, rule_id: str) -> dict | None:
+        """
+        Fetch a rule, conditionally if a version of it was seen before, so that the
+        rule body is only downloaded when it changed upstream.
+        """
         token = await self.authenticate()
+        headers = {"Authorization": f"Bearer {token}"}
+
+        cached = self._rules[collection].get(rule_id)
+        if cached is not None:
+            headers["If-None-Match"] = cached["etag"]
 
         try:
             response = await self._http_client.get(
-                f"https://management.azure.com/subscriptions/{self._subscription_id}/resourceGroups/{self._resource_group_id}/providers/Microsoft.OperationalInsights/workspaces/{self._workspace_id}/providers/Microsoft.SecurityInsights/alertRules/{analytic_rule_id}?api-version=2024-09-01",
-                headers={"Authorization": f"Bearer {token}"},
+                self._url(collection, rule_id), headers=headers
             )
+            if cached is not None and response.status_code == 304:
+                metrics.UPSTREAM_CONDITIONAL_REQUESTS.labels(
+                    method="GET", result="not_modified"
+                ).inc()
+                return cached
+
             response.raise_for_status()
         except httpx.HTTPStatusError as err:
             if err.response.status_code == 404:
+                self._forget(collection, rule_id)
                 return None
 
             self._logger.exception(
-                f"An error occured when fetching Analytic rule '{analytic_rule_id}'. Response: {err.response}"  # noqa: E501
+                f"An error occured when fetching rule '{rule_id}' from {collection}. Response: {err.response}"  # noqa: E501
             )
             raise
 
-        return response.json()
+        if cached is not None:
+            metrics.UPSTREAM_CONDITIONAL_REQUESTS.labels(
+                method="GET", result="modified"
+            ).inc()
 
-    async def create_or_update_scheduled_alert_rule(
-        self,
-        payload: microsoft_sentinel_models.CreateScheduledAlertRule,
-        analytic_rule_id: str,
+        rule = response.json()
+        self._remember(collection, rule)
+        return rule
+
+    @request_scheduler.endpoint
+    async def get_analytics_rule(self, analytic_rule_id: str) -> dict | None:
+        return await self._get_rule(ALERT_RULES, rule_id=analytic_rule_id)
+
+    @request_scheduler.endpoint
+    async def get_automation_rule(self, automation_rule_id: str) -> dict | None:
+        return await self._get_rule(AUTOMATION_RULES, rule_id=automation_rule_id)
+
+    def _is_etag_mismatch(self, response: httpx.Response) -> bool:
+        return response.status_code == 412 or (
+            response.status_code == 409 and "Etag does not match" in response.text
+        )
+
+    def _raise_conflict(
+        self, response: httpx.Response, rule_id: str, display_name: str | None
     ):
+        """
+        Raise a typed exception for a 409 response, so that the caller can retry the
+        write once the conflict is expected to be resolved.
+
+        Raises:
+            RuleRecentlyDeletedException: If a rule with the same ID was deleted
+                recently, which blocks re-creating it for up to an hour or more
+
+            RuleEtagMismatchException: If the rule was changed concurrently
+
+            RuleConflictException: For any other conflict
+        """
+        if "was recently deleted" in response.text:
+            self._logger.info(f"'{display_name}' was deleted too recently.")
+            raise microsoft_sentinel_exceptions.RuleRecentlyDeletedException(
+                rule_id=rule_id, reason="recently deleted"
+            ) from None
+
+        if self._is_etag_mismatch(response):
+            self._logger.info(f"'{display_name}' e-tag error.")
+            raise microsoft_sentinel_exceptions.RuleEtagMismatchException(
+                rule_id=rule_id, reason="e-tag mismatch"
+            ) from None
+
+        self._logger.info(f"An unknown 409 error occured: {response.text}")
+        raise microsoft_sentinel_exceptions.RuleConflictException(
+            rule_id=rule_id, reason=response.text
+        ) from None
+
+    async def _put_rule(
+        self,
+        collection: str,
+        rule_id: str,
+        payload: dict,
+        resource: str,
+    ) -> microsoft_sentinel_models.RuleResource:
+        """
+        Create or update a rule. Updates are conditional on the e-tag of the version
+        of the rule seen last, so that changes made upstream in the meantime are not
+        overwritten blindly. If the rule did change, the latest version is fetched
+        and the payload is applied on top of it once more.
+
+        Raises:
+            RuleConflictException: If the rule can not be written right now, see
+                `_raise_conflict`
+        """
         token = await self.authenticate()
+        display_name = payload["properties"].get("displayName")
 
-        try:
-            response = await self._http_client.put(
-                f"https://management.azure.com/subscriptions/{self._subscription_id}/resourceGroups/{self._resource_group_id}/providers/Microsoft.OperationalInsights/workspaces/{self._workspace_id}/providers/Microsoft.SecurityInsights/alertRules/{analytic_rule_id}?api-version=2024-09-01",
-                headers={"Authorization": f"Bearer {token}"},
-                json=payload.model_dump(by_alias=True),
-            )
-            response.raise_for_status()
-        except httpx.HTTPStatusError as err:
-            if err.response.status_code == 409:
-                if "was recently deleted" in err.response.text:
-                    self._logger.info(
-                        f"'{payload.properties.displayName}' was deleted too recently, retrying later."  # noqa: E501
-                    )
-                elif "Etag does not match" in err.response.text:
-                    self._logger.info(
-                        f"'{payload.properties.displayName}' e-tag error, retrying later."  # noqa: E501
+        for attempt in range(2):
+            headers = {"Authorization": f"Bearer {token}"}
+
+            etag = self.get_etag(collection, rule_id)
+            if etag is not None:
+                headers["If-Match"] = etag
+
+            try:
+                response = await self._http_client.put(
+                    self._url(collection, rule_id), headers=headers, json=payload
+                )
+                response.raise_for_status()
+            except httpx.HTTPStatusError as err:
+                if etag is not None and self._is_etag_mismatch(err.response):
+                    metrics.UPSTREAM_CONDITIONAL_REQUESTS.labels(
+                        method="PUT", result="mismatch"
+                    ).inc()
+
+                    if attempt == 0:
+                        self._logger.info(
+                            f"'{display_name}' changed upstream, retrying on top of its latest version."  # noqa: E501
+                        )
+                        self._forget(collection, rule_id)
+                        await self._get_rule(collection, rule_id=rule_id)
+                        continue
+
+                if err.response.status_code in (409, 412):
+                    self._raise_conflict(
+                        response=err.response,
+                        rule_id=rule_id,
+                        display_name=display_name,
                     )
-            else:
+
                 self._logger.exception(
-                    f"An error occured while creating Analytics rule: {err.response.text}"  # noqa: E501
+                    f"An error occured while creating {resource}: {err.response.text}"
                 )
                 raise err from None
 
+            break
+
+        # The response holds the rule as stored upstream, including its new e-tag
+        rule = response.json()
+        self._remember(collection, rule)
+        return microsoft_sentinel_models.RuleResource.model_validate(rule)
+
+    @request_scheduler.endpoint
+    async def create_or_update_scheduled_alert_rule(
+        self,
+        payload: microsoft_sentinel_models.CreateScheduledAlertRule,
+        analytic_rule_id: str,
+    ) -> microsoft_sentinel_models.RuleResource:
+        return await self._put_rule(
+            ALERT_RULES,
+            rule_id=analytic_rule_id,
+            payload=payload.model_dump(by_alias=True),
+            resource="Analytics rule",
+        )
+
+    @request_scheduler.endpoint
     async def create_or_update_automation_rule(
         self,
         payload: dict,
         automation_rule_id: str,
-    ):
+    ) -> microsoft_sentinel_models.RuleResource:
+        return await self._put_rule(
+            AUTOMATION_RULES,
+            rule_id=automation_rule_id,
+            payload=payload,
+            resource="Automation rule",
+        )
+
+    @request_scheduler.endpoint
+    async def remove_scheduled_alert_rule(self, analytic_rule_id: str):
         token = await self.authenticate()
 
         try:
-            response = await self._http_client.put(
-                f"https://management.azure.com/subscriptions/{self._subscription_id}/resourceGroups/{self._resource_group_id}/providers/Microsoft.OperationalInsights/workspaces/{self._workspace_id}/providers/Microsoft.SecurityInsights/automationRules/{automation_rule_id}?api-version=2024-09-01",
+            response = await self._http_client.delete(
+                f"https://management.azure.com/subscriptions/{self._subscription_id}/resourceGroups/{self._resource_group_id}/providers/Microsoft.OperationalInsights/workspaces/{self._workspace_id}/providers/Microsoft.SecurityInsights/alertRules/{analytic_rule_id}?api-version=2024-09-01",
                 headers={"Authorization": f"Bearer {token}"},
-                json=payload,
             )
             response.raise_for_status()
         except httpx.HTTPStatusError as err:
-            if err.response.status_code == 409:
-                if "was recently deleted" in err.response.text:
-                    self._logger.info(
-                        f"'{payload['properties'].displayName}' was deleted too recently, retrying later."  # noqa: E501
-                    )
-                else:
-                    self._logger.info("An unknown 409 error occured.")
-            else:
-                self._logger.exception(
-                    f"An error occured while creating Automation rule: {err.response.text}"  # noqa: E501
-                )
-                raise err from None
+            self._logger.exception(
+                f"An error occured while creating Analytics rule: {err.response.text}"  # noqa: E501
+            )
+            raise err from None
 
-    async def remove_scheduled_alert_rule(self, analytic_rule_id: str):
+        self._forget(ALERT_RULES, analytic_rule_id)
+
+    @request_scheduler.endpoint
+    async def remove_automation_rule(self, automation_rule_id: str):
         token = await self.authenticate()
 
         try:
             response = await self._http_client.delete(
-                f"https://management.azure.com/subscriptions/{self._subscription_id}/resourceGroups/{self._resource_group_id}/providers/Microsoft.OperationalInsights/workspaces/{self._workspace_id}/providers/Microsoft.SecurityInsights/alertRules/{analytic_rule_id}?api-version=2024-09-01",
+                f"https://management.azure.com/subscriptions/{self._subscription_id}/resourceGroups/{self._resource_group_id}/providers/Microsoft.OperationalInsights/workspaces/{self._workspace_id}/providers/Microsoft.SecurityInsights/automationRules/{automation_rule_id}?api-version=2024-09-01",
                 headers={"Authorization": f"Bearer {token}"},
             )
             response.raise_for_status()
         except httpx.HTTPStatusError as err:
             self._logger.exception(
-                f"An error occured while creating Analytics rule: {err.response.text}"  # noqa: E501
+                f"An error occured while removing Automation rule: {err.response.text}"  # noqa: E501
             )
             raise err from None
+
+        self._forget(AUTOMATION_RULES, automation_rule_id)
@@ -1,11 +1,14 @@
 import hashlib
+import re
 
 from loguru import logger as default_loguru_logger
 
-from dac_operator.crd import crd_models
-from dac_operator.ext import kubernetes_exceptions
-from dac_operator.ext.kubernetes_client import KubernetesClient
+from dac_operator import metrics
+from dac_operator.crd.macro_index import MacroIndex
+from dac_operator.crd.macro_resolver import MacroResolver
+from dac_operator.ext.kubernetes_client import AsyncKubernetesClient
 from dac_operator.microsoft_sentinel import (
+    microsoft_sentinel_exceptions,
     microsoft_sentinel_models,
     microsoft_sentinel_repository,
 )
@@ -13,69 +16,139 @@ from dac_operator.microsoft_sentinel.microsoft_sentinel_macro_service import (
     MicrosoftSentinelMacroService,
 )
 
+# Rule IDs generated by the operator, used to tell its rules apart from ones created
+# in the portal (which use GUIDs). With namespaced rule IDs, the first characters
+# identify the namespace that owns the rule, since several namespaces may deploy to
+# the same workspace.
+RULE_ID_PATTERN = re.compile(r"^[0-9a-f]{40}$")
+NAMESPACE_PREFIX_LENGTH = 8
+
 
 class MicrosoftSentinelService:
     def __init__(
         self,
         repository: microsoft_sentinel_repository.MicrosoftSentinelRepository,
-        kubernetes_client: KubernetesClient,
+        kubernetes_client: AsyncKubernetesClient,
+        macro_index: MacroIndex,
         namespace: str,
+        namespaced_rule_ids: bool = False,
         logger=default_loguru_logger,
     ):
         self._repository = repository
         self._kubernetes_client = kubernetes_client
+        self._macro_index = macro_index
+        self._macro_service = MicrosoftSentinelMacroService()
+        self._macro_resolver = MacroResolver(
+            kubernetes_client=kubernetes_client,
+            macro_index=macro_index,
+            namespace=namespace,
+            plural="microsoftsentinelmacros",
+            find_macros=self._macro_service.get_used_macros,
+        )
         self._logger = logger
         self._namespace = namespace
+        self._namespaced_rule_ids = namespaced_rule_ids
 
-    def _compute_analytics_rule_id(self, rule_name: str) -> str:
-        return hashlib.sha1(rule_name.encode()).hexdigest()
+    def _namespace_prefix(self) -> str:
+        return hashlib.sha1(self._namespace.encode()).hexdigest()[
+            :NAMESPACE_PREFIX_LENGTH
+        ]
+
+    def _compute_rule_id(self, rule_name: str) -> str:
+        if not self._namespaced_rule_ids:
+            return self._compute_legacy_rule_id(rule_name=rule_name)
 
-    def _compute_automation_rule_id(self, rule_name: str) -> str:
+        digest = hashlib.sha1(f"{self._namespace}/{rule_name}".encode()).hexdigest()
+        return self._namespace_prefix() + digest[NAMESPACE_PREFIX_LENGTH:]
+
+    def _compute_legacy_rule_id(self, rule_name: str) -> str:
+        """The ID of a rule unless IDs are scoped to their namespace"""
         return hashlib.sha1(rule_name.encode()).hexdigest()
 
+    def compute_analytics_rule_id(self, rule_name: str) -> str:
+        """The ID of a Detection Rule upstream, e.g. to look it up in a listing"""
+        return self._compute_rule_id(rule_name)
+
+    def compute_automation_rule_id(self, rule_name: str) -> str:
+        """The ID of an Automation Rule upstream, e.g. to look it up in a listing"""
+        return self._compute_rule_id(rule_name)
+
+    async def _remove_legacy_rule(self, collection: str, rule_name: str):
+        """
+        Remove the copy of a rule deployed under its legacy ID, once it is deployed
+        under its namespaced one, so that it does not run twice.
+        """
+        if not self._namespaced_rule_ids:
+            return
+
+        legacy_rule_id = self._compute_legacy_rule_id(rule_name=rule_name)
+        if not self._repository.may_exist(collection, legacy_rule_id):
+            return
+
+        try:
+            if collection == microsoft_sentinel_repository.ALERT_RULES:
+                await self._repository.remove_scheduled_alert_rule(
+                    analytic_rule_id=legacy_rule_id
+                )
+            else:
+                await self._repository.remove_automation_rule(
+                    automation_rule_id=legacy_rule_id
+                )
+        except Exception:
+            self._logger.warning(
+                f"Unable to remove '{rule_name}' from '{self._namespace}' under its "
+                f"legacy ID '{legacy_rule_id}'."
+            )
+
     async def inject_macros(
         self, query: str, rule_name: str
     ) -> microsoft_sentinel_models.MacroInjectionResult:
-        macro_service = MicrosoftSentinelMacroService()
-
-        for macro_name in macro_service.get_used_macros(query=query):
-            try:
-                macro = self._kubernetes_client.get_namespaced_custom_object(
-                    group="buildrlabs.io",
-                    version="v1",
-                    namespace=self._namespace,
-                    plural="microsoftsentinelmacros",
-                    name=macro_name,
-                    return_type=crd_models.MicrosoftSentinelMacro,
-                )
-                query = macro_service.replace_macro(
-                    text=query, macro_name=macro_name, replacement=macro.spec.content
-                )
-            except kubernetes_exceptions.ResourceNotFoundException:
-                error_message = (
-                    f"The macro '{macro_name}' is referenced in '{rule_name}', "
-                    "but is not deployed in the Tenant namespace."
-                )
-                self._logger.error(error_message)
-                return microsoft_sentinel_models.MacroInjectionResult(
-                    success=False, query=query, message=error_message
-                )
+        with metrics.MACRO_INJECTION_DURATION.labels(
+            kind="microsoftsentinelmacro"
+        ).time():
+            return await self._inject_macros(query=query, rule_name=rule_name)
 
-        return microsoft_sentinel_models.MacroInjectionResult(success=True, query=query)
+    async def _inject_macros(
+        self, query: str, rule_name: str
+    ) -> microsoft_sentinel_models.MacroInjectionResult:
+        macros, missing = await self._macro_resolver.resolve(query=query)
+        used_macros = set(macros) | missing
 
-    async def create_or_update_analytics_rule(
-        self,
-        rule_name: str,
-        payload: microsoft_sentinel_models.CreateScheduledAlertRule,
-    ):
+        try:
+            query = self._macro_service.render(query=query, macros=macros)
+        except microsoft_sentinel_exceptions.MacroNotFoundException as err:
+            error_message = (
+                f"The macro '{err.macro_name}' is referenced in '{rule_name}', "
+                "but is not deployed in the Tenant namespace."
+            )
+            self._logger.error(error_message)
+            return microsoft_sentinel_models.MacroInjectionResult(
+                success=False, query=query, message=error_message, macros=used_macros
+            )
+        except microsoft_sentinel_exceptions.MacroCycleException as err:
+            error_message = (
+                f"The macros referenced in '{rule_name}' contain a cycle: {err}"
+            )
+            self._logger.error(error_message)
+            return microsoft_sentinel_models.MacroInjectionResult(
+                success=False, query=query, message=error_message, macros=used_macros
+            )
+
+        return microsoft_sentinel_models.MacroInjectionResult(
+            success=True, query=query, macros=used_macros
+        )
+
+    def prepare_analytics_rule(
+        self, payload: microsoft_sentinel_models.CreateScheduledAlertRule
+    ) -> microsoft_sentinel_models.CreateScheduledAlertRule:
         """
-        Create a Detection Rule upstream
+        Compose the final query of a Detection Rule, i.e. the payload exactly as it is
+        sent upstream
 
         Args:
             payload(CreateScheduledAlertRule): A valid ScheduledAlertRule object
         """
-        # Generate a random uuid to use as the ID for the Analytic Rule
-        analytic_rule_id = self._compute_analytics_rule_id(rule_name=rule_name)
+        payload = payload.model_copy(deep=True)
 
         # Support optional query prefix
         if payload.properties.query_prefix:
@@ -89,27 +162,184 @@ class MicrosoftSentinelService:
                 f"{payload.properties.query} {payload.properties.query_suffix} "
             )
 
-        await self._repository.create_or_update_scheduled_alert_rule(
+        return payload
+
+    async def create_or_update_analytics_rule(
+        self,
+        rule_name: str,
+        payload: microsoft_sentinel_models.CreateScheduledAlertRule,
+        replaces_legacy: bool = True,
+    ) -> microsoft_sentinel_models.RuleResource:
+        """
+        Create a Detection Rule upstream
+
+        Args:
+            payload(CreateScheduledAlertRule): A payload returned by
+                `prepare_analytics_rule`
+
+            replaces_legacy(bool): Whether the rule may have been deployed under its
+                legacy ID, which is then removed once it is created under its
+                current one
+
+        Returns:
+            RuleResource: The rule as stored upstream
+        """
+        analytic_rule_id = self.compute_analytics_rule_id(rule_name=rule_name)
+        created = (
+            self._repository.get_etag(
+                microsoft_sentinel_repository.ALERT_RULES, analytic_rule_id
+            )
+            is None
+        )
+
+        rule = await self._repository.create_or_update_scheduled_alert_rule(
             payload=payload, analytic_rule_id=analytic_rule_id
         )
 
-    async def create_or_update_automation_rule(self, rule_name: str, payload: dict):
+        if created and replaces_legacy:
+            await self._remove_legacy_rule(
+                microsoft_sentinel_repository.ALERT_RULES, rule_name=rule_name
+            )
+
+        return rule
+
+    async def get_analytics_rule(self, rule_name: str) -> dict | None:
+        return await self._repository.get_analytics_rule(
+            analytic_rule_id=self.compute_analytics_rule_id(rule_name=rule_name)
+        )
+
+    async def get_automation_rule(self, rule_name: str) -> dict | None:
+        return await self._repository.get_automation_rule(
+            automation_rule_id=self.compute_automation_rule_id(rule_name=rule_name)
+        )
+
+    async def create_or_update_automation_rule(
+        self, rule_name: str, payload: dict, replaces_legacy: bool = True
+    ) -> microsoft_sentinel_models.RuleResource:
         """
         Create (or update) an automation rule upstream
 
         Args:
             payload(...): A valid ... object
+
+            replaces_legacy(bool): Whether the rule may have been deployed under its
+                legacy ID, which is then removed once it is created under its
+                current one
+
+        Returns:
+            RuleResource: The rule as stored upstream
         """
-        automation_rule_id = self._compute_automation_rule_id(rule_name=rule_name)
-        await self._repository.create_or_update_automation_rule(
+        automation_rule_id = self.compute_automation_rule_id(rule_name=rule_name)
+        created = (
+            self._repository.get_etag(
+                microsoft_sentinel_repository.AUTOMATION_RULES, automation_rule_id
+            )
+            is None
+        )
+
+        rule = await self._repository.create_or_update_automation_rule(
             payload=payload, automation_rule_id=automation_rule_id
         )
 
+        if created and replaces_legacy:
+            await self._remove_legacy_rule(
+                microsoft_sentinel_repository.AUTOMATION_RULES, rule_name=rule_name
+            )
+
+        return rule
+
     async def remove_analytics_rule(self, rule_name: str):
-        analytic_rule_id = self._compute_analytics_rule_id(rule_name=rule_name)
+        analytic_rule_id = self.compute_analytics_rule_id(rule_name=rule_name)
         await self._repository.remove_scheduled_alert_rule(
             analytic_rule_id=analytic_rule_id
         )
+        await self._remove_legacy_rule(
+            microsoft_sentinel_repository.ALERT_RULES, rule_name=rule_name
+        )
+
+    async def list_analytics_rules(self) -> dict[str, dict]:
+        """
+        List all Detection Rules in the workspace, by ID
+        """
+        rules = await self._repository.get_analytics_rules()
+        return {rule["name"]: rule for rule in rules}
+
+    async def list_automation_rules(self) -> dict[str, dict]:
+        """
+        List all Automation Rules in the workspace, by ID
+        """
+        rules = await self._repository.get_automation_rules()
+        return {rule["name"]: rule for rule in rules}
+
+    def _find_orphaned_rule_ids(
+        self, listing: dict[str, dict], rule_ids: set[str]
+    ) -> list[str]:
+        """
+        The rules of this namespace without a matching resource. Rules of other
+        namespaces deploying to the same workspace, and rules deployed under their
+        legacy IDs, are never considered orphaned. Without namespaced rule IDs the
+        owner of a rule is unknown, so no rule is.
+        """
+        if not self._namespaced_rule_ids:
+            return []
+
+        prefix = self._namespace_prefix()
+
+        return [
+            rule_id
+            for rule_id in listing
+            if RULE_ID_PATTERN.match(rule_id)
+            and rule_id.startswith(prefix)
+            and rule_id not in rule_ids
+        ]
+
+    async def prune_analytics_rules(
+        self, listing: dict[str, dict], rule_names: list[str]
+    ) -> list[str]:
+        """
+        Remove Detection Rules created by the operator that no longer have a
+        matching resource, e.g. because it was removed while the operator was down
+
+        Args:
+            listing(dict[str, dict]): The rules in the workspace, by ID
+
+            rule_names(list[str]): The names of all existing resources
+        """
+        orphaned_rule_ids = self._find_orphaned_rule_ids(
+            listing=listing,
+            rule_ids={self.compute_analytics_rule_id(name) for name in rule_names},
+        )
+
+        for analytic_rule_id in orphaned_rule_ids:
+            await self._repository.remove_scheduled_alert_rule(
+                analytic_rule_id=analytic_rule_id
+            )
+
+        return orphaned_rule_ids
+
+    async def prune_automation_rules(
+        self, listing: dict[str, dict], rule_names: list[str]
+    ) -> list[str]:
+        """
+        Remove Automation Rules created by the operator that no longer have a
+        matching resource
+
+        Args:
+            listing(dict[str, dict]): The rules in the workspace, by ID
+
+            rule_names(list[str]): The names of all existing resources
+        """
+        orphaned_rule_ids = self._find_orphaned_rule_ids(
+            listing=listing,
+            rule_ids={self.compute_automation_rule_id(name) for name in rule_names},
+        )
+
+        for automation_rule_id in orphaned_rule_ids:
+            await self._repository.remove_automation_rule(
+                automation_rule_id=automation_rule_id
+            )
+
+        return orphaned_rule_ids
 
     async def analytics_rule_status(
         self, analytic_rule_id: str
@@ -123,6 +353,17 @@ class MicrosoftSentinelService:
         rule = await self._repository.get_analytics_rule(
             analytic_rule_id=analytic_rule_id
         )
+        return self.to_analytics_rule_status(rule)
+
+    def to_analytics_rule_status(
+        self, rule: dict | None
+    ) -> microsoft_sentinel_models.AnalyticsRuleStatus:
+        """
+        Extract the status of a Detection Rule from its upstream representation
+
+        Args:
+            rule(dict | None): The upstream rule, or None if it does not exist
+        """
         deployed = rule is not None
 
         enabled = False
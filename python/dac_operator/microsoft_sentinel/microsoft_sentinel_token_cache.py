@@ -0,0 +1,94 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from loguru import logger as default_loguru_logger
+from pydantic import BaseModel
+
+from dac_operator import metrics
+
+TokenCacheKey = tuple[str, str, str]
+
+
+class AccessToken(BaseModel):
+    access_token: str
+    expires_at: float
+
+
+class AccessTokenCache:
+    """
+    Process-wide cache of Azure AD access tokens, keyed by (tenant_id, client_id,
+    scope). Tokens are refreshed `refresh_margin` seconds before they expire, and
+    concurrent callers for the same key share a single in-flight refresh.
+    """
+
+    def __init__(
+        self,
+        refresh_margin: int = 300,
+        clock: Callable[[], float] = time.monotonic,
+        logger=default_loguru_logger,
+    ):
+        self._refresh_margin = refresh_margin
+        self._clock = clock
+        self._logger = logger
+        self._tokens: dict[TokenCacheKey, AccessToken] = {}
+        self._locks: dict[TokenCacheKey, asyncio.Lock] = {}
+
+    def _get_valid_token(self, key: TokenCacheKey) -> AccessToken | None:
+        token = self._tokens.get(key)
+
+        if token is None or token.expires_at - self._refresh_margin <= self._clock():
+            return None
+
+        return token
+
+    async def get_token(
+        self,
+        tenant_id: str,
+        client_id: str,
+        scope: str,
+        fetch_token: Callable[[], Awaitable[dict]],
+    ) -> str:
+        """
+        Return a valid access token for the given key, fetching a new one if the
+        cached token is missing or about to expire.
+
+        Args:
+            tenant_id(str): The Azure AD tenant the token is issued for
+
+            client_id(str): The client ID of the App Registration
+
+            scope(str): The scope the token is requested for
+
+            fetch_token(Callable): Coroutine function performing the token request,
+                returning the decoded token response containing `access_token` and
+                `expires_in`.
+        """
+        key = (tenant_id, client_id, scope)
+
+        if token := self._get_valid_token(key):
+            metrics.ACCESS_TOKEN_CACHE_REQUESTS.labels(result="hit").inc()
+            return token.access_token
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Another caller may have refreshed the token while we were waiting
+            if token := self._get_valid_token(key):
+                metrics.ACCESS_TOKEN_CACHE_REQUESTS.labels(result="hit").inc()
+                return token.access_token
+
+            metrics.ACCESS_TOKEN_CACHE_REQUESTS.labels(result="miss").inc()
+            requested_at = self._clock()
+            response = await fetch_token()
+
+            token = AccessToken(
+                access_token=response["access_token"],
+                expires_at=requested_at + int(response.get("expires_in", 0)),
+            )
+            self._tokens[key] = token
+            self._logger.debug(f"Refreshed access token for tenant '{tenant_id}'.")
+
+        return token.access_token
+
+    def invalidate(self, tenant_id: str, client_id: str, scope: str):
+        self._tokens.pop((tenant_id, client_id, scope), None)
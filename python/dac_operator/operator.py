@@ -1,21 +1,85 @@
+import asyncio
+
 import kopf
+import prometheus_client
+from loguru import logger
 
+from dac_operator import providers
+from dac_operator.handlers.configuration import (
+    configuration_watchers as configuration_watchers,
+)
+from dac_operator.handlers.microsoft_sentinel.analytic_rules import (
+    analytic_rule_events as analytic_rule_events,
+)
 from dac_operator.handlers.microsoft_sentinel.analytic_rules import (
     analytic_rule_timers as analytic_rule_timers,
 )
+from dac_operator.handlers.microsoft_sentinel.analytic_rules import (
+    analytic_rule_validators as analytic_rule_validators,
+)
+from dac_operator.handlers.microsoft_sentinel.automation_rules import (
+    automation_rule_events as automation_rule_events,
+)
 from dac_operator.handlers.microsoft_sentinel.automation_rules import (
     automation_rule_timers as automation_rule_timers,
 )
 from dac_operator.handlers.microsoft_sentinel.automation_rules import (
     automation_rule_validators as automation_rule_validators,
 )
+from dac_operator.handlers.microsoft_sentinel.macros import (
+    macro_watchers as macro_watchers,
+)
+from dac_operator.handlers.microsoft_sentinel.workspaces import (
+    workspace_daemons as workspace_daemons,
+)
+from dac_operator.handlers.sharding import shard_daemons as shard_daemons
+from dac_operator.handlers.splunk.detection_rules import (
+    detection_rule_daemons as detection_rule_daemons,
+)
+from dac_operator.handlers.splunk.detection_rules import (
+    detection_rule_event_handlers as detection_rule_event_handlers,
+)
 from dac_operator.handlers.splunk.detection_rules import (
     detection_rule_timer_handlers as detection_rule_timer_handlers,
 )
+from dac_operator.handlers.splunk.detection_rules import (
+    detection_rule_validators as detection_rule_validators,
+)
+from dac_operator.handlers.splunk.macros import (
+    macro_event_handlers as macro_event_handlers,
+)
+
+
+_background_tasks: set[asyncio.Task] = set()
 
 
 @kopf.on.startup()  # type: ignore
-def configure(settings: kopf.OperatorSettings, **_):
+async def configure(settings: kopf.OperatorSettings, **_):
+    providers.work_queue.start()
+    providers.reconcile_scheduler.start()
+
+    if providers.state_store.enabled:
+        # Read in bulk before any repository is created
+        await asyncio.to_thread(providers.state_store.open)
+        task = asyncio.create_task(
+            providers.state_store.run(
+                interval=providers.settings.state_store_flush_interval
+            )
+        )
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+    if providers.settings.sharding_enabled:
+        # Replicas split the namespaces among themselves, rather than all but one of
+        # them standing by as kopf peering would have it
+        settings.peering.standalone = True
+
+    if providers.settings.metrics_port:
+        prometheus_client.start_http_server(port=providers.settings.metrics_port)
+        logger.info(
+            f"Serving metrics on port {providers.settings.metrics_port} at /metrics."
+        )
+
     settings.admission.server = kopf.WebhookServer(
         addr="0.0.0.0",
         port=443,
@@ -23,3 +87,15 @@ def configure(settings: kopf.OperatorSettings, **_):
         certfile="/certs/tls.crt",
         pkeyfile="/certs/tls.key",
     )
+
+
+@kopf.on.cleanup()  # type: ignore
+async def cleanup(**_):
+    await providers.work_queue.stop()
+
+    for task in _background_tasks:
+        task.cancel()
+    await providers.state_store.close()
+    await providers.microsoft_sentinel_services.close()
+    await providers.splunk_services.close()
+    providers.get_kubernetes_client().close()
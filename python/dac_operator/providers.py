@@ -1,86 +1,404 @@
 import base64
+import functools
+import importlib.util
+import json
+from concurrent.futures import ThreadPoolExecutor
 
+import httpx
 import kubernetes.client
 from loguru import logger
 
-from dac_operator.config import get_settings
-from dac_operator.ext import kubernetes_exceptions
-from dac_operator.ext.kubernetes_client import KubernetesClient
+from dac_operator.config import ROOT_PATH, get_settings
+from dac_operator.crd.macro_index import MacroDependencyIndex, MacroIndex
+from dac_operator.crd.render_cache import RenderCache
+from dac_operator.ext import kubernetes_exceptions, kubernetes_models
+from dac_operator.ext.jsonschema_validators import SchemaValidatorRegistry
+from dac_operator.ext.kubernetes_cache import KubernetesResourceCache
+from dac_operator.ext.kubernetes_client import AsyncKubernetesClient, KubernetesClient
+from dac_operator.ext.reconcile_scheduler import ReconcileScheduler
+from dac_operator.ext.request_scheduler import RequestScheduler, ScheduledTransport
+from dac_operator.ext.service_registry import ServiceRegistry, compute_fingerprint
+from dac_operator.ext.shard_coordinator import ShardCoordinator
+from dac_operator.ext.state_store import StateStore
+from dac_operator.ext.work_queue import WorkQueue
 from dac_operator.microsoft_sentinel import (
     microsoft_sentinel_exceptions,
+    microsoft_sentinel_models,
     microsoft_sentinel_repository,
     microsoft_sentinel_service,
 )
+from dac_operator.microsoft_sentinel.microsoft_sentinel_token_cache import (
+    AccessTokenCache,
+)
 from dac_operator.splunk import splunk_exceptions, splunk_repository, splunk_service
 
+MICROSOFT_SENTINEL_CONFIGURATION = "microsoft-sentinel-configuration"
+SPLUNK_CONFIGURATION = "splunk-configuration"
+CONFIGURATION_NAMES = [MICROSOFT_SENTINEL_CONFIGURATION, SPLUNK_CONFIGURATION]
+
+# Name of the workspace configured by the top-level keys of the Microsoft Sentinel
+# configuration, which rules are deployed to unless they select workspaces
+DEFAULT_WORKSPACE = "default"
+
 settings = get_settings()
 
+access_token_cache = AccessTokenCache(
+    refresh_margin=settings.access_token_refresh_margin
+)
+
+shard_coordinator = ShardCoordinator(
+    identity=settings.shard_identity,
+    namespace=settings.shard_lease_namespace,
+    shard_count=settings.shard_count,
+    lease_duration=settings.shard_lease_duration,
+    renew_interval=settings.shard_lease_renew_interval,
+    enabled=settings.sharding_enabled,
+)
+
+work_queue = WorkQueue(
+    workers=settings.work_queue_workers,
+    tenant_workers=settings.work_queue_tenant_workers,
+    tenant_weights=settings.work_queue_tenant_weights,
+    admit=shard_coordinator.owns,
+)
+
+reconcile_scheduler = ReconcileScheduler(
+    warm_up_period=settings.reconcile_warm_up_period
+)
+
+schema_validators = SchemaValidatorRegistry(
+    directory=f"{ROOT_PATH}/assets/jsonschema",
+    reload_interval=settings.schema_reload_interval,
+)
+
+state_store = StateStore(path=settings.state_store_path)
+
+config_map_cache = KubernetesResourceCache(kind="configmap")
+secret_cache = KubernetesResourceCache(kind="secret")
+
+microsoft_sentinel_macro_index = MacroIndex(kind="microsoftsentinelmacro")
+microsoft_sentinel_macro_dependencies = MacroDependencyIndex()
+
+splunk_macro_index = MacroIndex(kind="splunkmacro")
+splunk_macro_dependencies = MacroDependencyIndex()
+splunk_render_cache = RenderCache(
+    kind="splunkmacro", maxsize=settings.macro_render_cache_size
+)
+
+
+def _request_scheduler(backend: str) -> RequestScheduler:
+    return RequestScheduler(
+        backend=backend,
+        read_rate=settings.request_read_rate,
+        write_rate=settings.request_write_rate,
+        burst=settings.request_burst,
+        max_retries=settings.request_max_retries,
+        backoff_base=settings.request_backoff_base,
+        backoff_max=settings.request_backoff_max,
+        low_watermark=settings.request_rate_limit_low_watermark,
+    )
+
+
+# Shared by all tenants, so that namespaces using the same Azure subscription or
+# Splunk host share its rate limit
+microsoft_sentinel_request_scheduler = _request_scheduler(backend="azure")
+splunk_request_scheduler = _request_scheduler(backend="splunk")
+
+microsoft_sentinel_services: ServiceRegistry[
+    microsoft_sentinel_service.MicrosoftSentinelService
+] = ServiceRegistry(retire_delay=settings.http_client_retire_delay)
+splunk_services: ServiceRegistry[splunk_service.SplunkService] = ServiceRegistry(
+    retire_delay=settings.http_client_retire_delay
+)
+
+
+def get_http_client(
+    scheduler: RequestScheduler, verify: bool = True
+) -> httpx.AsyncClient:
+    """
+    Build a connection-pooled HTTP client for a single tenant endpoint, sending
+    every request through the given rate limiter.
+    """
+    http2 = settings.http2
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning(
+            "HTTP/2 is enabled, but the 'http2' extra is not installed. "
+            "Falling back to HTTP/1.1."
+        )
+        http2 = False
+
+    transport = httpx.AsyncHTTPTransport(
+        verify=verify,
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry,
+        ),
+    )
+
+    return httpx.AsyncClient(
+        transport=ScheduledTransport(transport=transport, scheduler=scheduler),
+        timeout=settings.http_timeout,
+    )
+
+
+@functools.cache
+def get_kubernetes_client() -> AsyncKubernetesClient:
+    """
+    Get the process-wide Kubernetes client. It is created lazily, since the
+    Kubernetes configuration is only loaded once kopf has logged in.
+    """
+    return AsyncKubernetesClient(
+        kubernetes_client=KubernetesClient(
+            core_api=kubernetes.client.CoreV1Api(),
+            custom_objects_api=kubernetes.client.CustomObjectsApi(),
+            coordination_api=kubernetes.client.CoordinationV1Api(),
+        ),
+        executor=ThreadPoolExecutor(
+            max_workers=settings.kubernetes_client_max_workers,
+            thread_name_prefix="kubernetes-client",
+        ),
+    )
+
+
+def _secret_refs(data: dict[str, str]) -> set[str | None]:
+    refs = {data.get("secret_ref")}
+
+    try:
+        workspaces = json.loads(data.get("workspaces") or "{}")
+        refs.update(workspace.get("secret_ref") for workspace in workspaces.values())
+    except (ValueError, AttributeError):
+        pass
+
+    return refs
+
+
+def is_referenced_secret(name: str, namespace: str) -> bool:
+    """
+    Checks if a secret is referenced by one of the tenant configurations in the
+    namespace, or one of their workspaces, i.e. if it should be kept in the secret
+    cache.
+    """
+    for configuration_name in CONFIGURATION_NAMES:
+        configmap = config_map_cache.peek(
+            name=configuration_name, namespace=namespace
+        )
+        if configmap is not None and name in _secret_refs(configmap.data):
+            return True
+
+    return False
+
+
+async def get_config_map(
+    name: str, namespace: str, kubernetes_client: AsyncKubernetesClient
+) -> kubernetes_models.ConfigMap:
+    """
+    Get a config map from the watch-backed cache, reading through to the API server
+    and populating the cache on a miss.
+    """
+    configmap = config_map_cache.get(name=name, namespace=namespace)
+
+    if configmap is None:
+        configmap = await kubernetes_client.get_config_map(
+            name=name, namespace=namespace
+        )
+        config_map_cache.set(name=name, namespace=namespace, value=configmap)
+
+    return configmap
 
-def get_kubernetes_client(
-    core_api: kubernetes.client.CoreV1Api,
-    custom_objects_api: kubernetes.client.CustomObjectsApi,
-):
-    return KubernetesClient(custom_objects_api=custom_objects_api, core_api=core_api)
 
+async def get_secret(
+    name: str, namespace: str, kubernetes_client: AsyncKubernetesClient
+) -> dict:
+    """
+    Get the data of a secret from the watch-backed cache, reading through to the API
+    server and populating the cache on a miss.
+    """
+    secret = secret_cache.get(name=name, namespace=namespace)
 
-def get_splunk_service(
-    namespace: str, kubernetes_client: KubernetesClient
+    if secret is None:
+        secret = await kubernetes_client.get_secret(name=name, namespace=namespace)
+        secret_cache.set(name=name, namespace=namespace, value=secret)
+
+    return secret
+
+
+async def get_splunk_service(
+    namespace: str, kubernetes_client: AsyncKubernetesClient
 ) -> splunk_service.SplunkService | None:
     try:
-        configmap = kubernetes_client.get_config_map(
-            name="splunk-configuration", namespace=namespace
+        configmap = await get_config_map(
+            name=SPLUNK_CONFIGURATION,
+            namespace=namespace,
+            kubernetes_client=kubernetes_client,
         )
     except kubernetes_exceptions.ResourceNotFoundException as err:
         logger.info(
             f"{namespace} has no configuration named "
-            "'splunk-configuration', skipping..."
+            f"'{SPLUNK_CONFIGURATION}', skipping..."
         )
         return None
 
     secret_name = configmap.data["secret_ref"]
     try:
-        secret = kubernetes_client.get_secret(name=secret_name, namespace=namespace)
+        secret = await get_secret(
+            name=secret_name, namespace=namespace, kubernetes_client=kubernetes_client
+        )
     except kubernetes_exceptions.ResourceNotFoundException as err:
         logger.exception(err)
         raise splunk_exceptions.ServiceConfigurationException
 
-    return splunk_service.SplunkService(
+    fingerprint = compute_fingerprint(configmap.data, secret)
+    if service := splunk_services.get(namespace=namespace, fingerprint=fingerprint):
+        return service
+
+    verify = configmap.data["verify"] in [1, True, "true"]
+    http_client = get_http_client(scheduler=splunk_request_scheduler, verify=verify)
+    service = splunk_service.SplunkService(
         repository=splunk_repository.SplunkRepository(
             token=base64.b64decode(secret["token"]).decode(),
             host=configmap.data["host"],
             port=int(configmap.data["port"]),
             protocol=configmap.data["scheme"],
-            verify=configmap.data["verify"] in [1, True, "true"],
-        )
+            http_client=http_client,
+            app=configmap.data.get("app"),
+            owner=configmap.data.get("owner"),
+        ),
+        kubernetes_client=kubernetes_client,
+        macro_index=splunk_macro_index,
+        render_cache=splunk_render_cache,
+        namespace=namespace,
     )
+    splunk_services.register(
+        namespace=namespace,
+        fingerprint=fingerprint,
+        service=service,
+        http_client=http_client,
+    )
+
+    return service
 
 
-def get_microsoft_sentinel_service(namespace: str, kubernetes_client: KubernetesClient):
+def parse_workspaces(
+    data: dict[str, str],
+) -> dict[str, microsoft_sentinel_models.WorkspaceConfiguration]:
+    """
+    Parse the workspaces of a Microsoft Sentinel configuration by name: the one
+    configured by the top-level keys, named `DEFAULT_WORKSPACE`, and those listed
+    under the `workspaces` key as a JSON object, e.g.
+
+        {"emea": {"azure_workspace_id": "...", "labels": {"region": "emea"}}}
+
+    Listed workspaces use the Azure tenant, subscription, resource group and secret
+    of the default workspace unless they set their own.
+
+    Raises:
+        KeyError: If a top-level key is missing
+        ValueError: If the listed workspaces are not valid
+    """
+    default = microsoft_sentinel_models.WorkspaceConfiguration(
+        azure_tenant_id=data["azure_tenant_id"],
+        azure_subscription_id=data["azure_subscription_id"],
+        azure_resource_group_id=data["azure_resource_group_id"],
+        azure_workspace_id=data["azure_workspace_id"],
+        secret_ref=data["secret_ref"],
+        labels=json.loads(data.get("labels") or "{}"),
+    )
+    workspaces = {DEFAULT_WORKSPACE: default}
+
+    for name, workspace in json.loads(data.get("workspaces") or "{}").items():
+        workspaces[name] = microsoft_sentinel_models.WorkspaceConfiguration(
+            **{
+                **default.model_dump(exclude={"azure_workspace_id", "labels"}),
+                **workspace,
+            }
+        )
+
+    return workspaces
+
+
+async def get_microsoft_sentinel_workspaces(
+    namespace: str, kubernetes_client: AsyncKubernetesClient
+) -> dict[str, microsoft_sentinel_models.WorkspaceConfiguration]:
     try:
-        configmap = kubernetes_client.get_config_map(
-            name="microsoft-sentinel-configuration", namespace=namespace
+        configmap = await get_config_map(
+            name=MICROSOFT_SENTINEL_CONFIGURATION,
+            namespace=namespace,
+            kubernetes_client=kubernetes_client,
         )
     except kubernetes_exceptions.ResourceNotFoundException as err:
         logger.exception(err)
         raise microsoft_sentinel_exceptions.ServiceConfigurationException
 
-    secret_name = configmap.data["secret_ref"]
+    try:
+        return parse_workspaces(configmap.data)
+    except (KeyError, ValueError) as err:
+        logger.error(
+            f"Invalid '{MICROSOFT_SENTINEL_CONFIGURATION}' in '{namespace}': {err}"
+        )
+        raise microsoft_sentinel_exceptions.ServiceConfigurationException
+
+
+async def get_microsoft_sentinel_service(
+    namespace: str,
+    kubernetes_client: AsyncKubernetesClient,
+    workspace: str = DEFAULT_WORKSPACE,
+) -> microsoft_sentinel_service.MicrosoftSentinelService:
+    workspaces = await get_microsoft_sentinel_workspaces(
+        namespace=namespace, kubernetes_client=kubernetes_client
+    )
+
+    configuration = workspaces.get(workspace)
+    if configuration is None:
+        logger.error(f"{namespace} has no workspace named '{workspace}'.")
+        raise microsoft_sentinel_exceptions.ServiceConfigurationException
 
     try:
-        secret = kubernetes_client.get_secret(name=secret_name, namespace=namespace)
+        secret = await get_secret(
+            name=configuration.secret_ref,
+            namespace=namespace,
+            kubernetes_client=kubernetes_client,
+        )
     except kubernetes_exceptions.ResourceNotFoundException as err:
         logger.exception(err)
         raise microsoft_sentinel_exceptions.ServiceConfigurationException
 
-    return microsoft_sentinel_service.MicrosoftSentinelService(
-        repository=microsoft_sentinel_repository.MicrosoftSentinelRepository(
-            tenant_id=configmap.data["azure_tenant_id"],
-            workspace_id=configmap.data["azure_workspace_id"],
-            subscription_id=configmap.data["azure_subscription_id"],
-            resource_group_id=configmap.data["azure_resource_group_id"],
-            client_id=base64.b64decode(secret["azure_client_id"]).decode(),
-            client_secret=base64.b64decode(secret["azure_client_secret"]).decode(),
-        ),
+    fingerprint = compute_fingerprint(
+        configuration.model_dump(exclude={"labels"}), secret
+    )
+    if service := microsoft_sentinel_services.get(
+        namespace=namespace, fingerprint=fingerprint, name=workspace
+    ):
+        return service
+
+    http_client = get_http_client(scheduler=microsoft_sentinel_request_scheduler)
+    repository = microsoft_sentinel_repository.MicrosoftSentinelRepository(
+        tenant_id=configuration.azure_tenant_id,
+        workspace_id=configuration.azure_workspace_id,
+        subscription_id=configuration.azure_subscription_id,
+        resource_group_id=configuration.azure_resource_group_id,
+        client_id=base64.b64decode(secret["azure_client_id"]).decode(),
+        client_secret=base64.b64decode(secret["azure_client_secret"]).decode(),
+        token_cache=access_token_cache,
+        http_client=http_client,
+        state_store=state_store,
+    )
+    await repository.restore()
+
+    service = microsoft_sentinel_service.MicrosoftSentinelService(
+        repository=repository,
         kubernetes_client=kubernetes_client,
+        macro_index=microsoft_sentinel_macro_index,
         namespace=namespace,
+        namespaced_rule_ids=settings.microsoft_sentinel_namespaced_rule_ids,
     )
+    microsoft_sentinel_services.register(
+        namespace=namespace,
+        fingerprint=fingerprint,
+        service=service,
+        http_client=http_client,
+        name=workspace,
+    )
+
+    return service
@@ -5,4 +5,12 @@ class SplunkDetectionRule(BaseModel):
     description: str
     search: str
 
-    model_config = ConfigDict(extra="allow")
\ No newline at end of file
+    model_config = ConfigDict(extra="allow")
+
+
+class MacroRenderResult(BaseModel):
+    success: bool
+    search: str
+    message: str = ""
+    # Every macro referenced by the search, including nested and missing macros
+    macros: set[str] = set()
@@ -1,6 +1,9 @@
+from urllib.parse import quote
+
 import httpx
 from loguru import logger as default_loguru_logger
 
+from dac_operator.ext import request_scheduler
 from dac_operator.splunk.splunk_models import SplunkDetectionRule
 
 
@@ -11,7 +14,9 @@ class SplunkRepository:
         host: str,
         port: int,
         token: str,
-        verify: bool,
+        http_client: httpx.AsyncClient,
+        app: str | None = None,
+        owner: str | None = None,
         logger=default_loguru_logger,
     ):
         self._token = token
@@ -19,25 +24,43 @@ class SplunkRepository:
         self._host = host
         self._port = port
         self._protocol = protocol
-        self._verify = verify
+        self._http_client = http_client
         self._base_url = f"{self._protocol}://{self._host}:{self._port}"
 
-    async def get_splunk_detection_rule(self, name: str) -> dict | None:
-        async with httpx.AsyncClient(verify=self._verify) as client:
+        # Saved searches are read and written in the namespace of an app and owner
+        # when one is configured, and in the context of the token's user otherwise
+        if app or owner:
+            self._saved_searches_url = (
+                f"{self._base_url}/servicesNS/{quote(owner or 'nobody', safe='')}"
+                f"/{quote(app or 'search', safe='')}/saved/searches"
+            )
+        else:
+            self._saved_searches_url = f"{self._base_url}/services/saved/searches"
+
+    def _saved_search_url(self, name: str) -> str:
+        return f"{self._saved_searches_url}/{quote(name, safe='')}"
+
+    @request_scheduler.endpoint
+    async def get_splunk_detection_rules(self) -> list[dict]:
+        """
+        Fetch every saved search, following the paging offsets in case the server
+        caps the number of entries per response.
+        """
+        entries: list[dict] = []
+
+        while True:
             try:
-                res = await client.get(
-                    f"{self._base_url}/services/saved/searches/{name}",  # noqa: E501
+                res = await self._http_client.get(
+                    self._saved_searches_url,
                     headers={"Authorization": f"Bearer {self._token}"},
-                    params={"output_mode": "json"},
+                    params={
+                        "output_mode": "json",
+                        "count": 0,
+                        "offset": len(entries),
+                    },
                 )
                 res.raise_for_status()
             except httpx.HTTPStatusError as err:
-                if err.response.status_code == 404:
-                    self._logger.info(
-                        f"No Detection Rule with name '{name}' exists, creating!"
-                    )
-                    return None
-
                 self._logger.exception(err)
                 self._logger.error(
                     f"Status code: {err.response.status_code}. Response: "
@@ -48,35 +71,91 @@ class SplunkRepository:
                 self._logger.exception(err)
                 raise err
 
-        return res.json()
+            page = res.json()
+            entries.extend(page.get("entry", []))
+            total = page.get("paging", {}).get("total", len(entries))
 
-    async def create_splunk_detection_rule(self, detection_rule: SplunkDetectionRule):
-        async with httpx.AsyncClient(verify=self._verify) as client:
-            try:
-                res = await client.post(
-                    f"{self._base_url}/services/saved/searches",  # noqa: E501
-                    data={
-                        "name": detection_rule.name,
-                        "description": detection_rule.description,
-                        "search": detection_rule.search,
-                    },
-                    headers={"Authorization": f"Bearer {self._token}"},
+            if not page.get("entry") or len(entries) >= total:
+                return entries
+
+    @request_scheduler.endpoint
+    async def get_splunk_detection_rule(self, name: str) -> dict | None:
+        try:
+            res = await self._http_client.get(
+                self._saved_search_url(name),
+                headers={"Authorization": f"Bearer {self._token}"},
+                params={"output_mode": "json"},
+            )
+            res.raise_for_status()
+        except httpx.HTTPStatusError as err:
+            if err.response.status_code == 404:
+                self._logger.info(
+                    f"No Detection Rule with name '{name}' exists, creating!"
                 )
-                res.raise_for_status()
-            except httpx.HTTPStatusError as err:
-                if err.response.status_code == 409:
-                    self._logger.error(
-                        f"Detection Rule with name {detection_rule.name} "
-                        "already exists."
-                    )
-                    return
+                return None
 
-                self._logger.exception(err)
+            self._logger.exception(err)
+            self._logger.error(
+                f"Status code: {err.response.status_code}. Response: "
+                f"{err.response.text}"
+            )
+            raise err
+        except httpx.RequestError as err:
+            self._logger.exception(err)
+            raise err
+
+        return res.json()
+
+    @request_scheduler.endpoint
+    async def create_splunk_detection_rule(self, detection_rule: SplunkDetectionRule):
+        try:
+            res = await self._http_client.post(
+                self._saved_searches_url,
+                data={
+                    "name": detection_rule.name,
+                    "description": detection_rule.description,
+                    "search": detection_rule.search,
+                },
+                headers={"Authorization": f"Bearer {self._token}"},
+            )
+            res.raise_for_status()
+        except httpx.HTTPStatusError as err:
+            if err.response.status_code == 409:
                 self._logger.error(
-                    f"Status code: {err.response.status_code}. Response: "
-                    f"{err.response.text}"
+                    f"Detection Rule with name {detection_rule.name} "
+                    "already exists."
                 )
-                raise err
-            except httpx.RequestError as err:
-                self._logger.exception(err)
-                raise err
+                return
+
+            self._logger.exception(err)
+            self._logger.error(
+                f"Status code: {err.response.status_code}. Response: "
+                f"{err.response.text}"
+            )
+            raise err
+        except httpx.RequestError as err:
+            self._logger.exception(err)
+            raise err
+
+    @request_scheduler.endpoint
+    async def update_splunk_detection_rule(self, detection_rule: SplunkDetectionRule):
+        try:
+            res = await self._http_client.post(
+                self._saved_search_url(detection_rule.name),
+                data={
+                    "description": detection_rule.description,
+                    "search": detection_rule.search,
+                },
+                headers={"Authorization": f"Bearer {self._token}"},
+            )
+            res.raise_for_status()
+        except httpx.HTTPStatusError as err:
+            self._logger.exception(err)
+            self._logger.error(
+                f"Status code: {err.response.status_code}. Response: "
+                f"{err.response.text}"
+            )
+            raise err
+        except httpx.RequestError as err:
+            self._logger.exception(err)
+            raise err
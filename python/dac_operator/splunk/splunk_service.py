@@ -1,19 +1,144 @@
+from typing import Mapping
+
+from loguru import logger as default_loguru_logger
+
+from dac_operator import metrics
+from dac_operator.crd import crd_models, macro_exceptions, macro_renderer
+from dac_operator.crd.macro_index import MacroIndex
+from dac_operator.crd.macro_resolver import MacroResolver
+from dac_operator.crd.render_cache import RenderCache
+from dac_operator.ext.kubernetes_client import AsyncKubernetesClient
 from dac_operator.splunk import splunk_repository
-from dac_operator.splunk.splunk_models import SplunkDetectionRule
+from dac_operator.splunk.splunk_models import MacroRenderResult, SplunkDetectionRule
 
 
 class SplunkService:
-    def __init__(self, repository: splunk_repository.SplunkRepository):
+    def __init__(
+        self,
+        repository: splunk_repository.SplunkRepository,
+        kubernetes_client: AsyncKubernetesClient,
+        macro_index: MacroIndex,
+        render_cache: RenderCache,
+        namespace: str,
+        logger=default_loguru_logger,
+    ):
         self._repository = repository
+        self._render_cache = render_cache
+        self._macro_resolver = MacroResolver(
+            kubernetes_client=kubernetes_client,
+            macro_index=macro_index,
+            namespace=namespace,
+            plural="splunkmacros",
+            find_macros=macro_renderer.find_macros,
+            model=crd_models.SplunkMacro,
+        )
+        self._namespace = namespace
+        self._logger = logger
 
-    async def create_or_update_detection_rule(
-        self, detection_rule: SplunkDetectionRule
-    ):
-        detection_rule_from_api = await self._repository.get_splunk_detection_rule(
-            name=detection_rule.name
+    async def inject_macros(self, search: str, rule_name: str) -> MacroRenderResult:
+        """
+        Render the macros used by a search. The result is cached by the search and
+        the version of every macro it uses, so that a search is only rendered again
+        when it or one of its macros changed.
+        """
+        with metrics.MACRO_INJECTION_DURATION.labels(kind="splunkmacro").time():
+            return await self._inject_macros(search=search, rule_name=rule_name)
+
+    async def _inject_macros(self, search: str, rule_name: str) -> MacroRenderResult:
+        macros, missing = await self._macro_resolver.resolve(query=search)
+        used_macros = set(macros) | missing
+
+        if missing:
+            error_message = (
+                f"The macro '{sorted(missing)[0]}' is referenced in '{rule_name}', "
+                "but is not deployed in the Tenant namespace."
+            )
+            self._logger.error(error_message)
+            return MacroRenderResult(
+                success=False, search=search, message=error_message, macros=used_macros
+            )
+
+        key = self._render_cache.key(
+            namespace=self._namespace,
+            query=search,
+            versions=self._macro_resolver.versions(macros),
         )
+        rendered = self._render_cache.get(key)
+
+        if rendered is None:
+            try:
+                rendered = macro_renderer.render(query=search, macros=macros)
+            except macro_exceptions.MacroCycleException as err:
+                error_message = (
+                    f"The macros referenced in '{rule_name}' contain a cycle: {err}"
+                )
+                self._logger.error(error_message)
+                return MacroRenderResult(
+                    success=False,
+                    search=search,
+                    message=error_message,
+                    macros=used_macros,
+                )
+
+            self._render_cache.set(key, rendered)
 
-        if detection_rule_from_api is None:
+        return MacroRenderResult(success=True, search=rendered, macros=used_macros)
+
+    async def list_detection_rules(self) -> dict[str, dict]:
+        """
+        List all saved searches, by name
+        """
+        entries = await self._repository.get_splunk_detection_rules()
+        return {entry["name"]: entry for entry in entries}
+
+    def matches_upstream(
+        self, detection_rule: SplunkDetectionRule, entry: dict
+    ) -> bool:
+        """
+        Whether a saved search, as returned by the API, matches a detection rule
+        """
+        content = entry.get("content", {})
+        return (
+            content.get("search") == detection_rule.search
+            and (content.get("description") or "") == detection_rule.description
+        )
+
+    async def create_or_update_detection_rule(
+        self,
+        detection_rule: SplunkDetectionRule,
+        listing: Mapping[str, dict] | None = None,
+    ) -> bool:
+        """
+        Create a detection rule upstream, or update it if it differs from the saved
+        search with the same name
+
+        Args:
+            listing(Mapping[str, dict] | None): All saved searches by name, when
+                syncing many rules at once. The saved search is then looked up in
+                the listing instead of being fetched.
+
+        Returns:
+            bool: False if the saved search was already up to date
+        """
+        if listing is not None:
+            entry = listing.get(detection_rule.name)
+        else:
+            detection_rule_from_api = await self._repository.get_splunk_detection_rule(
+                name=detection_rule.name
+            )
+            entries = (detection_rule_from_api or {}).get("entry", [])
+            entry = entries[0] if entries else None
+
+        if entry is None:
             await self._repository.create_splunk_detection_rule(
                 detection_rule=detection_rule
             )
+            return True
+
+        if self.matches_upstream(detection_rule, entry):
+            return False
+
+        await self._repository.update_splunk_detection_rule(
+            detection_rule=detection_rule
+        )
+        return True
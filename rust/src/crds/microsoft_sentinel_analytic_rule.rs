@@ -190,6 +190,12 @@ struct Properties {
     template_version: Option<String>,
 }
 
+#[derive(Serialize, Deserialize, Debug, PartialEq, Clone, JsonSchema)]
+#[serde(rename_all = "camelCase")]
+struct WorkspaceSelector {
+    match_labels: HashMap<String, String>,
+}
+
 #[derive(CustomResource, Clone, Debug, Deserialize, Serialize, PartialEq, JsonSchema)]
 #[kube(
     group = "buildrlabs.io",
@@ -211,6 +217,10 @@ struct MicrosoftSentinelAnalyticRuleSpec {
     properties: Properties,
     #[serde(default = "scheduled")]
     kind: String,
+    /// Workspaces of the microsoft-sentinel-configuration config map to deploy the rule to, by name
+    workspaces: Option<Vec<String>>,
+    /// Deploy the rule to every workspace of the microsoft-sentinel-configuration config map with matching labels
+    workspace_selector: Option<WorkspaceSelector>,
 }
 
 #[derive(Serialize, Deserialize, Debug, PartialEq, Clone, JsonSchema)]
@@ -219,6 +229,30 @@ struct CreateAnalyticRuleStatusProperties {
     deployed: String,
     enabled: String,
     rule_type: String,
+    /// Hash of the rendered payload last applied upstream
+    content_hash: Option<String>,
+    /// When the upstream rule was last compared against the rendered payload
+    last_drift_check: Option<String>,
+    /// Generation of the resource that was last deployed successfully
+    observed_generation: Option<i64>,
+    /// Number of conflicts in a row while writing the rule upstream
+    conflict_attempts: Option<i64>,
+    /// When the rule is written upstream again after a conflict
+    next_attempt: Option<String>,
+    /// Status per workspace, for rules that target workspaces explicitly
+    targets: Option<HashMap<String, AnalyticRuleTargetStatus>>,
+}
+
+#[derive(Serialize, Deserialize, Debug, PartialEq, Clone, JsonSchema)]
+struct AnalyticRuleTargetStatus {
+    message: String,
+    deployed: String,
+    enabled: String,
+    rule_type: String,
+    content_hash: Option<String>,
+    last_drift_check: Option<String>,
+    conflict_attempts: Option<i64>,
+    next_attempt: Option<String>,
 }
 
 #[derive(Serialize, Deserialize, Debug, PartialEq, Clone, JsonSchema)]
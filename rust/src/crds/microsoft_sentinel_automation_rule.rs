@@ -362,10 +362,25 @@ struct MicrosoftSentinelAutomationRuleSpec {
 }
 
 #[derive(Serialize, Deserialize, Debug, PartialEq, Clone, JsonSchema)]
-struct MicrosoftSentinelAutomationRuleStatus {
+struct CreateAutomationRuleStatusProperties {
     message: String,
     deployed: String,
     enabled: String,
+    /// Hash of the payload last applied upstream
+    content_hash: Option<String>,
+    /// When the upstream rule was last compared against the payload
+    last_drift_check: Option<String>,
+    /// Generation of the resource that was last deployed successfully
+    observed_generation: Option<i64>,
+    /// Number of conflicts in a row while writing the rule upstream
+    conflict_attempts: Option<i64>,
+    /// When the rule is written upstream again after a conflict
+    next_attempt: Option<String>,
+}
+
+#[derive(Serialize, Deserialize, Debug, PartialEq, Clone, JsonSchema)]
+struct MicrosoftSentinelAutomationRuleStatus {
+    create_automation_rule: CreateAutomationRuleStatusProperties,
 }
 
 /// Specification for Microsoft Sentinel Automation Rule
@@ -2,4 +2,5 @@ pub mod microsoft_sentinel_analytic_rule;
 pub mod microsoft_sentinel_automation_rule;
 pub mod microsoft_sentinel_macro;
 pub mod microsoft_sentinel_workbook;
-pub mod splunk_detection_rule;
\ No newline at end of file
+pub mod splunk_detection_rule;
+pub mod splunk_macro;
\ No newline at end of file
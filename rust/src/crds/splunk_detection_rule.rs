@@ -11,8 +11,11 @@ use std::io::Write;
     group = "buildrlabs.io",
     version = "v1",
     kind = "SplunkDetectionRule",
+    status = "SplunkDetectionRuleStatus",
     shortname = "spldet",
     shortname = "spld",
+    printcolumn = r#"{"name":"Status", "type":"string", "description":"Checks if the Detection Rule is deployed to Splunk", "jsonPath":".status.create_splunk_detection_rule.deployed"}"#,
+    printcolumn = r#"{"name":"Message", "type":"string", "description":"Additional information about the deployment status", "jsonPath":".status.create_splunk_detection_rule.message"}"#,
     namespaced
 )]
 #[serde(rename_all = "camelCase")]
@@ -22,6 +25,23 @@ struct SplunkDetectionRuleSpec {
     search: String,
 }
 
+#[derive(Serialize, Deserialize, Debug, PartialEq, Clone, JsonSchema)]
+struct CreateSplunkDetectionRuleStatusProperties {
+    message: String,
+    deployed: String,
+    /// Hash of the rendered rule that was last deployed
+    content_hash: Option<String>,
+    /// Time at which the saved search was last compared against the rule
+    last_drift_check: Option<String>,
+    /// Generation of the resource that was last deployed successfully
+    observed_generation: Option<i64>,
+}
+
+#[derive(Serialize, Deserialize, Debug, PartialEq, Clone, JsonSchema)]
+struct SplunkDetectionRuleStatus {
+    create_splunk_detection_rule: CreateSplunkDetectionRuleStatusProperties,
+}
+
 #[derive(Serialize, Deserialize, Debug, PartialEq, Clone, JsonSchema)]
 enum CRDName {
     SplunkDetectionRule,
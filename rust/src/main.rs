@@ -6,5 +6,6 @@ fn main() -> std::io::Result<()> {
     crds::microsoft_sentinel_workbook::write_schemas().unwrap();
     crds::microsoft_sentinel_macro::write_schemas().unwrap();
     crds::splunk_detection_rule::write_schemas().unwrap();
+    crds::splunk_macro::write_schemas().unwrap();
     Ok(())
 }